@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+''' Lo que asigna cada fase de cada frame, y el test del presupuesto.
+
+	python asignaciones.py               (SceneGame sin pantalla, por fase)
+	python asignaciones.py --test        (falla si se pasa del presupuesto)
+	python asignaciones.py --test --brutos   (ademas, objetos creados; solo CPython)
+
+Se cuentan los objetos con gc (listas, tuplas, diccionarios, instancias:
+los que llevan la cuenta que dispara las pausas del gc) que se crean y
+no se liberan en cada fase. Lo que se crea y se suelta en la misma fase
+no cuenta: eso lo libera el contador de referencias y no acerca ninguna
+pausa. Las superficies, rects y fuentes de pygame no son objetos con gc.
+
+Con --brutos se cuentan en cambio todos los que se crean, aunque se
+suelten enseguida: es lo que cuesta cada frame aunque no quede nada.
+CPython no lo da, pero su cuenta de la generacion 0 solo baja al
+liberar si es positiva: se pone muy negativa mientras se mide (con
+ctypes, ver contador_gc) y entonces solo sube. Es tocar por dentro el
+interprete, asi que solo se hace si se pide; sin --brutos todo sale de
+gc.get_count y gc.get_objects. Las tuplas, listas y diccionarios que
+salen de las listas libres tampoco suman asi.
+
+Si esta tracemalloc (Python 3, o pytracemalloc en Python 2) tambien se
+cuentan los bytes; si no, esa columna sale vacia.
+
+Mientras se mide el gc esta apagado y se pasa a mano cada COLECTAR
+frames, entre dos frames: asi no cae dentro de ninguna fase y se sabe
+cuanto dura cada pausa y cuanto recoge. Una pasada completa vacia
+tambien las listas libres de CPython (tuplas, listas, diccionarios que
+se reutilizan sin contar), asi que los frames de despues salen algo mas
+caros: el test no pasa el gc. '''
+
+# Módulos
+import os, sys, gc, json, argparse, platform
+from array import array
+from timeit import default_timer as reloj
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+# Constantes
+# Fases que se miden; 'resto' es lo que queda fuera de ellas (espera,
+# sonido, el propio Director)
+FASES = ('entrada', 'on_update', 'on_draw', 'presentar', 'resto')
+# Cada cuantos frames se pasa el gc (0 -> nunca)
+COLECTAR = 60
+# Frames del principio de cada escena que no cuentan para el regimen
+# estable (cargas, caches que se llenan...)
+CALENTAR = 120
+FRAMES = 1200
+# Lo que puede dejar un frame de SceneGame en regimen estable
+PRESUPUESTO_OBJETOS = 0.5
+PRESUPUESTO_BYTES = 512
+# Objetos con gc que puede crear un frame en total (aunque los suelte)
+PRESUPUESTO_BRUTOS = 40
+# Objetos con gc vivos que puede ganar por frame (lo que no se suelta nunca)
+PRESUPUESTO_VIVOS = 0.1
+# Valor de la cuenta de la generacion 0 mientras se cuentan los brutos
+BRUTOS_INICIO = -(1 << 30)
+# Tipos que se enseñan cuando se pasa del presupuesto
+TIPOS = 10
+
+# Clases
+# ---------------------------------------------------------------------
+class Asignaciones:
+	"""Cuenta lo que asigna cada fase de cada frame, por escena.
+
+	instalar(director) envuelve entrada.leer y presentar del Director y
+	on_update y on_draw de cada escena segun entran. Un frame va de una
+	lectura de la entrada a la siguiente. Por escena se guardan los
+	objetos y los bytes de cada fase de FASES de cada frame, seguidos,
+	en dos array: guardar no crea objetos con gc, que si no se
+	contarian (y gastarian las listas libres de CPython, lo que tambien
+	cambia la cuenta).
+
+	Esa cuenta (la del gc, asignados menos liberados) es lo que acerca
+	la siguiente pausa, pero no dice si algo se queda vivo: con las
+	listas libres de por medio un objeto que no se suelta puede no
+	sumar. Para eso, con mirar_tipos, se cuentan los objetos vivos
+	(gc.get_objects) al acabar de calentar y al desinstalar.
+
+	Con brutos los objetos son todos los que se crean (si el interprete
+	deja contarlos: si no self.brutos queda en False y son los netos)."""
+
+	def __init__(self, colectar=COLECTAR, calentar=CALENTAR, mirar_tipos=False,
+			brutos=False):
+		self.colectar = colectar
+		self.calentar = calentar
+		# La cuenta de la generacion 0 del gc, si se cuentan los brutos
+		self.contador = contador_gc() if brutos else None
+		self.brutos = self.contador is not None
+		# Con mirar_tipos se cuentan los objetos vivos por tipo al acabar
+		# de calentar, para ver despues cuales crecen
+		self.mirar_tipos = mirar_tipos
+		self.tipos = None
+		self.tipos_final = None
+		self.frames_tipos = 0
+		self.director = None
+		# escena -> (array de objetos, array de bytes), len(FASES) por frame
+		self.muestras = {}
+		self.escena = None
+		# Lo del frame en curso (None -> no se esta midiendo)
+		self.objetos = None
+		self.bytes = array('d', [0.0]) * len(FASES)
+		self.actual = array('l', [0]) * len(FASES)
+		self.inicio_objetos = 0
+		self.inicio_bytes = 0
+		self.frames = 0
+		# (ms, objetos recogidos) de cada pasada del gc
+		self.pausas = []
+		self.gc_antes = gc.isenabled()
+
+	def instalar(self, director):
+		self.director = director
+		gc.disable()
+		if self.brutos:
+			self.contador.value = BRUTOS_INICIO
+		if tracemalloc is not None and not tracemalloc.is_tracing():
+			tracemalloc.start()
+		director.entrada.leer = self.envolver(director.entrada.leer, 'entrada')
+		director.presentar = self.envolver(director.presentar, 'presentar')
+		entrar = director.entrar
+		def entrar_medido():
+			entrar()
+			self.instrumentar(director.scene)
+		director.entrar = entrar_medido
+		self.instrumentar(director.scene)
+
+	def desinstalar(self):
+		self.cerrar_frame(False)
+		if self.tipos is not None:
+			self.tipos_final = tipos()
+		if tracemalloc is not None and tracemalloc.is_tracing():
+			tracemalloc.stop()
+		if self.brutos:
+			# Los netos de verdad no se saben: el gc empieza a contar de nuevo
+			self.contador.value = 0
+		if self.gc_antes:
+			gc.enable()
+
+	def instrumentar(self, escena):
+		''' Envuelve on_update y on_draw de escena (una sola vez) '''
+		if escena is None or escena.__dict__.get('_asignaciones'):
+			return
+		escena.on_update = self.envolver(escena.on_update, 'on_update')
+		escena.on_draw = self.envolver(escena.on_draw, 'on_draw')
+		escena._asignaciones = True
+
+	def envolver(self, funcion, fase):
+		i = FASES.index(fase)
+		def medida(*args, **kwargs):
+			if i == 0:
+				self.cerrar_frame()
+			memoria = memoria_actual()
+			objetos = gc.get_count()[0]
+			try:
+				return funcion(*args, **kwargs)
+			finally:
+				if self.objetos is not None:
+					self.objetos[i] += gc.get_count()[0] - objetos
+					self.bytes[i] += memoria_actual() - memoria
+		return medida
+
+	def cerrar_frame(self, seguir=True):
+		''' Guarda el frame que acaba y, si toca, pasa el gc antes del siguiente '''
+		if self.objetos is not None:
+			objetos = gc.get_count()[0]
+			memoria = memoria_actual()
+			resto = len(FASES) - 1
+			self.objetos[resto] = 0
+			self.bytes[resto] = 0
+			self.objetos[resto] = objetos - self.inicio_objetos - sum(self.objetos)
+			self.bytes[resto] = memoria - self.inicio_bytes - sum(self.bytes)
+			muestras = self.muestras.get(self.escena)
+			if muestras is None:
+				muestras = self.muestras[self.escena] = (array('l'), array('d'))
+			muestras[0].extend(self.objetos)
+			muestras[1].extend(self.bytes)
+			self.frames += 1
+			if self.mirar_tipos and self.frames == self.calentar:
+				self.tipos = tipos()
+				self.frames_tipos = self.frames
+		if not seguir:
+			self.objetos = None
+			return
+		if self.colectar and self.frames and self.frames % self.colectar == 0:
+			inicio = reloj()
+			recogidos = gc.collect()
+			self.pausas.append(((reloj() - inicio) * 1000.0, recogidos))
+			if self.brutos:
+				self.contador.value = BRUTOS_INICIO
+		escena = self.director.scene
+		self.escena = escena.__class__.__name__ if escena is not None else None
+		self.objetos = self.actual
+		for i in range(len(FASES)):
+			self.objetos[i] = 0
+			self.bytes[i] = 0.0
+		self.inicio_bytes = memoria_actual()
+		self.inicio_objetos = gc.get_count()[0]
+
+	def estable(self, escena):
+		''' Media por frame de cada fase, sin los primeros calentar frames '''
+		if escena not in self.muestras:
+			return None
+		fases = len(FASES)
+		objetos, memoria = [m[self.calentar * fases:] for m in self.muestras[escena]]
+		n = len(objetos) // fases
+		if not n:
+			return None
+		objetos = [float(sum(objetos[i::fases])) / n for i in range(fases)]
+		memoria = [sum(memoria[i::fases]) / n for i in range(fases)]
+		return {'frames': n, 'objetos': objetos, 'bytes': memoria,
+			'objetos_frame': sum(objetos), 'bytes_frame': sum(memoria)}
+
+	def vivos(self):
+		''' Objetos con gc vivos ganados por frame desde que se acabo de calentar '''
+		if self.tipos_final is None or self.frames == self.frames_tipos:
+			return None
+		return float(sum(self.tipos_final.values()) - sum(self.tipos.values())) / (
+			self.frames - self.frames_tipos)
+
+	def crecen(self, n=TIPOS):
+		''' Los n tipos con mas objetos vivos ganados desde que se acabo de calentar '''
+		if self.tipos_final is None:
+			return []
+		crecen = sorted(((self.tipos_final[t] - self.tipos.get(t, 0), t) for t in self.tipos_final),
+			reverse=True)
+		return [(t, d) for d, t in crecen[:n] if d > 0]
+
+	def informe(self, salida=sys.stdout):
+		salida.write("Objetos con gc que %s cada fase por frame (sin los %d primeros frames)%s\n" % (
+			"crea" if self.brutos else "deja", self.calentar,
+			"" if tracemalloc else "; sin tracemalloc no hay bytes"))
+		salida.write("%-14s %6s " % ('escena', 'frames') + " ".join("%10s" % f for f in FASES)
+			+ " %10s %10s\n" % ('total', 'bytes'))
+		for escena in sorted(self.muestras):
+			datos = self.estable(escena)
+			if datos is None:
+				continue
+			salida.write("%-14s %6d " % (escena, datos['frames'])
+				+ " ".join("%10.2f" % o for o in datos['objetos'])
+				+ " %10.2f %10s\n" % (datos['objetos_frame'],
+				"%.0f" % datos['bytes_frame'] if tracemalloc else "-"))
+		if self.vivos() is not None:
+			salida.write("Objetos vivos: %+.2f por frame\n" % self.vivos())
+		if self.pausas:
+			ms = sorted(p[0] for p in self.pausas)
+			salida.write("gc: %d pasadas cada %d frames, %.2f ms de media, %.2f ms max, %.0f objetos recogidos de media\n" % (
+				len(ms), self.colectar, sum(ms) / len(ms), ms[-1],
+				float(sum(p[1] for p in self.pausas)) / len(self.pausas)))
+
+	def json(self):
+		return {
+			'colectar': self.colectar,
+			'calentar': self.calentar,
+			'brutos': self.brutos,
+			'tracemalloc': tracemalloc is not None,
+			'fases': list(FASES),
+			'escenas': dict((escena, self.estable(escena)) for escena in self.muestras),
+			'pausas_gc': self.pausas,
+			'vivos_frame': self.vivos(),
+		}
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def memoria_actual():
+	''' Bytes que tiene ahora tracemalloc (0 si no esta) '''
+	if tracemalloc is None:
+		return 0
+	return tracemalloc.get_traced_memory()[0]
+
+def contador_gc():
+	"""La cuenta de la generacion 0 del gc de CPython (la que da
+	gc.get_count()[0]) como un ctypes.c_int que se puede cambiar, o None
+	si no se encuentra. Esta justo despues del umbral en la estructura a
+	la que apunta _PyGC_generation0 (hasta Python 3.7); para saber donde
+	se busca el umbral y se comprueba cambiandolo."""
+	if platform.python_implementation() != 'CPython' or sys.version_info >= (3, 8):
+		return None
+	try:
+		import ctypes
+		cabeza = ctypes.c_void_p.in_dll(ctypes.pythonapi, '_PyGC_generation0').value
+	except (ImportError, AttributeError, ValueError):
+		return None
+	umbral = gc.get_threshold()
+	for desplazamiento in range(0, 64, ctypes.sizeof(ctypes.c_int)):
+		campo = ctypes.c_int.from_address(cabeza + desplazamiento)
+		if campo.value != umbral[0]:
+			continue
+		gc.set_threshold(umbral[0] + 1, *umbral[1:])
+		es_umbral = campo.value == umbral[0] + 1
+		gc.set_threshold(*umbral)
+		contador = ctypes.c_int.from_address(cabeza + desplazamiento + ctypes.sizeof(ctypes.c_int))
+		if es_umbral and contador.value == gc.get_count()[0]:
+			return contador
+	return None
+
+def tipos():
+	''' Cuantos objetos con gc hay vivos de cada tipo '''
+	cuenta = {}
+	for objeto in gc.get_objects():
+		nombre = type(objeto).__name__
+		cuenta[nombre] = cuenta.get(nombre, 0) + 1
+	return cuenta
+
+def medir_partida(frames=FRAMES, medidor=None, semilla=0):
+	"""Juega SceneGame sin pantalla frames frames con la entrada y el
+	reloj del benchmark midiendo con medidor (un Asignaciones nuevo si
+	no se da), y lo devuelve."""
+	os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+	os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+	import pygame
+	from pygame.locals import K_UP, K_DOWN
+	import pong_escenas, benchmark
+	pygame.init()
+	guion = benchmark.Guion(frames, semilla, [K_UP, K_DOWN, None])
+	parches = [
+		(pygame.event, 'get', guion.eventos),
+		(pygame.key, 'get_pressed', guion.get_pressed),
+		(pong_escenas, 'RES', 0),
+		(pong_escenas, 'FPS', 0),
+		(pong_escenas, 'MUSIC', 0),
+		(pong_escenas, 'SEMILLA', semilla),
+		(pong_escenas, 'PERFIL', 0),
+		(pong_escenas, 'RITMO_ADAPTAR', 0),
+	]
+	originales = [(objeto, nombre, getattr(objeto, nombre)) for objeto, nombre, valor in parches]
+	for objeto, nombre, valor in parches:
+		setattr(objeto, nombre, valor)
+	if medidor is None:
+		medidor = Asignaciones()
+	try:
+		director = pong_escenas.Director()
+		director.ritmo = benchmark.RelojFijo()
+		medidor.instalar(director)
+		director.change_scene(pong_escenas.SceneGame(director))
+		director.loop()
+	finally:
+		medidor.desinstalar()
+		for objeto, nombre, valor in originales:
+			setattr(objeto, nombre, valor)
+	return medidor
+
+def test(frames=FRAMES, objetos=PRESUPUESTO_OBJETOS, memoria=PRESUPUESTO_BYTES,
+		vivos=PRESUPUESTO_VIVOS, creados=PRESUPUESTO_BRUTOS, brutos=False):
+	"""Test del presupuesto: juega SceneGame sin pasar nunca el gc (asi
+	todo lo que queda cuenta) y mira lo que deja cada frame en regimen
+	estable y cuantos objetos vivos gana. Con brutos mira en cambio
+	cuantos objetos crea cada frame (presupuesto creados), si el
+	interprete deja contarlos. Devuelve (fallos, Asignaciones); con
+	fallos van tambien los tipos que mas han crecido."""
+	medidor = medir_partida(frames, Asignaciones(0, mirar_tipos=True, brutos=brutos))
+	datos = medidor.estable('SceneGame')
+	fallos = []
+	if datos is None:
+		return ["SceneGame no ha llegado a %d frames" % medidor.calentar], medidor
+	if brutos and not medidor.brutos:
+		print("AVISO no se pueden contar los objetos creados: se mira solo lo que deja cada frame")
+	if medidor.brutos:
+		if datos['objetos_frame'] > creados:
+			fallos.append("SceneGame crea %.2f objetos por frame (presupuesto %.2f)" % (
+				datos['objetos_frame'], creados))
+	else:
+		if datos['objetos_frame'] > objetos:
+			fallos.append("SceneGame deja %.2f objetos por frame (presupuesto %.2f)" % (
+				datos['objetos_frame'], objetos))
+	if tracemalloc is not None and datos['bytes_frame'] > memoria:
+		fallos.append("SceneGame deja %.0f bytes por frame (presupuesto %d)" % (
+			datos['bytes_frame'], memoria))
+	ganados = medidor.vivos()
+	if ganados is None:
+		fallos.append("No se han contado los objetos vivos despues de calentar")
+	elif ganados > vivos:
+		fallos.append("SceneGame gana %.2f objetos vivos por frame (presupuesto %.2f)" % (
+			ganados, vivos))
+	if fallos and medidor.crecen():
+		fallos.append("Tipos que mas crecen: " + ", ".join("%s +%d" % c for c in medidor.crecen()))
+	return fallos, medidor
+
+def main():
+	parser = argparse.ArgumentParser(description="Asignaciones por frame de Not Pong")
+	parser.add_argument('--frames', type=int, default=FRAMES)
+	parser.add_argument('--colectar', type=int, default=COLECTAR, help="frames entre pasadas del gc")
+	parser.add_argument('--test', action='store_true', help="falla si se pasa del presupuesto")
+	parser.add_argument('--objetos', type=float, default=PRESUPUESTO_OBJETOS)
+	parser.add_argument('--bytes', type=float, default=PRESUPUESTO_BYTES)
+	parser.add_argument('--vivos', type=float, default=PRESUPUESTO_VIVOS)
+	parser.add_argument('--brutos', action='store_true',
+		help="cuenta todos los objetos creados (toca la cuenta del gc de CPython con ctypes)")
+	parser.add_argument('--creados', type=float, default=PRESUPUESTO_BRUTOS,
+		help="objetos creados por frame con --test --brutos")
+	parser.add_argument('--json', help="fichero donde guardar las medidas")
+	args = parser.parse_args()
+	if args.test:
+		fallos, medidor = test(args.frames, args.objetos, args.bytes, args.vivos, args.creados,
+			args.brutos)
+	else:
+		fallos, medidor = [], medir_partida(args.frames, Asignaciones(args.colectar, brutos=args.brutos))
+	medidor.informe()
+	if args.json:
+		with open(args.json, 'w') as fichero:
+			json.dump(medidor.json(), fichero, indent=1, sort_keys=True)
+	for fallo in fallos:
+		print("FALLO " + fallo)
+	if args.test and not fallos:
+		print("Dentro del presupuesto")
+	return 1 if fallos else 0
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	sys.exit(main())
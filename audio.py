@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+''' Musica y efectos de sonido '''
+
+# Módulos
+import sys, threading, array
+from io import BytesIO
+from timeit import default_timer
+import pygame
+# Constantes
+# Pistas de musica: nombre -> fichero
+PISTAS = {
+	'titulo': "music/title_theme.mp3",
+	'juego': "music/game_theme.mp3",
+}
+# Efectos: nombre -> (fichero, frecuencia (Hz) y duracion (ms) del pitido
+# que suena si no esta el fichero)
+EFECTOS = {
+	'golpe': ("sounds/golpe.wav", 440, 60),
+	'pared': ("sounds/pared.wav", 220, 40),
+	'gol': ("sounds/gol.wav", 660, 250),
+}
+# ms que tarda la musica en bajar (y en subir) al cambiar de pista
+FUNDIDO = 400
+# Canales reservados para los efectos
+CANALES = 4
+# Primeros bytes de cada formato que se acepta
+FIRMAS = ('ID3', '\xff\xfb', '\xff\xf3', '\xff\xf2', 'OggS', 'RIFF')
+
+# Clases
+# ---------------------------------------------------------------------
+class GestorAudio:
+	"""Musica y efectos de todo el juego.
+
+	iniciar() lee y comprueba las pistas en un hilo aparte, asi que el
+	juego arranca sin esperar al disco, y carga los efectos en Sounds
+	que se reparten entre CANALES canales reservados.
+
+	Las escenas piden la pista que quieren con pista() y el Director
+	llama a actualizar() en cada frame: la pista que suena baja de
+	volumen, se cambia por la nueva (ya en memoria) y esta sube. Nada
+	de esto espera.
+
+	Si falta algun fichero o no hay mixer se avisa una vez por stderr y
+	el juego sigue sin ese sonido."""
+
+	def __init__(self):
+		self.iniciado = False
+		# nombre -> bytes de la pista, o None si no se ha podido leer
+		self.pistas = {}
+		self.hilo = None
+		self.cerrojo = threading.Lock()
+		self.tiempo_carga = 0.0
+		self.efectos = {}
+		self.canales = []
+		self.siguiente = 0
+		# Pista que piden las escenas, la que esta cargada y su volumen
+		self.activa = True
+		self.deseada = None
+		self.actual = None
+		self.volumen = 0.0
+		# La musica carga de un BytesIO que tiene que seguir vivo
+		self.flujo = None
+		self.avisados = set()
+		# El Director los quita si no le da tiempo a todo (ver ritmo.py)
+		self.silenciar_efectos = False
+
+	def iniciar(self, pistas=PISTAS, efectos=EFECTOS):
+		if pygame.mixer.get_init() is None:
+			self.avisar("no hay mixer, el juego va sin sonido")
+			return
+		self.iniciado = True
+		self.hilo = threading.Thread(target=self.cargar_pistas, args=(dict(pistas),))
+		self.hilo.daemon = True
+		self.hilo.start()
+		pygame.mixer.set_reserved(CANALES)
+		self.canales = [pygame.mixer.Channel(i) for i in range(CANALES)]
+		for nombre, (ruta, frecuencia, ms) in efectos.items():
+			try:
+				self.efectos[nombre] = pygame.mixer.Sound(ruta)
+			except (pygame.error, IOError):
+				self.avisar("no se puede cargar %s, se usa un pitido" % ruta)
+				self.efectos[nombre] = pitido(frecuencia, ms)
+
+	def cargar_pistas(self, pistas):
+		''' En el hilo de carga: lee cada pista a memoria y mira que lo sea '''
+		inicio = default_timer()
+		for nombre, ruta in pistas.items():
+			try:
+				with open(ruta, 'rb') as fichero:
+					datos = fichero.read()
+				if not datos.startswith(FIRMAS):
+					raise IOError("formato desconocido")
+			except IOError, error:
+				self.avisar("no se puede cargar %s (%s), esa musica no sonara" % (ruta, error))
+				datos = None
+			with self.cerrojo:
+				self.pistas[nombre] = datos
+		self.tiempo_carga = default_timer() - inicio
+
+	def esperar(self):
+		''' Espera a que acabe la carga de pistas '''
+		if self.hilo is not None:
+			self.hilo.join()
+
+	def pista(self, nombre):
+		''' La pista que debe sonar (None -> ninguna) '''
+		self.deseada = nombre
+
+	def activar(self, activa):
+		''' Enciende o apaga la musica (los efectos siguen) '''
+		self.activa = activa
+
+	def actualizar(self, time):
+		if not self.iniciado:
+			return
+		deseada = self.deseada if self.activa else None
+		paso = float(time) / FUNDIDO
+		if self.actual != deseada:
+			if self.actual is not None and self.volumen > 0:
+				self.volumen = max(self.volumen - paso, 0.0)
+				pygame.mixer.music.set_volume(self.volumen)
+				return
+			if deseada is None:
+				pygame.mixer.music.stop()
+				self.actual = None
+				self.flujo = None
+				return
+			with self.cerrojo:
+				if deseada not in self.pistas:
+					# Aun se esta leyendo
+					return
+				datos = self.pistas[deseada]
+			pygame.mixer.music.stop()
+			self.actual = deseada
+			self.flujo = None
+			if datos is None:
+				return
+			try:
+				self.flujo = BytesIO(datos)
+				pygame.mixer.music.load(self.flujo)
+				pygame.mixer.music.set_volume(0.0)
+				pygame.mixer.music.play(-1)
+			except pygame.error, error:
+				self.avisar("no se puede tocar %s (%s)" % (deseada, error))
+				self.flujo = None
+			self.volumen = 0.0
+		elif self.flujo is not None and self.volumen < 1.0:
+			self.volumen = min(self.volumen + paso, 1.0)
+			pygame.mixer.music.set_volume(self.volumen)
+
+	def efecto(self, nombre):
+		''' Toca un efecto en un canal libre (o en el que mas lleva sonando) '''
+		sonido = self.efectos.get(nombre)
+		if sonido is None or self.silenciar_efectos:
+			return
+		n = len(self.canales)
+		for i in range(n):
+			canal = self.canales[(self.siguiente + i) % n]
+			if not canal.get_busy():
+				break
+		else:
+			canal = self.canales[self.siguiente]
+		self.siguiente = (self.canales.index(canal) + 1) % n
+		canal.play(sonido)
+
+	def avisar(self, mensaje):
+		if mensaje not in self.avisados:
+			self.avisados.add(mensaje)
+			sys.stderr.write("audio: %s\n" % mensaje)
+
+	def stats(self):
+		with self.cerrojo:
+			pistas = dict((nombre, len(datos) if datos else None)
+				for nombre, datos in self.pistas.items())
+		return {
+			'pistas': pistas,
+			'tiempo_carga': self.tiempo_carga,
+			'efectos': sorted(self.efectos),
+			'actual': self.actual,
+			'volumen': self.volumen,
+		}
+
+# ---------------------------------------------------------------------
+
+''' Sonido compartido por todo el juego '''
+sonido = GestorAudio()
+
+# Funciones
+# ---------------------------------------------------------------------
+def pitido(frecuencia, ms):
+	''' Sound con una onda cuadrada que se apaga poco a poco '''
+	muestreo, formato, canales = pygame.mixer.get_init()
+	n = int(muestreo * ms / 1000.0)
+	periodo = max(int(muestreo / frecuencia), 2)
+	if formato == -16:
+		tipo, amplitud, centro = 'h', 8000, 0
+	elif formato == 8:
+		tipo, amplitud, centro = 'B', 32, 128
+	else:
+		# Otros formatos (32 bits, float): mejor sin pitido que con ruido
+		return None
+	muestras = array.array(tipo)
+	for i in xrange(n):
+		valor = amplitud if (i % periodo) < periodo / 2 else -amplitud
+		valor = centro + int(valor * (1.0 - float(i) / n))
+		muestras.extend([valor] * canales)
+	return pygame.mixer.Sound(buffer=muestras.tostring())
+
+# ---------------------------------------------------------------------
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+''' Benchmark de todas las escenas en todas las resoluciones.
+
+	python benchmark.py -o resultados.json
+	python benchmark.py --comparar resultados.json
+
+Cada escena se juega sin limite de fps, con el driver de video "dummy"
+de SDL y con una entrada scripteada a partir de una semilla fija, asi
+que dos ejecuciones hacen exactamente lo mismo: el reloj del juego
+avanza 1000/60 ms por frame aunque se pinten miles de frames por
+segundo. '''
+
+# Módulos
+import os, sys, gc, json, random, argparse
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+import pygame
+from pygame.locals import *
+import pong, pong_escenas, motor
+from recursos import imagenes, cache_texto
+from perfil import percentil, reloj
+# Constantes
+FRAMES = 600
+SEMILLA = 0
+# Cuanto puede empeorar (en tanto por uno) antes de contar como regresion
+TOLERANCIA = 0.10
+# Cada cuantos frames cambia la tecla pulsada en el guion
+CAMBIO = 12
+# Escenas que se prueban y teclas que se pulsan en cada una
+ESCENAS = [
+	('SceneHome', [K_UP, K_DOWN]),
+	('SceneOptions', [K_UP, K_DOWN]),
+	('SceneGame', [K_UP, K_DOWN, None]),
+	('SceneCaos', [K_UP, K_DOWN, None]),
+	('pong.py', [K_w, K_s, K_UP, K_DOWN, None]),
+]
+
+# Clases
+# ---------------------------------------------------------------------
+class Teclas:
+	''' Lo que devuelve pygame.key.get_pressed() mientras dura el guion '''
+
+	def __init__(self):
+		self.pulsadas = set()
+
+	def __getitem__(self, tecla):
+		return tecla in self.pulsadas
+
+class Guion:
+	"""Entrada scripteada para un benchmark.
+
+	Sustituye a pygame.event.get (que el bucle llama una vez por frame)
+	y a pygame.key.get_pressed. Cada CAMBIO frames elige con su propia
+	semilla una tecla nueva, que se manda como KEYDOWN y queda pulsada.
+	Tras los frames pedidos manda QUIT. De paso mide cuanto dura cada
+	frame y cuantos objetos nuevos quedan vivos en cada uno."""
+
+	def __init__(self, frames, semilla, teclas):
+		self.frames = frames
+		self.random = random.Random(semilla)
+		self.teclas = teclas
+		self.estado = Teclas()
+		self.frame = 0
+		self.anterior = None
+		self.tiempos = []
+		self.objetos = 0
+
+	def get_pressed(self):
+		return self.estado
+
+	def eventos(self, *args, **kwargs):
+		ahora = reloj()
+		if self.anterior is not None:
+			self.tiempos.append(ahora - self.anterior)
+		self.anterior = ahora
+		self.frame += 1
+		pygame.event.pump()
+		if self.frame > self.frames:
+			self.objetos = gc.get_count()[0] - self.objetos
+			return [pygame.event.Event(QUIT)]
+		if self.frame == 1:
+			self.objetos = gc.get_count()[0]
+		if self.frame % CAMBIO != 1:
+			return []
+		tecla = self.random.choice(self.teclas)
+		self.estado.pulsadas = set() if tecla is None else set([tecla])
+		if tecla is None:
+			return []
+		return [pygame.event.Event(KEYDOWN, key=tecla, mod=0, unicode=u'', scancode=0)]
+
+class RelojFijo:
+	"""Sustituye a pygame.time.Clock y al Ritmo del Director: no espera,
+	cada frame dura lo mismo y nunca se deja de hacer nada."""
+	nivel = 0
+
+	def __init__(self, ms=1000.0 / 60):
+		self.ms = ms
+
+	def tick(self, fps=0):
+		return self.ms
+
+	def esperar(self):
+		return self.ms
+
+	def pintar(self):
+		return True
+
+	def cerrar(self):
+		pass
+
+class Cronometro:
+	''' Acumula el tiempo que pasa dentro de una funcion '''
+
+	def __init__(self):
+		self.tiempo = 0.0
+		self.llamadas = 0
+
+	def envolver(self, funcion):
+		def medida(*args, **kwargs):
+			inicio = reloj()
+			try:
+				return funcion(*args, **kwargs)
+			finally:
+				self.tiempo += reloj() - inicio
+				self.llamadas += 1
+		return medida
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def ejecutar(escena, resolucion, teclas, frames=FRAMES, semilla=SEMILLA):
+	''' Juega una escena frames frames y devuelve sus medidas '''
+	random.seed(semilla)
+	imagenes.limpiar()
+	cache_texto.limpiar()
+	guion = Guion(frames, semilla, teclas)
+	cronos = {'texto': Cronometro(), 'load_image': Cronometro(),
+		'Bola.actualizar': Cronometro()}
+	parches = [
+		(pygame.event, 'get', guion.eventos),
+		(pygame.key, 'get_pressed', guion.get_pressed),
+		(pygame.time, 'Clock', RelojFijo),
+		(pong_escenas, 'texto', cronos['texto'].envolver(pong_escenas.texto)),
+		(pong, 'texto', cronos['texto'].envolver(pong.texto)),
+		(pong_escenas, 'load_image', cronos['load_image'].envolver(pong_escenas.load_image)),
+		(pong, 'load_image', cronos['load_image'].envolver(pong.load_image)),
+		(motor, 'mover_bola', cronos['Bola.actualizar'].envolver(motor.mover_bola)),
+		(motor, 'mover_bola_barrido', cronos['Bola.actualizar'].envolver(motor.mover_bola_barrido)),
+		(pong.Bola, 'actualizar', cronos['Bola.actualizar'].envolver(pong.Bola.actualizar.im_func)),
+		(pong_escenas, 'RES', pong_escenas.RESOLUTION.index(tuple(resolucion))),
+		(pong_escenas, 'FPS', 0),
+		(pong_escenas, 'MUSIC', 0),
+		(pong_escenas, 'SEMILLA', semilla),
+		(pong_escenas, 'PERFIL', 1),
+		(pong_escenas, 'PERFIL_FICHERO', None),
+		(pong, 'WIDTH', resolucion[0]),
+		(pong, 'HEIGHT', resolucion[1]),
+		(pong, 'FPS', 0),
+	]
+	originales = [(objeto, nombre, getattr(objeto, nombre)) for objeto, nombre, valor in parches]
+	for objeto, nombre, valor in parches:
+		setattr(objeto, nombre, valor)
+	gc.collect()
+	gc.disable()
+	fases = {}
+	try:
+		if escena == 'pong.py':
+			try:
+				pong.main()
+			except SystemExit:
+				pass
+		else:
+			director = pong_escenas.Director()
+			director.ritmo = RelojFijo()
+			director.perfil.overlay = False
+			director.change_scene(getattr(pong_escenas, escena)(director))
+			director.loop()
+			fases = director.perfil.percentiles(escena)
+	finally:
+		gc.enable()
+		for objeto, nombre, valor in originales:
+			setattr(objeto, nombre, valor)
+
+	tiempos = sorted(t * 1000.0 for t in guion.tiempos)
+	total = sum(tiempos)
+	n = len(tiempos)
+	return {
+		'escena': escena,
+		'resolucion': list(resolucion),
+		'frames': n,
+		'fps': 1000.0 * n / total if total else 0.0,
+		'frame_ms': {
+			'media': total / n if n else 0.0,
+			'p50': percentil(tiempos, 50),
+			'p95': percentil(tiempos, 95),
+			'p99': percentil(tiempos, 99),
+			'max': tiempos[-1] if tiempos else 0.0,
+		},
+		'fases_ms': dict((fase, list(p)) for fase, p in fases.items()),
+		# Objetos con gc que se crean y no se liberan en el frame (neto)
+		'objetos_frame': float(guion.objetos) / n if n else 0.0,
+		'ms_frame': dict((nombre, 1000.0 * c.tiempo / n if n else 0.0)
+			for nombre, c in cronos.items()),
+		'llamadas_frame': dict((nombre, float(c.llamadas) / n if n else 0.0)
+			for nombre, c in cronos.items()),
+	}
+
+def benchmark(frames=FRAMES, semilla=SEMILLA, escenas=None):
+	resultados = []
+	for escena, teclas in ESCENAS:
+		if escenas and escena not in escenas:
+			continue
+		for resolucion in pong_escenas.RESOLUTION:
+			resultado = ejecutar(escena, resolucion, teclas, frames, semilla)
+			print('%-12s %4dx%-4d %8.1f fps  p95 %6.2f ms' % (escena,
+				resolucion[0], resolucion[1], resultado['fps'], resultado['frame_ms']['p95']))
+			resultados.append(resultado)
+	return {
+		'python': sys.version.split()[0],
+		'pygame': pygame.version.ver,
+		'frames': frames,
+		'semilla': semilla,
+		'resultados': resultados,
+	}
+
+def comparar(actual, base, tolerancia=TOLERANCIA):
+	''' Devuelve la lista de regresiones de actual respecto a base '''
+	anteriores = dict(((r['escena'], tuple(r['resolucion'])), r) for r in base['resultados'])
+	regresiones = []
+	for r in actual['resultados']:
+		antes = anteriores.get((r['escena'], tuple(r['resolucion'])))
+		if antes is None:
+			continue
+		nombre = '%s %dx%d' % (r['escena'], r['resolucion'][0], r['resolucion'][1])
+		if r['fps'] < antes['fps'] * (1 - tolerancia):
+			regresiones.append('%s: fps %.1f -> %.1f' % (nombre, antes['fps'], r['fps']))
+		if r['frame_ms']['p95'] > antes['frame_ms']['p95'] * (1 + tolerancia):
+			regresiones.append('%s: p95 %.2f -> %.2f ms' % (nombre,
+				antes['frame_ms']['p95'], r['frame_ms']['p95']))
+	return regresiones
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark de Not Pong")
+	parser.add_argument('-o', '--salida', help="fichero JSON con los resultados")
+	parser.add_argument('--frames', type=int, default=FRAMES)
+	parser.add_argument('--semilla', type=int, default=SEMILLA)
+	parser.add_argument('--escenas', nargs='*', help="solo estas escenas")
+	parser.add_argument('--comparar', help="resultados guardados con los que comparar")
+	parser.add_argument('--tolerancia', type=float, default=TOLERANCIA)
+	args = parser.parse_args()
+
+	pygame.init()
+	resultados = benchmark(args.frames, args.semilla, args.escenas)
+	if args.salida:
+		with open(args.salida, 'w') as fichero:
+			json.dump(resultados, fichero, indent=1, sort_keys=True)
+	if args.comparar:
+		with open(args.comparar) as fichero:
+			base = json.load(fichero)
+		regresiones = comparar(resultados, base, args.tolerancia)
+		for regresion in regresiones:
+			print('REGRESION ' + regresion)
+		if regresiones:
+			return 1
+		print('Sin regresiones')
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
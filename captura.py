@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+''' Captura de lo que se pinta a PNG o a un video que lee ffmpeg.
+
+	pong_escenas.CAPTURA = "captura/"       (PNG: captura/frame_000000.png...)
+	pong_escenas.CAPTURA = "partida.y4m"    (YUV 4:2:0, ffmpeg -i partida.y4m ...)
+	pong_escenas.CAPTURA = "partida.rgb"    (RGB crudo, ver Captura.cerrar)
+	python repeticion.py partida.rep --video partida.y4m   (sin pantalla)
+
+El Director copia cada frame pintado a un buffer libre (una superficie
+del mismo formato que screen: la copia es un blit, sin crear nada) y lo
+deja en la cola de un hilo que lo codifica y lo escribe. Los buffers son
+siempre los mismos BUFFERS; si no queda ninguno libre el juego no espera
+al hilo (salvo con presion 'esperar'):
+
+	'juntar'  el frame nuevo se copia encima del ultimo que espera en la
+	          cola, que se escribe las veces de los dos
+	'soltar'  el frame nuevo no se copia: el ultimo de la cola se escribe
+	          una vez mas en su lugar
+	'esperar' se espera a que el hilo suelte un buffer (para repeticiones
+	          sin pantalla, donde no hay prisa por pintar)
+
+El video va a fps fijos: cada frame del juego se escribe tantas veces
+como frames de video caben en lo que ha durado (puede ser ninguna). '''
+
+# Módulos
+import os, sys, shutil, threading
+from collections import deque
+from timeit import default_timer as reloj
+import pygame
+try:
+	import numpy as np
+except ImportError:
+	np = None
+# Constantes
+FORMATOS = ('png', 'raw', 'y4m')
+PRESIONES = ('juntar', 'soltar', 'esperar')
+# Superficies que se reutilizan entre el juego y el hilo que escribe
+BUFFERS = 8
+FPS = 60
+# Nombre de cada frame en las capturas a PNG
+PLANTILLA_PNG = "frame_%06d.png"
+
+# Clases
+# ---------------------------------------------------------------------
+class Captura:
+	"""Escribe en salida los frames que se le pasan, desde otro hilo.
+
+	Por cada frame del juego se llama a avanzar(ms) con lo que ha durado,
+	que dice cuantos frames de video tocan, y si toca alguno a
+	capturar(screen, veces). screen None repite el ultimo frame (el
+	Director lo hace en los frames que no se pintan).
+
+	formato None lo saca de salida: .y4m, .rgb o .raw, y si no un
+	directorio de PNG. plantilla es la superficie cuyo formato tienen los
+	buffers (para que copiar sea un blit directo)."""
+
+	def __init__(self, salida, tam, fps=FPS, formato=None, buffers=BUFFERS,
+			presion='juntar', plantilla=None):
+		if formato is None:
+			formato = formato_de(salida)
+		if formato not in FORMATOS:
+			raise ValueError("Formato de captura desconocido: %r" % (formato,))
+		if presion not in PRESIONES:
+			raise ValueError("Presion desconocida: %r" % (presion,))
+		if formato == 'y4m' and np is None:
+			raise ValueError("La captura a .y4m necesita numpy")
+		self.salida = salida
+		self.tam = tam
+		self.fps = fps
+		self.formato = formato
+		self.presion = presion
+		self.periodo = 1000.0 / fps
+		# El primer frame se escribe siempre
+		self.acumulado = self.periodo
+		if plantilla is not None:
+			self.libres = [pygame.Surface(tam, 0, plantilla) for i in range(buffers)]
+		else:
+			self.libres = [pygame.Surface(tam) for i in range(buffers)]
+		# [buffer, veces] en orden; buffer None -> repetir el anterior
+		self.cola = deque()
+		self.condicion = threading.Condition()
+		self.cerrando = False
+		# Frames de video escritos, que han repetido el anterior porque no
+		# habia buffer y que se han juntado con el anterior; veces que se
+		# ha esperado al hilo
+		self.escritos = 0
+		self.soltados = 0
+		self.juntados = 0
+		self.esperas = 0
+		self.tiempo_escribir = 0.0
+		if formato == 'png':
+			if not os.path.isdir(salida):
+				os.makedirs(salida)
+			self.fichero = None
+		else:
+			self.fichero = open(salida, 'wb')
+			if formato == 'y4m':
+				self.fichero.write("YUV4MPEG2 W%d H%d F%d:1 Ip A1:1 C420jpeg\n" % (tam[0], tam[1], fps))
+		# Lo ultimo escrito, para repetirlo, y el numero del siguiente PNG
+		self.ultimo = None
+		self.numero = 0
+		self.error = None
+		self.hilo = threading.Thread(target=self.escribir_cola, name="captura")
+		self.hilo.daemon = True
+		self.hilo.start()
+
+	def avanzar(self, ms):
+		''' Frames de video que tocan tras ms de juego '''
+		self.acumulado += ms
+		veces = int(self.acumulado // self.periodo)
+		self.acumulado -= veces * self.periodo
+		return veces
+
+	def capturar(self, screen, veces=1):
+		"""Pone screen en la cola para escribirse veces frames seguidos.
+		Solo espera al hilo con presion 'esperar'."""
+		if veces <= 0:
+			return
+		with self.condicion:
+			if self.error is not None:
+				return
+			if screen is None:
+				self.repetir(veces)
+				return
+			if not self.libres and self.presion == 'esperar':
+				self.esperas += 1
+				while not self.libres and self.error is None:
+					self.condicion.wait()
+			if self.libres:
+				buffer = self.libres.pop()
+				buffer.blit(screen, (0, 0))
+				self.cola.append([buffer, veces])
+				self.condicion.notify()
+			elif self.presion == 'juntar' and self.cola and self.cola[-1][0] is not None:
+				# El hilo no toca lo que sigue en la cola
+				self.cola[-1][0].blit(screen, (0, 0))
+				self.cola[-1][1] += veces
+				self.juntados += veces
+			else:
+				self.repetir(veces)
+				self.soltados += veces
+
+	def repetir(self, veces):
+		if self.cola:
+			self.cola[-1][1] += veces
+		else:
+			self.cola.append([None, veces])
+			self.condicion.notify()
+
+	def escribir_cola(self):
+		''' Lo que hace el hilo: escribe lo que llega hasta que se cierra '''
+		while True:
+			with self.condicion:
+				while not self.cola and not self.cerrando:
+					self.condicion.wait()
+				if not self.cola:
+					return
+				buffer, veces = self.cola.popleft()
+			inicio = reloj()
+			try:
+				self.escribir(buffer, veces)
+			except Exception as error:
+				with self.condicion:
+					self.error = error
+					if buffer is not None:
+						self.libres.append(buffer)
+					self.condicion.notify_all()
+				return
+			self.tiempo_escribir += reloj() - inicio
+			with self.condicion:
+				self.escritos += veces
+				if buffer is not None:
+					self.libres.append(buffer)
+					self.condicion.notify_all()
+
+	def escribir(self, buffer, veces):
+		if self.formato == 'png':
+			for i in range(veces):
+				nombre = os.path.join(self.salida, PLANTILLA_PNG % self.numero)
+				if buffer is not None and i == 0:
+					pygame.image.save(buffer, nombre)
+				elif self.ultimo is not None:
+					shutil.copyfile(self.ultimo, nombre)
+				else:
+					continue
+				self.ultimo = nombre
+				self.numero += 1
+			return
+		if buffer is not None:
+			if self.formato == 'raw':
+				self.ultimo = pygame.image.tostring(buffer, 'RGB')
+			else:
+				self.ultimo = "FRAME\n" + yuv420(buffer)
+		if self.ultimo is not None:
+			for i in range(veces):
+				self.fichero.write(self.ultimo)
+
+	def cerrar(self, salida=sys.stderr):
+		''' Espera a que se escriba todo lo que hay en la cola y lo cuenta por salida '''
+		with self.condicion:
+			self.cerrando = True
+			self.condicion.notify_all()
+		self.hilo.join()
+		if self.fichero is not None:
+			self.fichero.close()
+			self.fichero = None
+		if self.error is not None:
+			salida.write("captura: error escribiendo %s: %s\n" % (self.salida, self.error))
+			return
+		ms = 1000.0 * self.tiempo_escribir / max(self.escritos, 1)
+		salida.write("captura: %d frames a %d fps en %s (%d juntados, %d soltados, %d esperas), %.2f ms por frame escrito\n" % (
+			self.escritos, self.fps, self.salida, self.juntados, self.soltados, self.esperas, ms))
+		if self.formato == 'raw':
+			salida.write("captura: ffmpeg -f rawvideo -pix_fmt rgb24 -s %dx%d -r %d -i %s video.mp4\n" % (
+				self.tam[0], self.tam[1], self.fps, self.salida))
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def formato_de(salida):
+	''' Formato de captura segun la extension de salida '''
+	extension = os.path.splitext(salida)[1].lower()
+	if extension == '.y4m':
+		return 'y4m'
+	if extension in ('.rgb', '.raw'):
+		return 'raw'
+	return 'png'
+
+def yuv420(superficie):
+	"""Los planos Y, U y V (la mitad de ancho y de alto) de superficie en
+	rango limitado BT.601, seguidos, como los quiere un frame de y4m."""
+	ancho, alto = superficie.get_size()
+	rgb = np.frombuffer(pygame.image.tostring(superficie, 'RGB'), dtype=np.uint8)
+	rgb = rgb.reshape(alto, ancho, 3)
+	if ancho % 2 or alto % 2:
+		# U y V son de bloques de 2x2: se repite el borde
+		rgb = np.pad(rgb, ((0, alto % 2), (0, ancho % 2), (0, 0)), 'edge')
+	# Un plano seguido por canal (mas rapido que ir saltando de 3 en 3);
+	# en uint16 cabe Y, que solo suma
+	r, g, b = rgb.transpose(2, 0, 1).astype(np.uint16)
+	y = 66 * r
+	y += 129 * g
+	y += 25 * b
+	y += 128 + (16 << 8)
+	y >>= 8
+	r, g, b = media_2x2(r), media_2x2(g), media_2x2(b)
+	u = ((-38 * r - 74 * g + 112 * b + 128) >> 8) + 128
+	v = ((112 * r - 94 * g - 18 * b + 128) >> 8) + 128
+	return (y[:alto, :ancho].astype(np.uint8).tobytes() + u.astype(np.uint8).tobytes()
+		+ v.astype(np.uint8).tobytes())
+
+def media_2x2(plano):
+	''' Media redondeada de cada bloque de 2x2 de un plano de tamaño par '''
+	suma = plano[0::2] + plano[1::2]
+	return (suma[:, 0::2] + suma[:, 1::2] + 2).astype(np.int32) >> 2
+
+# ---------------------------------------------------------------------
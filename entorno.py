@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+''' Entorno para entrenar palas: muchas partidas que avanzan con step().
+
+	python entorno.py                  (pasos/s segun el numero de entornos)
+	python entorno.py --ver 0          (mira el entorno 0 en la pantalla)
+
+	entorno = Entorno(1024)
+	obs = entorno.reset(seed=0)
+	while True:
+		obs, recompensa, hecho, info = entorno.step(acciones)
+
+Las reglas son las de SceneGame (motor.py) en un motor_lotes.Lote, sin
+pygame. El agente mueve la pala del jugador (la izquierda) y la cpu
+juega con la IA de la configuracion. Sin la cuenta atras de 3 segundos
+tras cada gol: el saque es en el paso siguiente.
+
+Cada accion es la mascara de repeticion.py: 0 nada, 1 arriba, 2 abajo
+(3, las dos, es lo que hace mover_pala con las dos teclas pulsadas).
+
+La observacion de cada entorno es una fila de OBSERVACION, con las
+posiciones divididas por el tamaño del campo y las velocidades en px/ms.
+step() y reset() devuelven siempre los mismos arrays, reescritos: si se
+quieren guardar hay que copiarlos.
+
+Un entorno acaba al llegar uno a PUNTOS goles o tras DURACION pasos
+(truncado). Entonces empieza otra partida con la siguiente semilla y la
+observacion que se devuelve ya es la de la partida nueva; el marcador
+con el que acabo queda en info['puntos_jug'] e info['puntos_cpu']. '''
+
+# Módulos
+import sys, random, argparse
+from timeit import default_timer
+import numpy as np
+import motor, motor_lotes
+from motor import GOLPE
+# Constantes
+NADA = 0
+ARRIBA = 1
+ABAJO = 2
+OBSERVACION = ('x', 'y', 'vx', 'vy', 'y_jug', 'y_cpu')
+PUNTOS = 5
+# Pasos de 1000/60 ms que dura como mucho una partida (2 minutos)
+DURACION = 60 * 60 * 2
+# Recompensa por cada gol a favor (en contra resta lo mismo) y por cada
+# golpe de la pala del jugador
+RECOMPENSA_GOL = 1.0
+RECOMPENSA_GOLPE = 0.0
+# Cuantos entornos se miden en el benchmark
+CANTIDADES = (1, 16, 256, 4096, 16384)
+
+# Clases
+# ---------------------------------------------------------------------
+class Entorno:
+	"""n partidas contra la IA de la cpu, con la API de un entorno de gym
+	vectorizado: reset(seed) y step(acciones).
+
+	config es la de motor.CONFIG (la cpu, la velocidad de las palas,
+	el tamaño del campo...). Con ver=i cada step() pinta el entorno i en
+	la pantalla del juego; sin ver no se importa pygame."""
+
+	def __init__(self, n, config=None, puntos=PUNTOS, duracion=DURACION,
+			recompensa_gol=RECOMPENSA_GOL, recompensa_golpe=RECOMPENSA_GOLPE, ver=None):
+		self.n = n
+		self.config = dict(config or {})
+		self.config['jugador'] = 'quieto'
+		self.puntos = puntos
+		self.duracion = duracion
+		self.recompensa_gol = recompensa_gol
+		self.recompensa_golpe = recompensa_golpe
+		self.lote = None
+		self.siguiente = 0
+		self.pasos = np.zeros(n, dtype=np.int64)
+		''' Lo que devuelven reset() y step(), siempre los mismos arrays '''
+		self.observacion = np.zeros((n, len(OBSERVACION)), dtype=np.float32)
+		self.recompensa = np.zeros(n, dtype=np.float32)
+		self.hecho = np.zeros(n, dtype=bool)
+		self.truncado = np.zeros(n, dtype=bool)
+		self.final_jug = np.zeros(n, dtype=np.int64)
+		self.final_cpu = np.zeros(n, dtype=np.int64)
+		self.info = {'truncado': self.truncado, 'puntos_jug': self.final_jug,
+			'puntos_cpu': self.final_cpu, 'sucesos': None}
+		self.ver = ver
+		self.pantalla = None
+
+	def reset(self, seed=None):
+		"""Empieza todas las partidas: la del entorno i con la semilla
+		seed + i (seed None -> al azar). Devuelve la observacion."""
+		if seed is None:
+			seed = random.randrange(2**31)
+		self.lote = motor_lotes.Lote(self.n, self.config, seed)
+		self.siguiente = seed + self.n
+		self.pasos[:] = 0
+		self.observar()
+		if self.ver is not None:
+			self.dibujar(self.ver)
+		return self.observacion
+
+	def step(self, acciones):
+		"""Un paso de 1000/60 ms de todos los entornos con una accion por
+		entorno. Devuelve (observacion, recompensa, hecho, info)."""
+		lote = self.lote
+		if lote is None:
+			raise RuntimeError("step() antes de reset()")
+		acciones = np.asarray(acciones)
+		goles_jug = lote.puntos_jug.copy()
+		goles_cpu = lote.puntos_cpu.copy()
+		sucesos = lote.paso(None, (acciones & ARRIBA) != 0, (acciones & ABAJO) != 0)
+		goles_jug = lote.puntos_jug - goles_jug
+		goles_cpu = lote.puntos_cpu - goles_cpu
+		recompensa = self.recompensa
+		recompensa[:] = self.recompensa_gol * (goles_jug - goles_cpu)
+		if self.recompensa_golpe:
+			# Tras un golpe de la pala del jugador la pelota va a la derecha
+			recompensa += self.recompensa_golpe * (((sucesos & GOLPE) != 0) & (lote.vx > 0))
+		self.pasos += 1
+		ganado = (lote.puntos_jug >= self.puntos) | (lote.puntos_cpu >= self.puntos)
+		self.truncado[:] = ~ganado & (self.pasos >= self.duracion)
+		hecho = self.hecho
+		hecho[:] = ganado | self.truncado
+		if hecho.any():
+			self.final_jug[hecho] = lote.puntos_jug[hecho]
+			self.final_cpu[hecho] = lote.puntos_cpu[hecho]
+			self.reiniciar(hecho)
+		self.info['sucesos'] = sucesos
+		self.observar()
+		if self.ver is not None:
+			self.dibujar(self.ver)
+		return self.observacion, recompensa, hecho, self.info
+
+	def reiniciar(self, mascara):
+		''' Partida nueva en los entornos de la mascara, con las siguientes semillas '''
+		lote = self.lote
+		c = lote.config
+		indices = np.flatnonzero(mascara)
+		for i in indices:
+			lote.randoms[i] = random.Random(self.siguiente)
+			lote.randoms_ia[i] = random.Random(lote.randoms[i].random())
+			self.siguiente += 1
+		lote.x[indices] = lote.width / 2.0
+		lote.y[indices] = lote.height / 2.0
+		lote.vx[indices] = c['speed_bola'][0]
+		lote.vy[indices] = c['speed_bola'][1]
+		lote.y_jug[indices] = lote.height / 2.0
+		lote.y_cpu[indices] = lote.height / 2.0
+		lote.puntos_jug[indices] = 0
+		lote.puntos_cpu[indices] = 0
+		for cache in (lote.cache_jug, lote.cache_cpu):
+			if cache is not None:
+				cache.vx[indices] = 0.0
+				cache.vy[indices] = 0.0
+				cache.objetivo[indices] = lote.height / 2.0
+				cache.espera[indices] = 0.0
+		self.pasos[indices] = 0
+
+	def observar(self):
+		lote = self.lote
+		obs = self.observacion
+		obs[:, 0] = lote.x / lote.width
+		obs[:, 1] = lote.y / lote.height
+		obs[:, 2] = lote.vx
+		obs[:, 3] = lote.vy
+		obs[:, 4] = lote.y_jug / lote.height
+		obs[:, 5] = lote.y_cpu / lote.height
+
+	def dibujar(self, indice):
+		''' Pinta el entorno indice en la pantalla (la abre la primera vez) '''
+		if self.pantalla is None:
+			self.pantalla = Pantalla(self.lote.width, self.lote.height)
+		return self.pantalla.dibujar(self.lote, indice)
+
+	def cerrar(self):
+		if self.pantalla is not None:
+			self.pantalla.cerrar()
+			self.pantalla = None
+
+class Pantalla:
+	"""Ventana donde se pinta un entorno con las imagenes del juego y lo
+	que pinta SceneGame (pong_escenas.pintar_campo y textos_marcador). Es
+	lo unico que usa pygame, y solo se importa al crearla."""
+
+	def __init__(self, width, height):
+		import pygame, recursos, pong_escenas
+		from render import ColaRender, HUD
+		self.pygame = pygame
+		self.escenas = pong_escenas
+		self.hud = HUD
+		pygame.init()
+		pygame.display.set_caption("Not Pong - entorno")
+		self.screen = pygame.display.set_mode((width, height))
+		self.cola = ColaRender((width, height))
+		self.width = width
+		self.fondo = recursos.load_image("images/fondo_pong.png")
+		self.bola = recursos.load_image("images/ball.png", True)
+		self.pala = recursos.load_image("images/pala.png")
+		self.marcador = None
+		self.abierta = True
+
+	def dibujar(self, lote, i):
+		"Pinta la partida i del lote. Devuelve False si se ha cerrado la ventana."
+		pygame = self.pygame
+		for event in pygame.event.get():
+			if event.type == pygame.QUIT:
+				self.abierta = False
+		marcador = (int(lote.puntos_jug[i]), int(lote.puntos_cpu[i]))
+		if marcador != self.marcador:
+			self.marcador = marcador
+			self.textos = self.escenas.textos_marcador(marcador, self.width)
+		self.escenas.pintar_campo(self.cola, self.fondo,
+			self.bola, centrado(self.bola, lote.x[i], lote.y[i]),
+			self.pala, centrado(self.pala, lote.x_jug, lote.y_jug[i]),
+			centrado(self.pala, lote.x_cpu, lote.y_cpu[i]))
+		for image, rect in self.textos:
+			self.cola.pintar(image, rect, self.hud)
+		self.cola.ejecutar(self.screen)
+		pygame.display.flip()
+		return self.abierta
+
+	def cerrar(self):
+		self.pygame.display.quit()
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def centrado(image, x, y):
+	''' Rect de image centrado en (x, y) redondeado, como sincronizan los sprites '''
+	rect = image.get_rect()
+	rect.center = (int(round(x)), int(round(y)))
+	return rect
+
+def seguir(observacion):
+	''' Politica de ejemplo: la pala va hacia la altura de la pelota '''
+	acciones = np.zeros(len(observacion), dtype=np.int8)
+	acciones[observacion[:, 4] > observacion[:, 1]] = ARRIBA
+	acciones[observacion[:, 4] < observacion[:, 1]] = ABAJO
+	return acciones
+
+def medir(n, pasos=200, seed=0):
+	''' Pasos de entorno por segundo con n entornos y acciones al azar '''
+	entorno = Entorno(n)
+	entorno.reset(seed)
+	rng = np.random.RandomState(seed)
+	acciones = rng.randint(0, 3, size=(pasos, n)).astype(np.int8)
+	inicio = default_timer()
+	for paso in xrange(pasos):
+		entorno.step(acciones[paso])
+	return n * pasos / (default_timer() - inicio)
+
+def main():
+	parser = argparse.ArgumentParser(description="Entorno de entrenamiento de Not Pong")
+	parser.add_argument('cantidades', nargs='*', type=int, default=CANTIDADES)
+	parser.add_argument('--pasos', type=int, default=200)
+	parser.add_argument('--ver', type=int, help="mira este entorno con la politica seguir()")
+	parser.add_argument('--entornos', type=int, default=16, help="entornos con --ver")
+	parser.add_argument('--partidas', type=int, default=0, help="con --ver: acaba tras estas (0 -> al cerrar)")
+	args = parser.parse_args()
+	if args.ver is None:
+		for n in args.cantidades:
+			print("%6d entornos: %10.0f pasos/s" % (n, medir(n, args.pasos)))
+		return 0
+	import pygame
+	entorno = Entorno(args.entornos, ver=args.ver)
+	observacion = entorno.reset(0)
+	reloj = pygame.time.Clock()
+	partidas = 0
+	while entorno.pantalla.abierta and (not args.partidas or partidas < args.partidas):
+		observacion, recompensa, hecho, info = entorno.step(seguir(observacion))
+		if hecho[args.ver]:
+			partidas += 1
+			print("Entorno %d: %d - %d%s" % (args.ver, info['puntos_jug'][args.ver],
+				info['puntos_cpu'][args.ver], " (tiempo)" if info['truncado'][args.ver] else ""))
+		reloj.tick(60)
+	entorno.cerrar()
+	return 0
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+''' Entrada del juego: una foto de las acciones por frame '''
+
+# Módulos
+import pygame
+from collections import namedtuple
+from pygame.locals import *
+# Constantes
+# Acciones del juego
+ARRIBA = 'arriba'
+ABAJO = 'abajo'
+ACEPTAR = 'aceptar'
+ATRAS = 'atras'
+REBOBINAR = 'rebobinar'
+# Acciones que usa el Director
+SALIR = 'salir'
+PERFIL = 'perfil'
+# Tecla -> accion
+MAPA = {
+	K_UP: ARRIBA,
+	K_DOWN: ABAJO,
+	K_RETURN: ACEPTAR,
+	K_KP_ENTER: ACEPTAR,
+	K_BACKSPACE: ATRAS,
+	K_r: REBOBINAR,
+	K_ESCAPE: SALIR,
+	K_F3: PERFIL,
+}
+# Los unicos eventos que llegan a la cola (el resto los tira SDL)
+PERMITIDOS = [QUIT, KEYDOWN, KEYUP]
+NINGUNA = frozenset()
+
+# Clases
+# ---------------------------------------------------------------------
+class Estado(namedtuple('Estado', 'pulsadas nuevas salir')):
+	"""Foto de la entrada, que no cambia una vez hecha.
+
+	pulsadas son las acciones cuyas teclas estan pulsadas, nuevas las
+	que se han pulsado desde el ultimo paso de simulacion (con la
+	repeticion de teclas incluida) y salir si se ha cerrado la ventana."""
+	__slots__ = ()
+
+	def pulsada(self, accion):
+		return accion in self.pulsadas
+
+	def nueva(self, accion):
+		return accion in self.nuevas
+
+class Entrada:
+	"""Lee la entrada una vez por frame.
+
+	El Director llama a leer() al principio de cada frame, que vacia la
+	cola de eventos de una vez y mira el teclado una sola vez. Las
+	escenas leen actual() en cada paso de simulacion y el Director llama
+	a consumir() tras cada paso, asi que cada accion nueva se ve en un
+	solo paso: si en un frame no hay ningun paso se guarda para el
+	siguiente."""
+
+	def __init__(self, mapa=MAPA):
+		self.mapa = dict(mapa)
+		self.teclas = self.mapa.items()
+		self.pendientes = NINGUNA
+		self.estado = Estado(NINGUNA, NINGUNA, False)
+
+	def permitir(self):
+		''' Deja entrar en la cola solo los eventos de PERMITIDOS '''
+		pygame.event.set_blocked(None)
+		pygame.event.set_allowed(PERMITIDOS)
+
+	def leer(self):
+		salir = False
+		nuevas = set(self.pendientes)
+		mapa = self.mapa
+		for event in pygame.event.get():
+			if event.type == QUIT:
+				salir = True
+			elif event.type == KEYDOWN:
+				accion = mapa.get(event.key)
+				if accion is not None:
+					nuevas.add(accion)
+		teclado = pygame.key.get_pressed()
+		pulsadas = frozenset(accion for tecla, accion in self.teclas if teclado[tecla])
+		self.pendientes = frozenset(nuevas)
+		self.estado = Estado(pulsadas, self.pendientes, salir)
+		return self.estado
+
+	def actual(self):
+		return self.estado
+
+	def consumir(self):
+		''' Tras un paso de simulacion las acciones nuevas ya se han visto '''
+		if self.pendientes:
+			self.pendientes = NINGUNA
+			self.estado = Estado(self.estado.pulsadas, NINGUNA, self.estado.salir)
+
+# ---------------------------------------------------------------------
@@ -0,0 +1,575 @@
+# -*- coding: utf-8 -*-
+
+''' Reglas del juego sin pygame: se pueden simular partidas sin pantalla '''
+
+# Módulos
+import random
+from array import array
+from timeit import default_timer
+# Constantes
+WIDTH = 640
+HEIGHT = 480
+# Tamaño de images/ball.png y de images/pala.png
+BOLA = (16, 16)
+PALA = (15, 60)
+
+# Sucesos que devuelve mover_bola (se combinan con |)
+PARED = 1
+GOLPE = 2
+GOL = 4
+
+# Maximo de choques que se resuelven en un paso con colision por barrido
+MAX_REBOTES = 8
+
+# Lo que guarda Partida.foto(), en este orden, en un array de doubles
+FOTO = ('x', 'y', 'vx', 'vy',
+	'y_jug', 'objetivo_jug', 'firma_x_jug', 'firma_y_jug', 'espera_jug',
+	'y_cpu', 'objetivo_cpu', 'firma_x_cpu', 'firma_y_cpu', 'espera_cpu',
+	'puntos_jug', 'puntos_cpu', 'usos', 'usos_ia', 'extra')
+
+# Configuracion por defecto de una partida
+CONFIG = {
+	'width': WIDTH,
+	'height': HEIGHT,
+	'bola': BOLA,
+	'pala': PALA,
+	# Centro de cada pala (a 30px de cada lado)
+	'x_jug': 30,
+	'x_cpu': WIDTH - 30,
+	'speed_jug': 0.5,
+	'speed_cpu': 0.4,
+	'speed_bola': (0.5, -0.5),
+	# ms que dura cada paso en simulate()
+	'paso': 1000.0 / 60,
+	# Quien mueve la pala del jugador en simulate(): 'ia' o 'quieto'
+	'jugador': 'ia',
+	# 'discreta': mover y mirar si se solapa (como el juego original)
+	# 'barrido': buscar el primer choque en el recorrido (mover_bola_barrido)
+	'colision': 'discreta',
+	# IA de cada pala: 'seguir' (ia), 'predecir' (ia_predictiva) o
+	# 'quieto' (nadie: la mueve quien llame a mover_pala)
+	'ia_jug': 'seguir',
+	'ia_cpu': 'seguir',
+	# Dificultad de 'predecir': ms que tarda en reaccionar y error en px
+	'reaccion_jug': 0,
+	'reaccion_cpu': 0,
+	'error_jug': 0,
+	'error_cpu': 0,
+}
+
+# Clases
+# ---------------------------------------------------------------------
+class EstadoBola(object):
+	"""Posicion (centro, en pixeles con decimales) y velocidad de la
+	pelota, en px/ms. Es lo que mueve mover_bola()."""
+	__slots__ = ('w', 'h', 'width', 'height', 'x', 'y', 'speed')
+
+	def __init__(self, size=BOLA, width=WIDTH, height=HEIGHT):
+		self.w, self.h = size
+		self.width = width
+		self.height = height
+		self.x = width / 2.0
+		self.y = height / 2.0
+		#Velocidad en el eje X, eje Y
+		self.speed = [0.5, -0.5]
+
+class EstadoPala(object):
+	"""Posicion (centro) y velocidad de una pala."""
+	__slots__ = ('w', 'h', 'width', 'height', 'x', 'y', 'speed',
+		'reaccion', 'error', 'objetivo', 'firma', 'espera')
+
+	def __init__(self, x, size=PALA, width=WIDTH, height=HEIGHT, speed=0.5):
+		self.w, self.h = size
+		self.width = width
+		self.height = height
+		self.x = float(x)
+		self.y = height / 2.0
+		self.speed = speed
+		# Para ia_predictiva: dificultad y calculo guardado
+		self.reaccion = 0
+		self.error = 0
+		self.objetivo = self.y
+		self.firma = (0.0, 0.0)
+		self.espera = 0
+
+class Partida:
+	"""Una partida entera sin pantalla, sin imagenes y sin fuentes.
+
+	Usa las mismas funciones que los sprites de pong_escenas, asi que lo
+	que pasa aqui es lo mismo que pasa en SceneGame. La pala de la cpu
+	la mueve ia(); la del jugador la mueve quien llame a
+	mover_jugador() o, en paso(), lo que diga config['jugador'].
+
+	Cada partida tiene su propio random.Random(seed): con la misma
+	semilla se repite exactamente la misma partida.
+
+	foto() y restaurar() copian todo lo que cambia durante la partida a
+	un array de doubles y de vuelta (ver FOTO y Historial)."""
+
+	def __init__(self, config=None, seed=None):
+		self.config = dict(CONFIG)
+		if config:
+			self.config.update(config)
+		c = self.config
+		self.random = Azar(seed)
+		# Los errores de la ia van aparte para no cambiar los saques
+		self.random_ia = Azar(self.random.random())
+		if c['colision'] == 'barrido':
+			self.mover_bola = mover_bola_barrido
+		elif c['colision'] == 'discreta':
+			self.mover_bola = mover_bola
+		else:
+			raise ValueError("Colision desconocida: %r" % (c['colision'],))
+		self.bola = EstadoBola(c['bola'], c['width'], c['height'])
+		self.bola.speed = list(c['speed_bola'])
+		self.pala_jug = EstadoPala(c['x_jug'], c['pala'], c['width'], c['height'], c['speed_jug'])
+		self.pala_cpu = EstadoPala(c['x_cpu'], c['pala'], c['width'], c['height'], c['speed_cpu'])
+		self.ia_jug = elegir_ia(c['ia_jug'])
+		self.ia_cpu = elegir_ia(c['ia_cpu'])
+		self.pala_jug.reaccion = c['reaccion_jug']
+		self.pala_jug.error = c['error_jug']
+		self.pala_cpu.reaccion = c['reaccion_cpu']
+		self.pala_cpu.error = c['error_cpu']
+		''' Puntuacion de los jugadores [J1, J2]'''
+		self.puntos = [0, 0]
+
+	def mover_jugador(self, time, arriba, abajo):
+		mover_pala(self.pala_jug, time, arriba, abajo)
+
+	def actualizar(self, time):
+		"Mueve la pelota y la pala de la cpu. Devuelve los sucesos de mover_bola."
+		sucesos = self.mover_bola(self.bola, time, self.pala_jug, self.pala_cpu,
+			self.puntos, self.random)
+		self.ia_cpu(self.pala_cpu, time, self.bola, self.random_ia)
+		return sucesos
+
+	def paso(self, time=None, arriba=False, abajo=False):
+		"Un paso completo: pala del jugador, pelota y cpu."
+		if time is None:
+			time = self.config['paso']
+		if self.config['jugador'] == 'ia':
+			self.ia_jug(self.pala_jug, time, self.bola, self.random_ia)
+		else:
+			mover_pala(self.pala_jug, time, arriba, abajo)
+		return self.actualizar(time)
+
+	def foto(self, datos, i=0, extra=0.0):
+		"""Escribe el estado en datos[i:i + len(FOTO)] (un array('d') o
+		una lista), con extra al final para lo que quiera quien llama.
+		Del azar solo se guarda cuantos numeros ha sacado: su estado lo
+		guarda Historial."""
+		bola = self.bola
+		datos[i] = bola.x
+		datos[i + 1] = bola.y
+		datos[i + 2] = bola.speed[0]
+		datos[i + 3] = bola.speed[1]
+		j = i + 4
+		for pala in (self.pala_jug, self.pala_cpu):
+			datos[j] = pala.y
+			datos[j + 1] = pala.objetivo
+			datos[j + 2] = pala.firma[0]
+			datos[j + 3] = pala.firma[1]
+			datos[j + 4] = pala.espera
+			j += 5
+		datos[j] = self.puntos[0]
+		datos[j + 1] = self.puntos[1]
+		datos[j + 2] = self.random.usos
+		datos[j + 3] = self.random_ia.usos
+		datos[j + 4] = extra
+
+	def restaurar(self, datos, i=0):
+		''' Lo contrario de foto(). Devuelve extra '''
+		bola = self.bola
+		bola.x = datos[i]
+		bola.y = datos[i + 1]
+		bola.speed[0] = datos[i + 2]
+		bola.speed[1] = datos[i + 3]
+		j = i + 4
+		for pala in (self.pala_jug, self.pala_cpu):
+			pala.y = datos[j]
+			pala.objetivo = datos[j + 1]
+			if pala.firma[0] != datos[j + 2] or pala.firma[1] != datos[j + 3]:
+				pala.firma = (datos[j + 2], datos[j + 3])
+			pala.espera = datos[j + 4]
+			j += 5
+		# Los puntos se cambian dentro de la lista: SceneGame tiene la misma
+		self.puntos[0] = int(datos[j])
+		self.puntos[1] = int(datos[j + 1])
+		self.random.usos = int(datos[j + 2])
+		self.random_ia.usos = int(datos[j + 3])
+		return datos[j + 4]
+
+class Azar(random.Random):
+	"""random.Random que cuenta los numeros que saca (uniform() tambien
+	pasa por random()). Se usa igual y saca los mismos numeros; el
+	contador dice a Historial si el estado ha cambiado desde la ultima
+	foto sin tener que pedirlo con getstate()."""
+
+	def __init__(self, seed=None):
+		self.usos = 0
+		random.Random.__init__(self, seed)
+
+	def random(self):
+		self.usos += 1
+		return random.Random.random(self)
+
+class Historial:
+	"""Las ultimas capacidad fotos de una Partida, para volver atras.
+
+	Las fotos van en un array('d') reservado al crearlo, usado como
+	buffer circular: guardar() no crea ningun objeto. El estado del azar
+	(una tupla de getstate()) solo se pide cuando ha cambiado, que es
+	en los saques y cuando la ia con error recalcula; las fotos guardan
+	una referencia a la ultima.
+
+	restaurar(n) deja la partida como hace n fotos y olvida las de
+	despues, asi que se puede volver a simular desde ahi con otra
+	entrada (rollback) o seguir rebobinando."""
+
+	def __init__(self, partida, capacidad):
+		self.partida = partida
+		self.capacidad = capacidad
+		self.datos = array('d', [0.0]) * (capacidad * len(FOTO))
+		self.azar = [None] * capacidad
+		self.azar_ia = [None] * capacidad
+		# (usos, getstate()) de la ultima vez que se pidio el estado
+		self.ultimo = (-1, None)
+		self.ultimo_ia = (-1, None)
+		self.ultima = -1
+		self.cuantas = 0
+
+	def __len__(self):
+		return self.cuantas
+
+	def guardar(self, extra=0.0):
+		partida = self.partida
+		i = (self.ultima + 1) % self.capacidad
+		partida.foto(self.datos, i * len(FOTO), extra)
+		if partida.random.usos != self.ultimo[0]:
+			self.ultimo = (partida.random.usos, partida.random.getstate())
+		if partida.random_ia.usos != self.ultimo_ia[0]:
+			self.ultimo_ia = (partida.random_ia.usos, partida.random_ia.getstate())
+		self.azar[i] = self.ultimo[1]
+		self.azar_ia[i] = self.ultimo_ia[1]
+		self.ultima = i
+		if self.cuantas < self.capacidad:
+			self.cuantas += 1
+
+	def restaurar(self, atras=1):
+		"""Vuelve a la foto de hace atras (0 -> la ultima). Devuelve su
+		extra, o None si no hay tantas fotos (y entonces no cambia nada)."""
+		if atras < 0 or atras >= self.cuantas:
+			return None
+		partida = self.partida
+		i = (self.ultima - atras) % self.capacidad
+		extra = partida.restaurar(self.datos, i * len(FOTO))
+		partida.random.setstate(self.azar[i])
+		partida.random_ia.setstate(self.azar_ia[i])
+		self.ultimo = (partida.random.usos, self.azar[i])
+		self.ultimo_ia = (partida.random_ia.usos, self.azar_ia[i])
+		self.ultima = i
+		self.cuantas -= atras
+		return extra
+
+	def vaciar(self):
+		self.ultima = -1
+		self.cuantas = 0
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def choca(a, b):
+	''' Lo mismo que pygame.sprite.collide_rect, pero con los centros '''
+	return (abs(a.x - b.x) * 2 < a.w + b.w and
+		abs(a.y - b.y) * 2 < a.h + b.h)
+
+def reset_bola(bola, rng=random):
+	''' Saca desde el centro hacia un lado al azar '''
+	bola.x = bola.width / 2.0
+	bola.y = bola.height / 2.0
+	if rng.random() > 0.45:
+		mult1 = -1
+		mult2 = 1
+	else:
+		mult1 = 1
+		mult2 = -1
+	bola.speed[0] = mult1*rng.uniform(0.3, 0.5)
+	bola.speed[1] = mult2*rng.uniform(0.3, 0.5)
+
+def mover_bola(bola, time, pala_jug, pala_cpu, puntos, rng=random):
+	''' Mueve la pelota time ms, la hace rebotar y apunta los goles '''
+	sucesos = 0
+	speed = bola.speed
+	# Espacio = V * T
+	bola.x += speed[0] * time
+	bola.y += speed[1] * time
+	medio_w = bola.w / 2.0
+	medio_h = bola.h / 2.0
+
+	if bola.x - medio_w <= 0:
+		puntos[1] += 1
+		reset_bola(bola, rng)
+		sucesos |= GOL
+	if bola.x + medio_w >= bola.width-15:
+		puntos[0] += 1
+		reset_bola(bola, rng)
+		sucesos |= GOL
+
+	if bola.x - medio_w <= 0 or bola.x + medio_w >= bola.width:
+		speed[0] = -speed[0]
+		bola.x += speed[0] * time
+	if bola.y - medio_h <= 0 or bola.y + medio_h >= bola.height:
+		speed[1] = -speed[1]
+		bola.y += speed[1] * time
+		sucesos |= PARED
+	#Si colisiona la pelota y la pala del jugador...
+	if choca(bola, pala_jug):
+		speed[0] = -speed[0]
+		bola.x += speed[0] * time
+		sucesos |= GOLPE
+
+	#Si colisiona la pelota y la pala de la cpu...
+	if choca(bola, pala_cpu):
+		speed[0] = -speed[0]
+		bola.x += speed[0] * time
+		sucesos |= GOLPE
+
+	return sucesos
+
+def mover_bola_barrido(bola, time, pala_jug, pala_cpu, puntos, rng=random):
+	"""Como mover_bola, pero sin atravesar nada aunque el paso sea largo.
+
+	Se barre la caja de la pelota a lo largo de su recorrido contra las
+	paredes, las porterias y las dos palas (quietas durante el paso), se
+	avanza hasta el primer choque, se rebota y se sigue con el tiempo
+	que queda, hasta MAX_REBOTES veces."""
+	sucesos = 0
+	speed = bola.speed
+	medio_w = bola.w / 2.0
+	medio_h = bola.h / 2.0
+	resto = time
+	for i in xrange(MAX_REBOTES):
+		vx, vy = speed
+		# Primer choque: (tiempo, que se toca)
+		t = resto
+		choque = None
+		if vy < 0:
+			tc = (medio_h - bola.y) / vy
+			if tc < t:
+				t, choque = tc, PARED
+		elif vy > 0:
+			tc = (bola.height - medio_h - bola.y) / vy
+			if tc < t:
+				t, choque = tc, PARED
+		if vx < 0:
+			tc = (medio_w - bola.x) / vx
+			if tc < t:
+				t, choque = tc, 'gol_cpu'
+		elif vx > 0:
+			tc = (bola.width-15 - medio_w - bola.x) / vx
+			if tc < t:
+				t, choque = tc, 'gol_jug'
+		for pala in (pala_jug, pala_cpu):
+			tc, eje = barrer(bola, pala, vx, vy)
+			if eje is not None and tc < t:
+				t, choque = tc, eje
+
+		t = max(t, 0.0)
+		bola.x += vx * t
+		bola.y += vy * t
+		resto -= t
+		if choque is None:
+			break
+		if choque == PARED:
+			speed[1] = -vy
+			sucesos |= PARED
+		elif choque == 'gol_cpu' or choque == 'gol_jug':
+			puntos[choque == 'gol_jug' and 0 or 1] += 1
+			reset_bola(bola, rng)
+			sucesos |= GOL
+			break
+		else:
+			# Golpe de pala: de lado cambia vx, por arriba o abajo vy
+			if choque == 'x':
+				speed[0] = -vx
+			else:
+				speed[1] = -vy
+			sucesos |= GOLPE
+	return sucesos
+
+def barrer(bola, pala, vx, vy):
+	"""Cuando toca la caja de la pelota a la pala si sigue con
+	velocidad (vx, vy). Devuelve (tiempo, 'x' o 'y' segun la cara que
+	toca) o (None, None) si no la toca."""
+	ancho = (bola.w + pala.w) / 2.0
+	alto = (bola.h + pala.h) / 2.0
+	dx = bola.x - pala.x
+	dy = bola.y - pala.y
+	if vx == 0:
+		if abs(dx) >= ancho:
+			return None, None
+		tx0, tx1 = float('-inf'), float('inf')
+	else:
+		tx0 = (-ancho - dx) / vx
+		tx1 = (ancho - dx) / vx
+		if tx0 > tx1:
+			tx0, tx1 = tx1, tx0
+	if vy == 0:
+		if abs(dy) >= alto:
+			return None, None
+		ty0, ty1 = float('-inf'), float('inf')
+	else:
+		ty0 = (-alto - dy) / vy
+		ty1 = (alto - dy) / vy
+		if ty0 > ty1:
+			ty0, ty1 = ty1, ty0
+	entrada = max(tx0, ty0)
+	salida = min(tx1, ty1)
+	if entrada >= salida or salida <= 0:
+		return None, None
+	if entrada < 0:
+		# Ya estaba encima (la pala se ha movido hacia ella): solo
+		# rebota si la pelota va hacia la pala
+		if vx * dx < 0:
+			return 0.0, 'x'
+		return None, None
+	return entrada, tx0 >= ty0 and 'x' or 'y'
+
+def mover_pala(pala, time, arriba, abajo):
+	if pala.y - pala.h / 2.0 >= 0:
+		# Flechita hacia arriba
+		if arriba:
+			pala.y -= pala.speed * time
+	if pala.y + pala.h / 2.0 <= pala.height:
+		# Flechita hacia abajo
+		if abajo:
+			pala.y += pala.speed * time
+
+def elegir_ia(nombre):
+	if nombre == 'seguir':
+		return ia
+	if nombre == 'predecir':
+		return ia_predictiva
+	if nombre == 'quieto':
+		return quieto
+	raise ValueError("IA desconocida: %r" % (nombre,))
+
+def quieto(pala, time, bola, rng=None):
+	pass
+
+def ia(pala, time, bola, rng=None):
+	''' Sigue a la pelota cuando viene hacia su campo '''
+	if pala.x >= pala.width / 2:
+		viene = bola.speed[0] >= 0 and bola.x >= pala.width / 2
+	else:
+		viene = bola.speed[0] <= 0 and bola.x <= pala.width / 2
+	if viene:
+		if pala.y < bola.y:
+			pala.y += pala.speed * time
+		if pala.y > bola.y:
+			pala.y -= pala.speed * time
+
+def ia_predictiva(pala, time, bola, rng=random):
+	"""Va directamente a donde va a llegar la pelota.
+
+	El punto se calcula con interceptar() solo cuando cambia la velocidad
+	horizontal de la pelota (golpe o saque); mientras tanto se usa el
+	guardado. Los rebotes en las paredes solo cambian vy y ya estan
+	contados en interceptar(), asi que no hacen volver a apuntar. Tras
+	cada calculo espera pala.reaccion ms y apunta con un error al azar de
+	hasta pala.error px."""
+	speed = bola.speed
+	if speed[0] != pala.firma[0]:
+		pala.firma = (speed[0], speed[1])
+		objetivo = interceptar(pala, bola)
+		if pala.error:
+			objetivo += rng.uniform(-pala.error, pala.error)
+		pala.objetivo = min(max(objetivo, pala.h / 2.0), pala.height - pala.h / 2.0)
+		pala.espera = pala.reaccion
+	if pala.espera > 0:
+		pala.espera -= time
+		return
+	paso = pala.speed * time
+	distancia = pala.objetivo - pala.y
+	if distancia > paso:
+		pala.y += paso
+	elif distancia < -paso:
+		pala.y -= paso
+	else:
+		pala.y = pala.objetivo
+
+def interceptar(pala, bola):
+	"""Altura a la que llegara la pelota a la cara de la pala, contando
+	los rebotes en las paredes. Si la pelota se aleja, el centro."""
+	vx, vy = bola.speed
+	if pala.x >= pala.width / 2:
+		cara = pala.x - (pala.w + bola.w) / 2.0
+		viene = vx > 0
+	else:
+		cara = pala.x + (pala.w + bola.w) / 2.0
+		viene = vx < 0
+	if not viene:
+		return pala.height / 2.0
+	t = (cara - bola.x) / vx
+	if t < 0:
+		return bola.y
+	return plegar(bola.y + vy * t, bola.h / 2.0, bola.height - bola.h / 2.0)
+
+def plegar(y, arriba, abajo):
+	''' Lleva y al intervalo [arriba, abajo] como si rebotase en sus bordes '''
+	largo = abajo - arriba
+	resto = (y - arriba) % (2 * largo)
+	if resto > largo:
+		resto = 2 * largo - resto
+	return arriba + resto
+
+def simulate(match_config=None, seed=None, steps=10000):
+	"""Juega steps pasos de una partida sin pantalla.
+
+	Devuelve un diccionario con la puntuacion y estadisticas de los
+	puntos jugados (rally = desde el saque hasta el gol)."""
+	partida = Partida(match_config, seed)
+	paso = partida.paso
+	golpes = 0
+	paredes = 0
+	rally = 0
+	golpes_rally = 0
+	rallies = []
+	inicio = default_timer()
+	for i in xrange(steps):
+		sucesos = paso()
+		if sucesos:
+			if sucesos & GOLPE:
+				golpes += 1
+				golpes_rally += 1
+			if sucesos & PARED:
+				paredes += 1
+			if sucesos & GOL:
+				rallies.append((rally + 1, golpes_rally))
+				rally = 0
+				golpes_rally = 0
+				continue
+		rally += 1
+	tiempo = default_timer() - inicio
+
+	largos = [r[0] for r in rallies]
+	return {
+		'puntos': list(partida.puntos),
+		'pasos': steps,
+		'golpes': golpes,
+		'paredes': paredes,
+		'rallies': len(rallies),
+		'rally_medio': float(sum(largos)) / len(largos) if largos else 0.0,
+		'rally_max': max(largos) if largos else 0,
+		'golpes_rally': float(sum(r[1] for r in rallies)) / len(rallies) if rallies else 0.0,
+		'tiempo': tiempo,
+		'pasos_seg': steps / tiempo if tiempo > 0 else 0.0,
+	}
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	import sys
+	pasos = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+	print(simulate(seed=0, steps=pasos))
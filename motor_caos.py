@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+''' Modo caos: muchas pelotas a la vez que ademas chocan entre ellas.
+
+	python motor_caos.py [bolas ...]     (coste de un paso segun las bolas)
+
+Mirar cada pareja de pelotas es n², asi que cada paso las pelotas se
+apuntan en una Rejilla de celdas de CELDA px segun donde este su centro.
+Dos pelotas que se tocan estan en la misma celda o en celdas vecinas, y
+una pala solo puede tocar las pelotas de las celdas que cubre (y las de
+alrededor). '''
+
+# Módulos
+import sys, random
+from timeit import default_timer
+import motor
+from motor import PARED, GOLPE, GOL
+# Constantes
+# Lado de cada celda de la rejilla (al menos el diametro de la pelota:
+# asi dos pelotas que se tocan estan como mucho en celdas vecinas)
+CELDA = 16
+# Pasos que se miden por cada numero de bolas en el benchmark
+PASOS = 300
+# Pelotas por cada 640x480 de campo en la medida a densidad constante
+DENSIDAD = 500
+
+# Clases
+# ---------------------------------------------------------------------
+class Rejilla:
+	"""Hash espacial uniforme sobre el campo.
+
+	reconstruir() vuelve a repartir todos los puntos (es mas barato que
+	moverlos de celda uno a uno, se mueven casi todos en cada paso).
+	Las celdas son listas de indices en una lista plana de
+	columnas * filas; las que estan fuera del campo van al borde."""
+
+	def __init__(self, width, height, celda=CELDA):
+		self.celda = celda
+		self.columnas = width // celda + 1
+		self.filas = height // celda + 1
+		self.celdas = [[] for i in xrange(self.columnas * self.filas)]
+		self.ocupadas = []
+
+	def celda_de(self, x, y):
+		cx = min(max(int(x) // self.celda, 0), self.columnas - 1)
+		cy = min(max(int(y) // self.celda, 0), self.filas - 1)
+		return cx, cy
+
+	def reconstruir(self, xs, ys):
+		celdas = self.celdas
+		for i in self.ocupadas:
+			del celdas[i][:]
+		ocupadas = []
+		celda = self.celda
+		columnas = self.columnas
+		ultima_x = columnas - 1
+		ultima_y = self.filas - 1
+		for i in xrange(len(xs)):
+			cx = int(xs[i]) // celda
+			cy = int(ys[i]) // celda
+			if cx < 0: cx = 0
+			elif cx > ultima_x: cx = ultima_x
+			if cy < 0: cy = 0
+			elif cy > ultima_y: cy = ultima_y
+			lista = celdas[cy * columnas + cx]
+			if not lista:
+				ocupadas.append(cy * columnas + cx)
+			lista.append(i)
+		self.ocupadas = ocupadas
+
+	def en_rect(self, x0, y0, x1, y1):
+		''' Indices de las celdas que tocan el rect, con una celda de margen '''
+		cx0, cy0 = self.celda_de(x0, y0)
+		cx1, cy1 = self.celda_de(x1, y1)
+		resultado = []
+		for cy in xrange(max(cy0 - 1, 0), min(cy1 + 2, self.filas)):
+			for cx in xrange(max(cx0 - 1, 0), min(cx1 + 2, self.columnas)):
+				resultado.extend(self.celdas[cy * self.columnas + cx])
+		return resultado
+
+	def parejas(self):
+		"""Parejas (i, j) de puntos en la misma celda o en celdas vecinas,
+		cada una una sola vez: de cada celda se mira ella misma y las de
+		la derecha y la fila de abajo."""
+		celdas = self.celdas
+		columnas = self.columnas
+		filas = self.filas
+		for indice in self.ocupadas:
+			lista = celdas[indice]
+			cy, cx = divmod(indice, columnas)
+			n = len(lista)
+			for a in xrange(n):
+				for b in xrange(a + 1, n):
+					yield lista[a], lista[b]
+			vecinas = []
+			if cx + 1 < columnas:
+				vecinas.append(celdas[indice + 1])
+			if cy + 1 < filas:
+				abajo = indice + columnas
+				vecinas.append(celdas[abajo])
+				if cx > 0:
+					vecinas.append(celdas[abajo - 1])
+				if cx + 1 < columnas:
+					vecinas.append(celdas[abajo + 1])
+			for otra in vecinas:
+				for i in lista:
+					for j in otra:
+						yield i, j
+
+class Bolas:
+	"""Un campo con n pelotas, las dos palas y el marcador.
+
+	Cada pelota es un indice en las listas x, y, vx, vy (centro en px y
+	velocidad en px/ms). Las reglas son las de motor.mover_bola con dos
+	cambios: al chocar con una pala la pelota sale siempre hacia el otro
+	lado (con muchas pelotas una puede quedar dentro de la pala) y las
+	pelotas rebotan entre ellas como circulos de la misma masa.
+
+	La configuracion es la de motor.CONFIG. La pala de la cpu sigue a la
+	pelota que viene hacia ella mas adelantada; la del jugador la mueve
+	quien llame a motor.mover_pala, o lo mismo con ia_jug=True."""
+
+	def __init__(self, n, config=None, seed=None, ia_jug=False):
+		self.config = dict(motor.CONFIG)
+		if config:
+			self.config.update(config)
+		c = self.config
+		self.random = random.Random(seed)
+		self.width = c['width']
+		self.height = c['height']
+		self.w, self.h = c['bola']
+		self.pala_jug = motor.EstadoPala(c['x_jug'], c['pala'], self.width, self.height, c['speed_jug'])
+		self.pala_cpu = motor.EstadoPala(c['x_cpu'], c['pala'], self.width, self.height, c['speed_cpu'])
+		self.ia_jug = ia_jug
+		self.puntos = [0, 0]
+		self.rejilla = Rejilla(self.width, self.height, max(CELDA, self.w, self.h))
+		self.x = [0.0] * n
+		self.y = [0.0] * n
+		self.vx = [0.0] * n
+		self.vy = [0.0] * n
+		for i in xrange(n):
+			self.sacar(i, self.random.uniform(self.width / 4.0, 3 * self.width / 4.0))
+		# Parejas miradas y choques resueltos en total
+		self.parejas = 0
+		self.choques = 0
+
+	def __len__(self):
+		return len(self.x)
+
+	def sacar(self, i, x=None):
+		''' Como motor.reset_bola, pero a una altura al azar '''
+		rng = self.random
+		self.x[i] = self.width / 2.0 if x is None else x
+		self.y[i] = rng.uniform(self.h, self.height - self.h)
+		signo = -1 if rng.random() > 0.45 else 1
+		self.vx[i] = signo * rng.uniform(0.3, 0.5)
+		self.vy[i] = -signo * rng.uniform(0.3, 0.5)
+
+	def paso(self, time):
+		"Mueve todo time ms. Devuelve los sucesos (PARED | GOLPE | GOL)."
+		sucesos = self.mover(time)
+		self.rejilla.reconstruir(self.x, self.y)
+		sucesos |= self.palas()
+		self.chocar()
+		self.ia(time)
+		return sucesos
+
+	def mover(self, time):
+		sucesos = 0
+		x, y, vx, vy = self.x, self.y, self.vx, self.vy
+		medio_w = self.w / 2.0
+		medio_h = self.h / 2.0
+		izquierda = medio_w
+		derecha = self.width - 15 - medio_w
+		arriba = medio_h
+		abajo = self.height - medio_h
+		for i in xrange(len(x)):
+			x[i] += vx[i] * time
+			y[i] += vy[i] * time
+			if y[i] <= arriba or y[i] >= abajo:
+				vy[i] = -vy[i]
+				y[i] += vy[i] * time
+				sucesos |= PARED
+			if x[i] <= izquierda:
+				self.puntos[1] += 1
+				self.sacar(i)
+				sucesos |= GOL
+			elif x[i] >= derecha:
+				self.puntos[0] += 1
+				self.sacar(i)
+				sucesos |= GOL
+		return sucesos
+
+	def palas(self):
+		''' Golpes con las palas, solo de las pelotas cercanas '''
+		sucesos = 0
+		x, y, vx = self.x, self.y, self.vx
+		ancho = self.w / 2.0
+		alto = self.h / 2.0
+		for pala, signo in ((self.pala_jug, 1), (self.pala_cpu, -1)):
+			medio_w = pala.w / 2.0 + ancho
+			medio_h = pala.h / 2.0 + alto
+			for i in self.rejilla.en_rect(pala.x - medio_w, pala.y - medio_h,
+					pala.x + medio_w, pala.y + medio_h):
+				if abs(x[i] - pala.x) < medio_w and abs(y[i] - pala.y) < medio_h:
+					if vx[i] * signo < 0:
+						vx[i] = -vx[i]
+						sucesos |= GOLPE
+		return sucesos
+
+	def chocar(self):
+		''' Choques entre pelotas: las que se solapan cambian la velocidad en la normal '''
+		x, y, vx, vy = self.x, self.y, self.vx, self.vy
+		diametro = float(max(self.w, self.h))
+		d2 = diametro * diametro
+		parejas = 0
+		for i, j in self.rejilla.parejas():
+			parejas += 1
+			dx = x[j] - x[i]
+			dy = y[j] - y[i]
+			dist2 = dx * dx + dy * dy
+			if dist2 >= d2 or dist2 == 0:
+				continue
+			dist = dist2 ** 0.5
+			nx = dx / dist
+			ny = dy / dist
+			# Solo si se acercan: si ya se separan se dejan
+			acercan = (vx[i] - vx[j]) * nx + (vy[i] - vy[j]) * ny
+			if acercan > 0:
+				vx[i] -= acercan * nx
+				vy[i] -= acercan * ny
+				vx[j] += acercan * nx
+				vy[j] += acercan * ny
+				self.choques += 1
+			# Se separan lo que se solapan, mitad cada una
+			empuje = (diametro - dist) / 2.0
+			x[i] -= nx * empuje
+			y[i] -= ny * empuje
+			x[j] += nx * empuje
+			y[j] += ny * empuje
+		self.parejas += parejas
+
+	def ia(self, time):
+		palas = [(self.pala_cpu, 1)]
+		if self.ia_jug:
+			palas.append((self.pala_jug, -1))
+		for pala, signo in palas:
+			objetivo = self.amenaza(signo)
+			if objetivo is None:
+				continue
+			destino = self.y[objetivo]
+			if pala.y < destino:
+				pala.y = min(pala.y + pala.speed * time, destino)
+			elif pala.y > destino:
+				pala.y = max(pala.y - pala.speed * time, destino)
+
+	def amenaza(self, signo):
+		''' La pelota que va hacia el lado de signo (1 derecha) y esta mas cerca '''
+		mejor = None
+		limite = None
+		x, vx = self.x, self.vx
+		for i in xrange(len(x)):
+			if vx[i] * signo > 0:
+				distancia = x[i] * signo
+				if limite is None or distancia > limite:
+					limite = distancia
+					mejor = i
+		return mejor
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def medir(n, pasos=PASOS, densidad=None, seed=0):
+	"""ms que tarda un paso de 1000/60 ms con n pelotas en el campo de
+	motor.CONFIG y parejas miradas por paso. Con densidad el campo crece
+	para que haya densidad pelotas por cada 640x480."""
+	config = {}
+	if densidad:
+		escala = (float(n) / densidad) ** 0.5
+		config = {'width': int(motor.WIDTH * escala), 'height': int(motor.HEIGHT * escala)}
+		config['x_cpu'] = config['width'] - 30
+	bolas = Bolas(n, config, seed, ia_jug=True)
+	paso = 1000.0 / 60
+	for i in xrange(10):
+		bolas.paso(paso)
+	bolas.parejas = 0
+	inicio = default_timer()
+	for i in xrange(pasos):
+		bolas.paso(paso)
+	return (default_timer() - inicio) * 1000.0 / pasos, bolas.parejas / float(pasos)
+
+def main():
+	cantidades = [int(n) for n in sys.argv[1:]] or [50, 100, 250, 500, 1000, 2000, 4000]
+	print("%6s | %-36s | %-23s" % ('', 'campo 640x480', '%d pelotas por 640x480' % DENSIDAD))
+	print("%6s | %8s %8s %9s %8s | %8s %8s" % ('bolas', 'ms/paso', 'us/bola',
+		'parejas', 'n^2/2', 'ms/paso', 'us/bola'))
+	for n in cantidades:
+		ms, parejas = medir(n)
+		ms_d, parejas_d = medir(n, densidad=DENSIDAD)
+		print("%6d | %8.3f %8.2f %9.0f %8d | %8.3f %8.2f" % (n, ms, 1000.0 * ms / n,
+			parejas, n * (n - 1) / 2, ms_d, 1000.0 * ms_d / n))
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+
+''' Las reglas de motor.py aplicadas a muchas partidas a la vez con numpy '''
+
+# Módulos
+import random
+import numpy as np
+from timeit import default_timer
+import motor
+from motor import PARED, GOLPE, GOL
+
+# Clases
+# ---------------------------------------------------------------------
+class Lote:
+	"""N partidas independientes que avanzan a la vez.
+
+	Cada campo es un array de numpy de tamaño N (posicion y velocidad de
+	la pelota, altura de cada pala, puntos...) y cada paso se hace con
+	operaciones sobre los arrays enteros, en el mismo orden que
+	motor.Partida.paso(), asi que el resultado es identico paso a paso.
+
+	La configuracion es la de motor.CONFIG; speed_jug y speed_cpu pueden
+	ser arrays de tamaño N para probar una velocidad distinta en cada
+	partida. seeds es un entero (partida i -> seeds + i) o una lista con
+	una semilla por partida.
+
+	Los saques usan un random.Random por partida, igual que Partida: los
+	goles son pocos, asi que solo ese trozo recorre las partidas una a
+	una (y solo las que han marcado)."""
+
+	def __init__(self, n, config=None, seeds=0):
+		self.n = n
+		self.config = dict(motor.CONFIG)
+		if config:
+			self.config.update(config)
+		c = self.config
+		if c['colision'] != 'discreta':
+			raise ValueError("Lote solo tiene la colision 'discreta'")
+		if isinstance(seeds, (int, long)):
+			seeds = range(seeds, seeds + n)
+		self.randoms = [random.Random(seed) for seed in seeds]
+		self.randoms_ia = [random.Random(rng.random()) for rng in self.randoms]
+
+		self.width = c['width']
+		self.height = c['height']
+		self.bola_w, self.bola_h = c['bola']
+		self.pala_w, self.pala_h = c['pala']
+		self.x_jug = float(c['x_jug'])
+		self.x_cpu = float(c['x_cpu'])
+		self.speed_jug = np.asarray(c['speed_jug'], dtype=np.float64)
+		self.speed_cpu = np.asarray(c['speed_cpu'], dtype=np.float64)
+
+		''' Pelota: centro y velocidad '''
+		self.x = np.full(n, self.width / 2.0)
+		self.y = np.full(n, self.height / 2.0)
+		self.vx = np.full(n, float(c['speed_bola'][0]))
+		self.vy = np.full(n, float(c['speed_bola'][1]))
+		''' Altura del centro de cada pala '''
+		self.y_jug = np.full(n, self.height / 2.0)
+		self.y_cpu = np.full(n, self.height / 2.0)
+		''' Puntuacion de los jugadores '''
+		self.puntos_jug = np.zeros(n, dtype=np.int64)
+		self.puntos_cpu = np.zeros(n, dtype=np.int64)
+		''' Sucesos del ultimo paso (motor.PARED | GOLPE | GOL) '''
+		self.sucesos = np.zeros(n, dtype=np.int8)
+		''' IA de cada pala ('predecir' guarda su calculo en un CacheIA) '''
+		self.ia_jug = motor.elegir_ia(c['ia_jug'])
+		self.ia_cpu = motor.elegir_ia(c['ia_cpu'])
+		self.cache_jug = self.cache_cpu = None
+		if self.ia_jug is motor.ia_predictiva:
+			self.cache_jug = CacheIA(n, self.height, c['reaccion_jug'], c['error_jug'])
+		if self.ia_cpu is motor.ia_predictiva:
+			self.cache_cpu = CacheIA(n, self.height, c['reaccion_cpu'], c['error_cpu'])
+
+	def reset(self, sacan):
+		''' Saque de las partidas que indica la mascara sacan '''
+		self.x[sacan] = self.width / 2.0
+		self.y[sacan] = self.height / 2.0
+		for i in np.flatnonzero(sacan):
+			rng = self.randoms[i]
+			if rng.random() > 0.45:
+				mult1 = -1
+				mult2 = 1
+			else:
+				mult1 = 1
+				mult2 = -1
+			self.vx[i] = mult1*rng.uniform(0.3, 0.5)
+			self.vy[i] = mult2*rng.uniform(0.3, 0.5)
+
+	def mover_bola(self, time):
+		''' motor.mover_bola para todas las partidas '''
+		x, y = self.x, self.y
+		medio_w = self.bola_w / 2.0
+		medio_h = self.bola_h / 2.0
+		sucesos = self.sucesos
+		sucesos[:] = 0
+
+		# Espacio = V * T
+		x += self.vx * time
+		y += self.vy * time
+
+		gol = x - medio_w <= 0
+		if gol.any():
+			self.puntos_cpu += gol
+			self.reset(gol)
+			sucesos[gol] |= GOL
+		gol = x + medio_w >= self.width-15
+		if gol.any():
+			self.puntos_jug += gol
+			self.reset(gol)
+			sucesos[gol] |= GOL
+
+		m = (x - medio_w <= 0) | (x + medio_w >= self.width)
+		self.vx = np.where(m, -self.vx, self.vx)
+		x[m] += self.vx[m] * time
+		m = (y - medio_h <= 0) | (y + medio_h >= self.height)
+		self.vy = np.where(m, -self.vy, self.vy)
+		y[m] += self.vy[m] * time
+		sucesos[m] |= PARED
+
+		#Si colisiona la pelota y la pala del jugador...
+		m = self.choca(self.x_jug, self.y_jug)
+		self.vx = np.where(m, -self.vx, self.vx)
+		x[m] += self.vx[m] * time
+		sucesos[m] |= GOLPE
+		#Si colisiona la pelota y la pala de la cpu...
+		m = self.choca(self.x_cpu, self.y_cpu)
+		self.vx = np.where(m, -self.vx, self.vx)
+		x[m] += self.vx[m] * time
+		sucesos[m] |= GOLPE
+
+		return sucesos
+
+	def choca(self, x_pala, y_pala):
+		return ((np.abs(self.x - x_pala) * 2 < self.bola_w + self.pala_w) &
+			(np.abs(self.y - y_pala) * 2 < self.bola_h + self.pala_h))
+
+	def ia(self, x_pala, y_pala, speed, time):
+		''' motor.ia para la pala en x_pala de todas las partidas '''
+		if x_pala >= self.width / 2:
+			viene = (self.vx >= 0) & (self.x >= self.width / 2)
+		else:
+			viene = (self.vx <= 0) & (self.x <= self.width / 2)
+		paso = speed * time
+		m = viene & (y_pala < self.y)
+		y_pala += np.where(m, paso, 0.0)
+		m = viene & (y_pala > self.y)
+		y_pala -= np.where(m, paso, 0.0)
+
+	def ia_predictiva(self, x_pala, y_pala, speed, time, cache):
+		''' motor.ia_predictiva para la pala en x_pala de todas las partidas '''
+		# Como en motor.ia_predictiva: los rebotes en las paredes no cuentan
+		cambia = self.vx != cache.vx
+		if cambia.any():
+			cache.vx[cambia] = self.vx[cambia]
+			cache.vy[cambia] = self.vy[cambia]
+			objetivo = self.interceptar(x_pala)
+			if cache.error:
+				for i in np.flatnonzero(cambia):
+					objetivo[i] += self.randoms_ia[i].uniform(-cache.error, cache.error)
+			objetivo = np.minimum(np.maximum(objetivo, self.pala_h / 2.0),
+				self.height - self.pala_h / 2.0)
+			cache.objetivo[cambia] = objetivo[cambia]
+			cache.espera[cambia] = cache.reaccion
+		esperando = cache.espera > 0
+		cache.espera -= np.where(esperando, time, 0)
+		paso = speed * time
+		distancia = cache.objetivo - y_pala
+		nuevo = np.where(distancia > paso, y_pala + paso,
+			np.where(distancia < -paso, y_pala - paso, cache.objetivo))
+		y_pala[:] = np.where(esperando, y_pala, nuevo)
+
+	def interceptar(self, x_pala):
+		''' motor.interceptar para todas las partidas '''
+		if x_pala >= self.width / 2:
+			cara = x_pala - (self.pala_w + self.bola_w) / 2.0
+			viene = self.vx > 0
+		else:
+			cara = x_pala + (self.pala_w + self.bola_w) / 2.0
+			viene = self.vx < 0
+		with np.errstate(divide='ignore', invalid='ignore'):
+			t = (cara - self.x) / self.vx
+		arriba = self.bola_h / 2.0
+		largo = self.height - self.bola_h / 2.0 - arriba
+		resto = np.mod(self.y + self.vy * t - arriba, 2 * largo)
+		resto = np.where(resto > largo, 2 * largo - resto, resto)
+		return np.where(~viene, self.height / 2.0,
+			np.where(t < 0, self.y, arriba + resto))
+
+	def mover_jugador(self, time, arriba, abajo):
+		''' motor.mover_pala con un array de booleanos por tecla '''
+		y = self.y_jug
+		paso = self.speed_jug * time
+		m = (y - self.pala_h / 2.0 >= 0) & arriba
+		y -= np.where(m, paso, 0.0)
+		m = (y + self.pala_h / 2.0 <= self.height) & abajo
+		y += np.where(m, paso, 0.0)
+
+	def actualizar(self, time):
+		sucesos = self.mover_bola(time)
+		if self.ia_cpu is motor.ia:
+			self.ia(self.x_cpu, self.y_cpu, self.speed_cpu, time)
+		elif self.cache_cpu is not None:
+			self.ia_predictiva(self.x_cpu, self.y_cpu, self.speed_cpu, time, self.cache_cpu)
+		return sucesos
+
+	def paso(self, time=None, arriba=False, abajo=False):
+		"Un paso de todas las partidas, como motor.Partida.paso()."
+		if time is None:
+			time = self.config['paso']
+		if self.config['jugador'] != 'ia':
+			self.mover_jugador(time, arriba, abajo)
+		elif self.ia_jug is motor.ia:
+			self.ia(self.x_jug, self.y_jug, self.speed_jug, time)
+		elif self.cache_jug is not None:
+			self.ia_predictiva(self.x_jug, self.y_jug, self.speed_jug, time, self.cache_jug)
+		return self.actualizar(time)
+
+class CacheIA:
+	"""Lo que guarda motor.ia_predictiva en cada EstadoPala, para las N
+	partidas de un Lote: velocidad de la pelota en el ultimo calculo,
+	altura objetivo y ms que quedan para reaccionar."""
+
+	def __init__(self, n, height, reaccion=0, error=0):
+		self.reaccion = reaccion
+		self.error = error
+		self.vx = np.zeros(n)
+		self.vy = np.zeros(n)
+		self.objetivo = np.full(n, height / 2.0)
+		self.espera = np.zeros(n)
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def simulate(n, match_config=None, seeds=0, steps=10000):
+	"""Juega steps pasos de n partidas. Devuelve los puntos de cada una
+	y el numero de golpes de pala por partida."""
+	lote = Lote(n, match_config, seeds)
+	golpes = np.zeros(n, dtype=np.int64)
+	inicio = default_timer()
+	for i in xrange(steps):
+		sucesos = lote.paso()
+		golpes += (sucesos & GOLPE) != 0
+	tiempo = default_timer() - inicio
+	return {
+		'puntos_jug': lote.puntos_jug,
+		'puntos_cpu': lote.puntos_cpu,
+		'golpes': golpes,
+		'pasos': steps,
+		'tiempo': tiempo,
+		'pasos_seg': n * steps / tiempo if tiempo > 0 else 0.0,
+	}
+
+def comprobar(n=64, match_config=None, seeds=0, steps=5000):
+	"""Prueba de consistencia: juega las mismas partidas con motor.Partida
+	y con Lote y comprueba que son iguales en cada paso. Lanza
+	AssertionError con la partida y el paso en el que se separan."""
+	lote = Lote(n, match_config, seeds)
+	if isinstance(seeds, (int, long)):
+		seeds = range(seeds, seeds + n)
+	partidas = []
+	for i, seed in enumerate(seeds):
+		# Las opciones que son arrays tienen un valor por partida
+		config = dict(match_config or {})
+		for clave, valor in config.items():
+			if isinstance(valor, np.ndarray):
+				config[clave] = float(valor[i])
+		partidas.append(motor.Partida(config, seed))
+	for paso in xrange(steps):
+		sucesos = lote.paso()
+		for i, partida in enumerate(partidas):
+			s = partida.paso()
+			estado = (partida.bola.x, partida.bola.y,
+				partida.bola.speed[0], partida.bola.speed[1],
+				partida.pala_jug.y, partida.pala_cpu.y,
+				partida.puntos[0], partida.puntos[1], s)
+			lotes = (lote.x[i], lote.y[i], lote.vx[i], lote.vy[i],
+				lote.y_jug[i], lote.y_cpu[i],
+				lote.puntos_jug[i], lote.puntos_cpu[i], sucesos[i])
+			assert estado == lotes, \
+				"La partida %d se separa en el paso %d: %r != %r" % (i, paso, estado, lotes)
+	return True
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	import sys
+	n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+	config = {'speed_cpu': np.linspace(0.2, 0.5, 64), 'speed_jug': 0.3}
+	comprobar(64, config, steps=5000)
+	config.update({'ia_cpu': 'predecir', 'reaccion_cpu': 100, 'error_cpu': 30})
+	comprobar(64, config, steps=5000)
+	print("Consistencia con motor.Partida: ok")
+	resultado = simulate(n, {'speed_jug': 0.3}, steps=1000)
+	print("%d partidas: %.0f pasos/s" % (n, resultado['pasos_seg']))
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+''' Paquete de assets: imagenes ya decodificadas y fuentes en un fichero.
+
+	python paquete.py                (crea assets.pak)
+	python paquete.py --informe      (arranque con y sin el paquete)
+
+El paquete se abre con mmap. Cada imagen esta guardada con los pixeles
+tal cual los tiene la pantalla, asi que al cargarla no se decodifica
+nada: se crea la superficie con el mismo formato y se copian. Si la
+pantalla del juego no tiene el formato con el que se hizo el paquete,
+se convierte (sigue sin decodificar).
+
+Si no hay paquete se usan los ficheros sueltos de images/ y fonts/. El
+paquete guarda el tamaño y la fecha de cada fichero del que sale: lo
+que ha cambiado desde entonces se carga del fichero suelto (ver
+recursos.usar_paquete). '''
+
+# Módulos
+import os, sys, json, mmap, struct, argparse, subprocess
+from io import BytesIO
+from timeit import default_timer
+import pygame
+# Constantes
+MAGIA = 'NPAK'
+VERSION = 2
+FICHERO = "assets.pak"
+# Lo que se mete en el paquete: (carpeta, extensiones)
+CARPETAS = [
+	("images", ('.png', '.jpg')),
+	("fonts", ('.ttf',)),
+]
+# Cada bloque de datos empieza en un multiplo de esto
+ALINEACION = 16
+# Tamaños de letra que se usan al arrancar (para el informe)
+TAMANOS = (25, 60, 75)
+CABECERA = struct.Struct('<4sBI')
+
+# Clases
+# ---------------------------------------------------------------------
+class Paquete:
+	"""Un fichero hecho con empaquetar(), abierto con mmap.
+
+	El indice dice, para cada ruta (como se escribe en el juego, p.ej.
+	"images/ball.png"), donde estan sus datos, el [tamaño, fecha] del
+	fichero del que salen y, si es una imagen, su tamaño, pitch, bits y
+	mascaras."""
+
+	def __init__(self, fichero=FICHERO):
+		self.fichero = open(fichero, 'rb')
+		try:
+			self.mapa = mmap.mmap(self.fichero.fileno(), 0, access=mmap.ACCESS_READ)
+		except (mmap.error, ValueError):
+			self.fichero.close()
+			raise IOError("%s esta vacio" % fichero)
+		try:
+			self.indice = self.leer_indice()
+		except (struct.error, ValueError, KeyError, TypeError) as error:
+			self.cerrar()
+			raise ValueError("%s no es un paquete de assets (version %d) o esta cortado: %s" % (
+				fichero, VERSION, error))
+
+	def leer_indice(self):
+		''' El indice de la cabecera, comprobando que todos los datos estan en el fichero '''
+		magia, version, largo = CABECERA.unpack_from(self.mapa)
+		if magia != MAGIA or version != VERSION:
+			raise ValueError("magia %r, version %d" % (magia, version))
+		if CABECERA.size + largo > len(self.mapa):
+			raise ValueError("indice cortado")
+		indice = json.loads(self.mapa[CABECERA.size:CABECERA.size + largo])
+		for ruta, entrada in indice.items():
+			if entrada['offset'] + entrada['bytes'] > len(self.mapa):
+				raise ValueError("%s cortado" % ruta)
+		return indice
+
+	def __contains__(self, ruta):
+		return ruta in self.indice
+
+	def caducados(self):
+		''' Rutas cuyo fichero suelto ha cambiado desde que se hizo el paquete '''
+		return sorted(ruta for ruta, entrada in self.indice.items()
+			if os.path.exists(ruta) and origen(ruta) != entrada['origen'])
+
+	def incompatibles(self):
+		"""Imagenes cuyas filas no miden en una superficie de aqui lo que
+		median al hacer el paquete: sus pixeles no se pueden copiar tal cual."""
+		return sorted(ruta for ruta, entrada in self.indice.items() if 'pitch' in entrada
+			and pygame.Surface(entrada['size'], 0, entrada['bits'],
+				tuple(entrada['masks'])).get_pitch() != entrada['pitch'])
+
+	def olvidar(self, rutas):
+		''' Quita rutas del indice: se cargaran de los ficheros sueltos '''
+		for ruta in rutas:
+			self.indice.pop(ruta, None)
+
+	def datos(self, ruta):
+		entrada = self.indice[ruta]
+		return self.mapa[entrada['offset']:entrada['offset'] + entrada['bytes']]
+
+	def imagen(self, ruta):
+		"""Superficie con los pixeles de la imagen, en el formato de la
+		pantalla. Se copian del mapa sin pasar por un str; las rutas de
+		incompatibles() no deben estar ya en el indice."""
+		entrada = self.indice[ruta]
+		masks = tuple(entrada['masks'])
+		image = pygame.Surface(entrada['size'], 0, entrada['bits'], masks)
+		image.get_buffer().write(buffer(self.mapa, entrada['offset'], entrada['bytes']), 0)
+		pantalla = pygame.display.get_surface()
+		if pantalla is None or pantalla.get_masks() != masks or pantalla.get_bitsize() != entrada['bits']:
+			image = image.convert()
+		return image
+
+	def fuente(self, ruta, size):
+		return pygame.font.Font(BytesIO(self.datos(ruta)), size)
+
+	def cerrar(self):
+		self.mapa.close()
+		self.fichero.close()
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def empaquetar(fichero=FICHERO, carpetas=CARPETAS):
+	"""Crea el paquete con todo lo de carpetas. Necesita la pantalla ya
+	creada: las imagenes se guardan en su formato."""
+	bloques = []
+	for carpeta, extensiones in carpetas:
+		for nombre in sorted(os.listdir(carpeta)):
+			if not nombre.lower().endswith(extensiones):
+				continue
+			ruta = carpeta + "/" + nombre
+			if nombre.lower().endswith(('.ttf', '.otf')):
+				with open(ruta, 'rb') as entrada:
+					bloques.append((ruta, {'origen': origen(ruta)}, entrada.read()))
+				continue
+			image = pygame.image.load(ruta).convert()
+			bloques.append((ruta, {
+				'origen': origen(ruta),
+				'size': list(image.get_size()),
+				'pitch': image.get_pitch(),
+				'bits': image.get_bitsize(),
+				'masks': list(image.get_masks()),
+			}, image.get_buffer().raw))
+
+	# El indice lleva los offsets, que dependen de lo que ocupa el indice:
+	# se reserva sitio de sobra y se rellena con espacios
+	indice = {}
+	reserva = len(json.dumps(dict((ruta, dict(info, offset=2**40, bytes=2**40))
+		for ruta, info, datos in bloques)))
+	offset = alinear(CABECERA.size + reserva)
+	for ruta, info, datos in bloques:
+		indice[ruta] = dict(info, offset=offset, bytes=len(datos))
+		offset = alinear(offset + len(datos))
+	cabecera = json.dumps(indice).ljust(reserva)
+
+	with open(fichero, 'wb') as salida:
+		salida.write(CABECERA.pack(MAGIA, VERSION, len(cabecera)))
+		salida.write(cabecera)
+		for ruta, info, datos in bloques:
+			salida.write('\0' * (indice[ruta]['offset'] - salida.tell()))
+			salida.write(datos)
+	return indice
+
+def origen(ruta):
+	''' [tamaño, fecha] del fichero suelto, para saber si ha cambiado '''
+	return [os.path.getsize(ruta), int(os.path.getmtime(ruta))]
+
+def alinear(n):
+	return (n + ALINEACION - 1) // ALINEACION * ALINEACION
+
+def medir(con_paquete):
+	"""ms que tarda en este proceso el arranque hasta tener cargados los
+	assets del juego, y cuantos de ellos son solo de cargar los assets."""
+	inicio = default_timer()
+	pygame.display.init()
+	pygame.font.init()
+	pygame.display.set_mode((640, 480))
+	import recursos, pong_escenas
+	assets = default_timer()
+	if con_paquete:
+		recursos.usar_paquete(FICHERO)
+	recursos.imagenes.precargar(pong_escenas.MANIFIESTO)
+	for size in TAMANOS:
+		recursos.cache_texto.fuente(size)
+	fin = default_timer()
+	return (fin - inicio) * 1000.0, (fin - assets) * 1000.0
+
+def informe(veces=10):
+	''' Arranca veces procesos nuevos con y sin paquete y compara '''
+	if not os.path.exists(FICHERO):
+		print("No hay %s: python paquete.py para crearlo" % FICHERO)
+		return 1
+	entorno = dict(os.environ)
+	entorno.setdefault('SDL_VIDEODRIVER', 'dummy')
+	for con_paquete in (False, True):
+		totales = []
+		assets = []
+		for i in range(veces):
+			orden = [sys.executable, __file__, '--medir'] + (['--con-paquete'] if con_paquete else [])
+			salida = subprocess.check_output(orden, env=entorno, stderr=open(os.devnull, 'w'))
+			total, asset = salida.strip().splitlines()[-1].split()
+			totales.append(float(total))
+			assets.append(float(asset))
+		totales.sort()
+		assets.sort()
+		print("%-12s arranque mediana %6.2f ms | assets mediana %6.2f ms (min %.2f, max %.2f) | %d procesos" % (
+			'con paquete' if con_paquete else 'sin paquete',
+			totales[len(totales) // 2], assets[len(assets) // 2], assets[0], assets[-1], veces))
+	print("El paquete ocupa %d bytes" % os.path.getsize(FICHERO))
+	return 0
+
+def main():
+	parser = argparse.ArgumentParser(description="Paquete de assets de Not Pong")
+	parser.add_argument('-o', '--salida', default=FICHERO)
+	parser.add_argument('--informe', action='store_true', help="compara el arranque con y sin paquete")
+	parser.add_argument('--veces', type=int, default=10)
+	parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+	parser.add_argument('--con-paquete', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.medir:
+		print("%.3f %.3f" % medir(args.con_paquete))
+		return 0
+	if args.informe:
+		return informe(args.veces)
+	os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+	pygame.display.init()
+	pygame.display.set_mode((640, 480))
+	indice = empaquetar(args.salida)
+	print("%s: %d assets, %d bytes" % (args.salida, len(indice), os.path.getsize(args.salida)))
+	return 0
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+''' Medicion del tiempo de cada fase del frame '''
+
+# Módulos
+import pygame, json
+from collections import deque
+from timeit import default_timer
+from recursos import texto
+# Constantes
+# Fases de un frame del Director, en orden
+FASES = ('tick', 'eventos', 'update', 'draw', 'flip')
+# Frames que se guardan por escena para los percentiles
+VENTANA = 600
+# Cada cuantos ms se vuelven a escribir los numeros del overlay
+REFRESCO = 250
+# Tamaño del overlay y escala de la grafica (ms que ocupan todo el alto)
+OVERLAY = (230, 135)
+ESCALA = 40.0
+
+# Clases
+# ---------------------------------------------------------------------
+class Perfil:
+	"""Guarda lo que tarda (en ms) cada fase de cada frame.
+
+	El Director llama a frame() una vez por frame con el nombre de la
+	escena y los tiempos de cada fase de FASES. Por escena se guardan
+	los ultimos VENTANA frames para sacar p50/p95/p99. Si se da un
+	fichero .csv o .jsonl, cada frame se escribe tambien ahi.
+
+	Si el Director no tiene Perfil no se mide nada."""
+
+	def __init__(self, fichero=None, ventana=VENTANA):
+		self.ventana = ventana
+		# escena -> deque de tuplas (total, tick, eventos, update, draw, flip)
+		self.muestras = {}
+		self.frames = 0
+		self.overlay = True
+		self.panel = None
+		self.lineas = []
+		self.refresco = 0
+		self.escritor = None
+		self.salida = None
+		# render.ColaRender cuyos contadores se enseñan en el overlay
+		self.cola = None
+		if fichero:
+			self.abrir(fichero)
+
+	def abrir(self, fichero):
+		self.salida = open(fichero, 'w')
+		if fichero.endswith('.csv'):
+			self.salida.write('frame,escena,total,%s\n' % ','.join(FASES))
+			self.escritor = self.escribir_csv
+		else:
+			self.escritor = self.escribir_json
+
+	def cerrar(self):
+		if self.salida is not None:
+			self.salida.close()
+			self.salida = None
+			self.escritor = None
+
+	def frame(self, escena, tiempos):
+		"tiempos: segundos de cada fase de FASES, en orden."
+		muestra = [t * 1000.0 for t in tiempos]
+		muestra.insert(0, sum(muestra))
+		muestras = self.muestras.get(escena)
+		if muestras is None:
+			muestras = self.muestras[escena] = deque(maxlen=self.ventana)
+		muestras.append(muestra)
+		self.frames += 1
+		if self.escritor is not None:
+			self.escritor(escena, muestra)
+
+	def escribir_csv(self, escena, muestra):
+		self.salida.write('%d,%s,%s\n' % (self.frames, escena,
+			','.join('%.3f' % t for t in muestra)))
+
+	def escribir_json(self, escena, muestra):
+		linea = dict(zip(('total',) + FASES, muestra))
+		linea['frame'] = self.frames
+		linea['escena'] = escena
+		self.salida.write(json.dumps(linea) + '\n')
+
+	def percentiles(self, escena):
+		"Devuelve {fase: (p50, p95, p99)} en ms de los ultimos frames de la escena."
+		muestras = self.muestras.get(escena)
+		if not muestras:
+			return {}
+		resultado = {}
+		for i, fase in enumerate(('total',) + FASES):
+			valores = sorted(m[i] for m in muestras)
+			resultado[fase] = tuple(percentil(valores, p) for p in (50, 95, 99))
+		return resultado
+
+	def dibujar(self, screen, escena):
+		"Pinta el overlay arriba a la izquierda y devuelve su rect."
+		muestras = self.muestras.get(escena)
+		if not muestras:
+			return None
+		if self.panel is None:
+			self.panel = pygame.Surface(OVERLAY).convert()
+			self.panel.set_alpha(190)
+		ahora = pygame.time.get_ticks()
+		if ahora - self.refresco >= REFRESCO:
+			self.refresco = ahora
+			self.lineas = self.textos(escena)
+
+		panel = self.panel
+		panel.fill((0, 0, 0))
+		# Grafica de los ultimos frames, con la raya de 60 fps
+		ancho, alto = OVERLAY
+		alto_grafica = 40
+		base = alto - 2
+		objetivo = base - int(alto_grafica * (1000.0 / 60) / ESCALA)
+		pygame.draw.line(panel, (0, 120, 0), (0, objetivo), (ancho, objetivo))
+		ultimos = list(muestras)[-ancho:]
+		for x, muestra in enumerate(ultimos):
+			altura = min(int(alto_grafica * muestra[0] / ESCALA), alto_grafica)
+			color = (255, 80, 80) if muestra[0] > 1000.0 / 60 else (200, 200, 200)
+			pygame.draw.line(panel, color, (x, base), (x, base - altura))
+		for superficie, rect in self.lineas:
+			panel.blit(superficie, rect)
+		return screen.blit(panel, (0, 0))
+
+	def textos(self, escena):
+		p = self.percentiles(escena)
+		total = p['total']
+		muestras = self.muestras[escena]
+		media = sum(m[0] for m in muestras) / len(muestras)
+		lineas = ['%s  %.1f fps' % (escena, 1000.0 / media if media else 0.0),
+			'frame p50 %.1f p95 %.1f p99 %.1f' % total]
+		for fase in FASES[1:]:
+			lineas.append('%s %.2f / %.2f / %.2f' % ((fase,) + p[fase]))
+		cola = self.cola
+		if cola is not None:
+			lineas.append('blits %d de %d  %dk px' % (cola.llamadas, cola.comandos, cola.pixeles // 1000))
+		resultado = []
+		for i, linea in enumerate(lineas):
+			superficie, rect = texto(linea, 0, 0, (255, 255, 255), 12)
+			rect.topleft = (4, 2 + 13 * i)
+			resultado.append((superficie, rect))
+		return resultado
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def percentil(valores, p):
+	''' Percentil p de una lista ya ordenada (el mas cercano) '''
+	if not valores:
+		return 0.0
+	i = int(round((len(valores) - 1) * p / 100.0))
+	return valores[i]
+
+reloj = default_timer
+
+# ---------------------------------------------------------------------
@@ -3,9 +3,13 @@
 # Módulos
 import pygame, sys, random
 from pygame.locals import *
+from recursos import texto, load_image
+from render import ColaRender, FONDO, HUD
 # Constantes
 WIDTH = 640
 HEIGHT = 480
+# Limite de fps (0 -> sin limite)
+FPS = 60
 
 # Clases
 # ---------------------------------------------------------------------
@@ -113,34 +117,6 @@ class Pala(pygame.sprite.Sprite):
 
 # ---------------------------------------------------------------------
 
-# Funciones
-# ---------------------------------------------------------------------
-def load_image(filename, transparent=False):
-	''' Intenta abrir la imagen dada por la ruta "filename" '''
-	try: image = pygame.image.load(filename)
-	#Si falla, sale el error
-	except pygame.error, message:
-		raise SystemExit, message
-	''' Convierte la imagen a una de tipo de pygame'''
-	image = image.convert()
-	''' Si la imagen tiene transparencia, toma como transparencia el pixel superior izquierdo'''
-	if transparent:
-		color = image.get_at((0,0))
-		image.set_colorkey(color, RLEACCEL)
-	return image
-
-''' Escribir texto '''
-
-def texto(texto, posx, posy, color=(255, 255, 255), size=25):
-    fuente = pygame.font.Font("fonts/DroidSans.ttf", size)
-    salida = pygame.font.Font.render(fuente, texto, 1, color)
-    salida_rect = salida.get_rect()
-    salida_rect.centerx = posx
-    salida_rect.centery = posy
-    return salida, salida_rect
-
-# ---------------------------------------------------------------------
-
 def main():
 	''' Define la pantalla del programa '''
 	screen = pygame.display.set_mode((WIDTH, HEIGHT))
@@ -164,13 +140,17 @@ def main():
 	''' Reloj de juego '''
 	clock = pygame.time.Clock()
 
+	''' Cola donde se apunta lo que se pinta en cada frame '''
+	cola = ColaRender((WIDTH, HEIGHT))
+
 	''' Puntuacion de los jugadores [J1, J2]'''
 	puntos = [0, 0]
+	marcador = None
 
 	''' Bucle de juego'''
 	while True:
 
-		time = clock.tick(60)
+		time = clock.tick(FPS)
 		keys = pygame.key.get_pressed()
 		''' Lista de eventos de pygame'''
 		for eventos in pygame.event.get():
@@ -182,17 +162,20 @@ def main():
 		puntos = bola.actualizar(time, pala_jug, pala_cpu, puntos)
 		pala_jug.mover1(time, keys)
 		pala_cpu.mover2(time, keys)
-		p_jug, p_jug_rect = texto(str(puntos[0]), WIDTH/4, 40)
-		p_cpu, p_cpu_rect = texto(str(puntos[1]), WIDTH-WIDTH/4, 40)
+		if marcador != puntos:
+			marcador = list(puntos)
+			p_jug, p_jug_rect = texto(str(puntos[0]), WIDTH/4, 40)
+			p_cpu, p_cpu_rect = texto(str(puntos[1]), WIDTH-WIDTH/4, 40)
 
 
 		''' Actualiza los cambios ocurridos en la pantalla'''
-		screen.blit(background_image, (0, 0))
-		screen.blit(bola.image, bola.rect)
-		screen.blit(pala_jug.image, pala_jug.rect)
-		screen.blit(pala_cpu.image, pala_cpu.rect)
-		screen.blit(p_jug, p_jug_rect)
-		screen.blit(p_cpu, p_cpu_rect)
+		cola.pintar(background_image, (0, 0), FONDO)
+		cola.pintar(bola.image, bola.rect)
+		cola.pintar(pala_jug.image, pala_jug.rect)
+		cola.pintar(pala_cpu.image, pala_cpu.rect)
+		cola.pintar(p_jug, p_jug_rect, HUD)
+		cola.pintar(p_cpu, p_cpu_rect, HUD)
+		cola.ejecutar(screen)
 		pygame.display.flip()
 	return 0
  
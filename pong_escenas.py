@@ -1,14 +1,79 @@
 # -*- coding: utf-8 -*-
 
 # Módulos
-import pygame, sys, random, copy
+import pygame, sys, random
 from pygame.locals import *
+from recursos import texto, load_image, imagenes, usar_paquete
+from render import RenderSucio, ColaRender, FONDO, HUD
+from perfil import Perfil, reloj
+from ritmo import Ritmo, frecuencia_pantalla, POR_DEFECTO, SIN_EFECTOS, SIN_ESCALAR
+from repeticion import Grabadora, estado_final
+from captura import Captura
+from entrada import Entrada, ARRIBA, ABAJO, ACEPTAR, ATRAS, SALIR, PERFIL, REBOBINAR
+from audio import sonido
+import motor, motor_caos
 # Constantes
 MUSIC = 1
+# 1 -> SceneGame solo actualiza las zonas de la pantalla que cambian
+DIRTY = 0
+# Pasos de simulacion por segundo (independiente de los fps). Se deja en
+# 60 porque es el paso de motor.CONFIG['paso'] con el que torneo.py,
+# entorno.py y benchmark.py simulan sin pantalla: con colision 'discreta'
+# lo que rebota depende del paso, y con otro valor el juego no jugaria lo
+# mismo que ellos. Las repeticiones guardan el suyo; en red.py los dos
+# lados tienen que usar el mismo
+PHYSICS_HZ = 60
+# Limite de fps al pintar (0 -> sin limite, None -> la frecuencia de la
+# pantalla si pygame la sabe, o 60)
+FPS = None
+# Como se espera al siguiente frame: 'tick', 'busy' o 'hibrido' (ver ritmo.py)
+RITMO_ESPERA = 'hibrido'
+# 1 -> si los frames no llegan a tiempo se deja de hacer trabajo (efectos,
+# escalado, pintar todos los frames) hasta que vuelvan a llegar
+RITMO_ADAPTAR = 1
+# Fichero donde se apuntan las decisiones del ritmo (ademas de stderr)
+RITMO_LOG = None
+# Tiempo maximo (ms) que se simula de golpe tras un frame muy lento
+MAX_FRAME = 250
+# Colision de la pelota: 'discreta' o 'barrido' (ver motor.py)
+COLISION = 'discreta'
+# Semilla de los saques de SceneGame (None -> al azar)
+SEMILLA = None
+# IA de la cpu: 'seguir' o 'predecir', con su reaccion (ms) y error (px)
+IA_CPU = ('seguir', 0, 0)
+# 1 -> 'Iniciar' abre el modo caos: CAOS_BOLAS pelotas que chocan entre ellas
+CAOS = 0
+CAOS_BOLAS = 1000
+# 1 -> mide cada fase del frame (F3 enseña/oculta el overlay)
+PERFIL = 0
+# Fichero .csv o .jsonl donde se escriben los tiempos de cada frame
+PERFIL_FICHERO = None
+# Fichero donde se graba cada partida para repetirla (ver repeticion.py)
+GRABAR = None
+# Fichero o directorio donde se captura lo que se pinta (ver captura.py):
+# un directorio -> PNG, .y4m -> video YUV, .rgb -> RGB crudo
+CAPTURA = None
+# Que hace la captura si el hilo que escribe no da abasto: 'juntar',
+# 'soltar' o 'esperar' (esta ultima frena el juego)
+CAPTURA_PRESION = 'juntar'
+# Modo practica: segundos de partida que se pueden rebobinar manteniendo
+# R (0 -> no se guarda nada). No se rebobina si se esta grabando
+PRACTICA = 0
 RES = 0%3
 RESOLUTION = [(640,480), (800,600), (1024,768)]
-WIDTH = RESOLUTION[RES][0]
-HEIGHT = RESOLUTION[RES][1]
+# Tamaño logico: las escenas siempre pintan a 640x480 y el Director lo
+# escala a la ventana, que es RESOLUTION[RES]
+WIDTH = RESOLUTION[0][0]
+HEIGHT = RESOLUTION[0][1]
+# Paquete de assets (ver paquete.py); si no esta se usan images/ y fonts/
+PAQUETE = "assets.pak"
+# Imagenes que se cargan al arrancar: (ruta, transparente)
+MANIFIESTO = [
+	("images/flecha.png", False),
+	("images/fondo_pong.png", False),
+	("images/ball.png", True),
+	("images/pala.png", False),
+]
 
 # Clases
 # ---------------------------------------------------------------------
@@ -19,42 +84,229 @@ class Director:
 	encarga de actualizar, dibuja y propagar eventos.
 
 	Tiene que utilizar este objeto en conjunto con objetos
-	derivados de Scene."""
+	derivados de Scene.
+
+	Las escenas forman una pila: la de arriba es la actual (self.scene)
+	y las de debajo esperan sin actualizarse a que se vuelva a ellas."""
 
 	def __init__(self):
-		self.screen = pygame.display.set_mode(RESOLUTION[0])
+		# ventana: lo que se ve; screen: donde pintan las escenas (WIDTH x HEIGHT)
+		self.ventana = None
+		self.screen = None
+		self.escala = None
+		# Si screen se pone sin escalar en el centro de la ventana (ver ritmo.py)
+		self.centrado = False
+		self.abrir(RESOLUTION[RES])
 		pygame.display.set_caption("Not Pong")
 		self.scene = None
+		self.pila = []
+		# Escenas que se crean una vez y se reutilizan: clase -> escena
+		self.escenas = {}
 		self.quit_flag = False
-		self.clock = pygame.time.Clock()
+		# Espera entre frames y trabajo que se quita si no da tiempo
+		fps = FPS if FPS is not None else (frecuencia_pantalla() or POR_DEFECTO)
+		self.ritmo = Ritmo(fps, RITMO_ESPERA, RITMO_ADAPTAR == 1, RITMO_LOG)
+		self.ritmo.escalado = self.escala is not None
+		# Fraccion del siguiente paso de simulacion que ya ha pasado
+		self.alpha = 0.0
+		# ms que ha durado el ultimo frame
+		self.time = 0
+		# Tiempos de cada fase del frame (None -> no se mide nada)
+		self.perfil = Perfil(PERFIL_FICHERO) if PERFIL == 1 else None
+		# Entrada del frame: las escenas la leen con entrada.actual()
+		self.entrada = Entrada()
+		# Donde apuntan las escenas lo que pintan en on_draw (ver render.py)
+		self.cola = ColaRender((WIDTH, HEIGHT))
+		if self.perfil:
+			self.perfil.cola = self.cola
+		# Copia de cada frame que se escribe en otro hilo (None -> no se captura)
+		self.captura = None
+		if CAPTURA:
+			self.captura = Captura(CAPTURA, (WIDTH, HEIGHT), fps or POR_DEFECTO,
+				presion=CAPTURA_PRESION, plantilla=self.screen)
 
 	def loop(self):
-		"Pone en funcionamiento el juego."
+		"""Pone en funcionamiento el juego.
+
+		La escena se actualiza a pasos fijos de 1000/PHYSICS_HZ ms, tantos
+		como quepan en el tiempo real transcurrido (puede ser ninguno). Lo
+		que sobra se guarda para el siguiente frame y queda en self.alpha
+		para que la escena interpole al pintar.
+
+		La entrada se lee una vez por frame y cada paso la ve en
+		self.entrada.actual().
+
+		self.ritmo espera entre frames y dice si este se pinta; en su
+		nivel de carga SIN_EFECTOS no suenan los efectos ni se pinta el
+		overlay del perfil.
+
+		Con self.captura lo que pinta la escena (sin el overlay) se copia
+		para escribirlo en otro hilo; los frames sin pintar repiten el
+		anterior."""
 
 		pygame.key.set_repeat(10, 200)
+		paso = 1000.0 / PHYSICS_HZ
+		acumulado = 0.0
+		perfil = self.perfil
+		entrada = self.entrada
+		entrada.permitir()
+		ritmo = self.ritmo
+		captura = self.captura
+		# Si el ultimo frame pintado llevaba el overlay del perfil
+		con_overlay = False
 		while not self.quit_flag:
-			time = self.clock.tick(60)
+			if perfil: t0 = reloj()
+			time = ritmo.esperar()
+			self.time = time
+			efectos = ritmo.nivel < SIN_EFECTOS
+			sonido.silenciar_efectos = not efectos
+			if perfil: t1 = reloj()
 
 			# Eventos de Salida
-			for event in pygame.event.get():
-				if event.type == pygame.QUIT:
-					self.quit()
-				if event.type == pygame.KEYDOWN:
-					if event.key == pygame.K_ESCAPE:
-						self.quit()
-
-				# detecta eventos
-				self.scene.on_event(time, event)
+			estado = entrada.leer()
+			if estado.salir or estado.nueva(SALIR):
+				self.quit()
+			if estado.nueva(PERFIL) and perfil:
+				perfil.overlay = not perfil.overlay
+			if perfil: t2 = reloj()
 			# actualiza la escena
-			self.scene.on_update(time)
-
-			# dibuja la pantalla
-			self.scene.on_draw(self.screen)
+			acumulado += min(time, MAX_FRAME)
+			while acumulado >= paso:
+				self.scene.on_update(paso)
+				entrada.consumir()
+				acumulado -= paso
+			self.alpha = acumulado / paso
+			sonido.actualizar(time)
+			if perfil: t3 = reloj()
+
+			# dibuja la pantalla (si el ritmo no dice que se salte)
+			# Si la escena devuelve rectangulos solo se actualizan esos
+			pinta = ritmo.pintar()
+			overlay = bool(perfil and perfil.overlay and efectos)
+			if pinta and overlay != con_overlay:
+				# Lo que tapaba el overlay (o lo que pinto) ya no vale
+				con_overlay = overlay
+				self.scene.on_invalidar()
+			if pinta:
+				rects = self.scene.on_draw(self.screen)
+			if captura:
+				captura.capturar(self.screen if pinta else None, captura.avanzar(time))
+			if pinta and overlay:
+				rect = perfil.dibujar(self.screen, self.scene.__class__.__name__)
+				if rects is not None and rect is not None:
+					rects.append(rect)
+			if perfil: t4 = reloj()
+			if pinta:
+				self.presentar(rects)
+			if perfil:
+				perfil.frame(self.scene.__class__.__name__,
+					(t1 - t0, t2 - t1, t3 - t2, t4 - t3, reloj() - t4))
+		while self.pila:
+			self.pila.pop().on_exit()
+		self.scene = None
+		sonido.silenciar_efectos = False
+		ritmo.cerrar()
+		if captura:
+			captura.cerrar()
+			self.captura = None
+		if perfil:
+			perfil.cerrar()
+
+	def abrir(self, tam):
+		"""Abre la ventana a tam. Si no es el tamaño logico las escenas
+		pintan en una superficie aparte que presentar() escala."""
+		self.ventana = pygame.display.set_mode(tam)
+		if tam == (WIDTH, HEIGHT):
+			self.screen = self.ventana
+			self.escala = None
+		else:
+			self.screen = pygame.Surface((WIDTH, HEIGHT)).convert()
+			self.escala = (float(tam[0]) / WIDTH, float(tam[1]) / HEIGHT)
+		self.centrado = False
+		if getattr(self, 'ritmo', None) is not None:
+			self.ritmo.escalado = self.escala is not None
+
+	def cambiar_resolucion(self, res):
+		"""Cambia la ventana a RESOLUTION[res] en marcha.
+
+		Las escenas no se rehacen: siguen pintando al tamaño logico. Solo
+		se repinta entero el siguiente frame."""
+		global RES
+		RES = res
+		self.abrir(RESOLUTION[res])
+		if self.scene is not None:
+			self.scene.on_resolucion()
+
+	def presentar(self, rects):
+		"""Lleva lo pintado en screen a la ventana.
+
+		rects son los rectangulos que ha devuelto on_draw (None -> todo).
+		Si hay que escalar se escala screen entero de una pasada, salvo
+		en el nivel de carga SIN_ESCALAR, en el que screen se pone tal
+		cual en el centro de la ventana."""
+		if rects is not None and not rects:
+			return
+		if self.escala is not None:
+			centrar = self.ritmo.nivel >= SIN_ESCALAR
+			if centrar != self.centrado:
+				# Al cambiar de modo se pinta la ventana entera
+				self.centrado = centrar
+				self.ventana.fill((0, 0, 0))
+				rects = None
+			if centrar:
+				ancho, alto = self.ventana.get_size()
+				x, y = (ancho - WIDTH) // 2, (alto - HEIGHT) // 2
+				self.ventana.blit(self.screen, (x, y))
+				if rects is not None:
+					rects = [rect.move(x, y) for rect in rects]
+			else:
+				pygame.transform.scale(self.screen, self.ventana.get_size(), self.ventana)
+				if rects is not None:
+					rects = [escalar_rect(rect, self.escala) for rect in rects]
+		if rects is None:
 			pygame.display.flip()
+		else:
+			pygame.display.update(rects)
 
 	def change_scene(self, scene):
 		"Altera la escena actual."
-		self.scene = scene
+		self.replace(scene)
+
+	def push(self, scene):
+		"Pone scene encima de la actual, que se queda esperando debajo."
+		self.pila.append(scene)
+		self.entrar()
+
+	def pop(self):
+		"Quita la escena actual y vuelve a la de debajo."
+		self.pila.pop().on_exit()
+		self.entrar()
+
+	def replace(self, scene):
+		"Cambia la escena actual por scene."
+		if self.pila:
+			self.pila.pop().on_exit()
+		self.pila.append(scene)
+		self.entrar()
+
+	def volver(self, clase):
+		"Vuelve a la escena de debajo; si no hay ninguna, a la de clase."
+		if len(self.pila) > 1:
+			self.pop()
+		else:
+			self.replace(self.escena(clase))
+
+	def entrar(self):
+		self.scene = self.pila[-1] if self.pila else None
+		if self.scene is not None:
+			self.scene.on_enter()
+
+	def escena(self, clase):
+		"La escena de clase que se reutiliza siempre (la crea la primera vez)."
+		scene = self.escenas.get(clase)
+		if scene is None:
+			scene = self.escenas[clase] = clase(self)
+		return scene
 
 	def quit(self):
 		self.quit_flag = True
@@ -69,18 +321,38 @@ class Scene:
     def __init__(self, director):
         self.director = director
  
-    def on_update(self):
-        "Actualización lógica que se llama automáticamente desde el director."
+    def on_update(self, time):
+        """Actualización lógica que se llama automáticamente desde el director.
+
+        Se llama una vez por paso de simulacion; la entrada de ese paso
+        esta en self.director.entrada.actual()."""
         raise NotImplemented("Tiene que implementar el método on_update.")
  
-    def on_event(self, event):
-        "Se llama cuando llega un evento especifico al bucle."
-        raise NotImplemented("Tiene que implementar el método on_event.")
- 
     def on_draw(self, screen):
-        "Se llama cuando se quiere dibujar la pantalla."
+        """Se llama cuando se quiere dibujar la pantalla.
+
+        Si devuelve una lista de rectangulos el director solo actualiza
+        esas zonas; si no devuelve nada se actualiza la pantalla entera.
+        Lo normal es apuntar lo que se pinta en self.director.cola y
+        acabar con cola.ejecutar(screen)."""
         raise NotImplemented("Tiene que implementar el método on_draw.")
 
+    def on_enter(self):
+        "Se llama cada vez que la escena pasa a ser la actual."
+        pass
+
+    def on_exit(self):
+        "Se llama cuando la escena sale de la pila o se cierra el juego."
+        pass
+
+    def on_resolucion(self):
+        "Se llama cuando cambia la ventana; lo que se guarde de la pantalla ya no vale."
+        self.on_invalidar()
+
+    def on_invalidar(self):
+        "Se llama cuando alguien ha pintado encima: el siguiente frame se pinta entero."
+        pass
+
 class SceneHome(Scene):
 	"""Escena inicial del juego, esta es la primera que se carga cuando inicia"""
 
@@ -98,49 +370,54 @@ class SceneHome(Scene):
 
 		self.selected = 0
 
-		self.flecha = load_image("images/flecha.png")
-		self.flecha = pygame.transform.scale(self.flecha, (self.iniciar.get_width()/2+10,self.iniciar.get_height()/2+10))
+		self.flecha = imagenes.escalada("images/flecha.png", (self.iniciar.get_width()/2+10,self.iniciar.get_height()/2+10))
 		self.flecha_rect = self.flecha.get_rect()
 		self.flecha_rect.centerx = WIDTH/2 - self.menu[self.selected].get_width()
 		self.flecha_rect.centery = self.alturas[self.selected]
 
-		#Carga la musica
-		if not pygame.mixer.music.get_busy() and MUSIC == 1:
-			pygame.mixer.music.load("music/title_theme.mp3")
-			#Pone la música a funcionar
-			# loop = -1 -> Loop infinito
-			pygame.mixer.music.play(-1)
+		''' Partida que se va preparando mientras se esta en el menu '''
+		self.partida = None
 
-	def on_update(self, time):
-		pass
+	def on_enter(self):
+		#Pone la musica (si ya sonaba sigue sin cortarse)
+		sonido.pista('titulo')
+		#Al volver de las opciones se sigue con la que ya habia; solo se
+		#prepara otra cuando se ha jugado la anterior
+		if self.partida is None:
+			self.partida = Preparacion(preparar_partida(self.director))
 
-	def on_event(self, time, event):
+	def on_update(self, time):
+		self.partida.avanzar()
 		#Flechita hacia arriba
-		keys = pygame.key.get_pressed()
-		if pygame.KEYDOWN:
-			if keys[K_UP]:
+		estado = self.director.entrada.actual()
+		if estado.nuevas:
+			if estado.nueva(ARRIBA):
 				self.selected = self.selected - 1 if self.selected > 0 else 0
 				self.flecha_rect.centery = self.alturas[self.selected]
 			# Flechita hacia abajo
-			if keys[K_DOWN]:
+			if estado.nueva(ABAJO):
 				self.selected = self.selected + 1 if self.selected<(len(self.menu)-1) else self.selected
 				self.flecha_rect.centery = self.alturas[self.selected]
 	 		
-			if keys[K_RETURN]:
+			if estado.nueva(ACEPTAR):
 				if self.selected == 0:
-					scene = SceneGame(self.director)
-					self.director.change_scene(scene)
+					partida, self.partida = self.partida, None
+					if partida.lista:
+						self.director.push(partida.resultado)
+					else:
+						self.director.push(SceneCarga(self.director, partida))
 				if self.selected == 1:
-					scene = SceneOptions(self.director)
-					self.director.change_scene(scene)			
+					self.director.push(self.director.escena(SceneOptions))
 
 	def on_draw(self, screen):
 		#Renderiza las letras
 		screen.fill((0,0,0))
-		screen.blit(self.titulo, self.titulo_rect)
-		screen.blit(self.flecha, self.flecha_rect)
-		screen.blit(self.iniciar, self.iniciar_rect)
-		screen.blit(self.options, self.options_rect)
+		cola = self.director.cola
+		cola.pintar(self.titulo, self.titulo_rect)
+		cola.pintar(self.flecha, self.flecha_rect)
+		cola.pintar(self.iniciar, self.iniciar_rect)
+		cola.pintar(self.options, self.options_rect)
+		cola.ejecutar(screen)
 
 class SceneOptions(Scene):
 	"""Escena del bucle de juego"""
@@ -150,7 +427,7 @@ class SceneOptions(Scene):
 		#Altura: Segundo cuarto
 		self.musica, self.musica_rect = texto('Musica', WIDTH/2, HEIGHT/2+20)
 		#Altura: Tercer cuatro
-		self.resol, self.resol_rect = texto('Resolucion (No furula)', WIDTH/2, 3*HEIGHT/4)
+		self.resol, self.resol_rect = texto(nombre_resolucion(), WIDTH/2, 3*HEIGHT/4)
 		self.atras, self.atras_rect = texto('Atras', WIDTH/6, HEIGHT-40)
 		self.titulo, self.titulo_rect = texto('Not Pong', WIDTH/2, HEIGHT/4, (255,255,255), 75)
 
@@ -159,127 +436,288 @@ class SceneOptions(Scene):
 
 		self.selected = 0
 
-		self.flecha = load_image("images/flecha.png")
-		self.flecha = pygame.transform.scale(self.flecha, (self.musica.get_width()/2+10,self.musica.get_height()/2+10))
+		self.flecha = imagenes.escalada("images/flecha.png", (self.musica.get_width()/2+10,self.musica.get_height()/2+10))
 		self.flecha_rect = self.flecha.get_rect()
 		self.flecha_rect.centerx = self.dim[self.selected][0] - self.menu[self.selected].get_width()/2 - 20
 		self.flecha_rect.centery = self.dim[self.selected][1]
 
 	def on_update(self, time):
-		pass
+		estado = self.director.entrada.actual()
 
-	def on_event(self, time, event):
-		keys = pygame.key.get_pressed()
-
-		if pygame.KEYDOWN:
+		if estado.nuevas:
 			#Flechita hacia arriba
-			if keys[K_UP]:
+			if estado.nueva(ARRIBA):
 				self.selected = self.selected - 1 if self.selected > 0 else 0
 				self.flecha_rect.centery = self.dim[self.selected][1]
 				self.flecha_rect.centerx = self.dim[self.selected][0] - self.menu[self.selected].get_width()/2 - 20
 			# Flechita hacia abajo
-			if keys[K_DOWN]:
+			if estado.nueva(ABAJO):
 				self.selected = self.selected + 1 if self.selected<(len(self.menu)-1) else self.selected
 				self.flecha_rect.centery = self.dim[self.selected][1]
 				self.flecha_rect.centerx = self.dim[self.selected][0] - self.menu[self.selected].get_width()/2 - 20
 	 		
-			if keys[K_RETURN]:
+			if estado.nueva(ACEPTAR):
 				if self.selected == 0:
 					global MUSIC
 					MUSIC = 0 if MUSIC == 1 else 1
-					if MUSIC == 0:
-						pygame.mixer.music.stop()
-					if MUSIC == 1:
-						pygame.mixer.music.load("music/title_theme.mp3")
-						pygame.mixer.music.play(-1)
+					sonido.activar(MUSIC == 1)
+				if self.selected == 1:
+					self.director.cambiar_resolucion((RES + 1) % len(RESOLUTION))
+					self.resol, self.resol_rect = texto(nombre_resolucion(), WIDTH/2, 3*HEIGHT/4)
+					self.menu[1] = self.resol
+					self.flecha_rect.centerx = self.dim[self.selected][0] - self.menu[self.selected].get_width()/2 - 20
 				if self.selected == 2:
-					scene = SceneHome(self.director)
-					self.director.change_scene(scene)
+					self.director.volver(SceneHome)
+			elif estado.nueva(ATRAS):
+				self.director.volver(SceneHome)
 
 	def on_draw(self, screen):
 		#Renderiza las letras
 		screen.fill((0,0,0))
-		screen.blit(self.titulo, self.titulo_rect)
-		screen.blit(self.flecha, self.flecha_rect)
-		screen.blit(self.musica, self.musica_rect)
-		screen.blit(self.resol, self.resol_rect)
-		screen.blit(self.atras, self.atras_rect)
+		cola = self.director.cola
+		cola.pintar(self.titulo, self.titulo_rect)
+		cola.pintar(self.flecha, self.flecha_rect)
+		cola.pintar(self.musica, self.musica_rect)
+		cola.pintar(self.resol, self.resol_rect)
+		cola.pintar(self.atras, self.atras_rect)
+		cola.ejecutar(screen)
+
+class SceneCarga(Scene):
+	"""Se ve solo si se pide la partida antes de que este preparada:
+	termina de prepararla y se cambia por ella."""
+
+	def __init__(self, director, preparacion):
+		Scene.__init__(self, director)
+		self.preparacion = preparacion
+		self.cargando, self.cargando_rect = texto('Cargando...', WIDTH/2, HEIGHT/2)
+
+	def on_update(self, time):
+		if self.preparacion.avanzar():
+			self.director.replace(self.preparacion.resultado)
+
+	def on_draw(self, screen):
+		screen.fill((0,0,0))
+		self.director.cola.pintar(self.cargando, self.cargando_rect)
+		self.director.cola.ejecutar(screen)
 
 class SceneGame(Scene):
 	"""Escena del bucle de juego"""
 
-	def __init__(self, director):
+	def __init__(self, director, semilla=None):
 		Scene.__init__(self, director)
-		pygame.key.set_repeat(10, 10)
-		pygame.mixer.music.stop()
-		if MUSIC == 1:
-			pygame.mixer.music.load("music/game_theme.mp3")
-			pygame.mixer.music.play(-1)
 
 		''' Define el nombre de la ventana'''
 		#pygame.display.set_caption("Not Pong")
 
 		''' Carga de imagen para el fondo'''
 		self.background_image = load_image('images/fondo_pong.png')
+		self.render = RenderSucio(self.background_image)
+
+		''' Estado de la partida: las reglas estan en motor.py '''
+		if semilla is None:
+			semilla = SEMILLA if SEMILLA is not None else random.randrange(2**31)
+		self.semilla = semilla
+		self.partida = motor.Partida({'width': WIDTH, 'height': HEIGHT,
+			'x_jug': 30, 'x_cpu': WIDTH - 30, 'speed_cpu': 0.4,
+			'colision': COLISION, 'ia_cpu': IA_CPU[0],
+			'reaccion_cpu': IA_CPU[1], 'error_cpu': IA_CPU[2]}, semilla)
+
+		''' De donde sale la entrada de cada paso (una repeticion pone aqui la suya) '''
+		self.teclado = director.entrada.actual
+		self.grabadora = None
+		if GRABAR:
+			self.grabadora = Grabadora(GRABAR, {'semilla': semilla,
+				'resolucion': [WIDTH, HEIGHT], 'physics_hz': PHYSICS_HZ,
+				'colision': COLISION, 'ia_cpu': list(IA_CPU)})
+
+		''' Fotos de los ultimos PRACTICA segundos para rebobinar '''
+		self.historial = None
+		if PRACTICA and not GRABAR:
+			self.historial = motor.Historial(self.partida, int(PRACTICA * PHYSICS_HZ))
 
 		''' Carga de la pelotica '''
-		self.bola = Bola()
+		self.bola = Bola(self.partida.bola)
 
 		''' Carga jugador (a 30px de la izq)'''
-		self.pala_jug = Pala(30)
+		self.pala_jug = Pala(30, self.partida.pala_jug)
 
 		''' Carga cou (a 30px a la drch)'''
-		self.pala_cpu = Pala(WIDTH - 30)
-		self.pala_cpu.speed = 0.4
+		self.pala_cpu = Pala(WIDTH - 30, self.partida.pala_cpu)
 
 		''' Reloj de juego ''' #Heredado
 		#self.clock = pygame.time.Clock()
 
 		''' Puntuacion de los jugadores [J1, J2]'''
-		self.puntos = [0, 0]
+		self.puntos = self.partida.puntos
 
 		'''Para que no comience al momento cuando se marca'''
 		self.count = 3.0
 		self.count_text, self.count_rect = texto(str(self.count), WIDTH/2, HEIGHT/2, (255, 255, 255), 60)
+		self.count_valor = None
 
+		''' Marcadores: solo se vuelven a generar cuando cambian '''
+		self.marcador = None
+		self.actualizar_marcador()
+
+	def actualizar_marcador(self):
+		if self.marcador != self.puntos:
+			self.marcador = list(self.puntos)
+			(self.p_jug, self.p_jug_rect), (self.p_cpu, self.p_cpu_rect) = textos_marcador(self.puntos)
+
+	def actualizar_cuenta(self):
+		if self.count_valor != int(self.count)+1:
+			self.count_valor = int(self.count)+1
+			self.count_text, self.count_rect = texto(str(self.count_valor), WIDTH/2, HEIGHT/2, (255, 255, 255), 60)
 
 	def on_update(self, time):
+		estado = self.teclado()
+		if estado.nueva(ATRAS):
+			self.director.volver(SceneHome)
+			return
+		if self.historial is not None and estado.pulsada(REBOBINAR):
+			self.rebobinar()
+			return
+		if self.grabadora:
+			self.grabadora.update(estado)
+		self.guardar_sprites()
+		self.pala_jug.mover(time, estado)
 		if self.count > 0:
-			self.count_text, self.count_rect = texto(str(int(self.count)+1), WIDTH/2, HEIGHT/2, (255, 255, 255), 60)
-			self.count -= 1.0/60
+			self.actualizar_cuenta()
+			self.count -= time / 1000.0
 		else:
 			#Actualizar la posicion de la pelota y de la pala
-			auxP = copy.copy(self.puntos)
-			self.puntos = self.bola.actualizar(time, self.pala_jug, self.pala_cpu, self.puntos)
-			if auxP != self.puntos:
-				self.count = 3.0 
-			else: 
+			sucesos = self.partida.actualizar(time)
+			sonar(sucesos)
+			self.bola.sincronizar()
+			self.pala_cpu.sincronizar()
+			if sucesos & motor.GOL:
+				self.count = 3.0
+				#Tras el saque todo se pinta donde esta, sin interpolar
+				#desde antes del gol (durante la cuenta no se mueve)
+				self.guardar_sprites()
+			else:
 				self.count = 0.0
-			self.pala_cpu.ia(time, self.bola)
-		self.p_jug, self.p_jug_rect = texto(str(self.puntos[0]), WIDTH/4, 40)
-		self.p_cpu, self.p_cpu_rect = texto(str(self.puntos[1]), WIDTH-WIDTH/4, 40)
-
-	def on_event(self, time, event):
-		keys = pygame.key.get_pressed()
-		
-		self.pala_jug.mover(time, keys)
+		self.actualizar_marcador()
+		if self.historial is not None:
+			self.historial.guardar(self.count)
+
+	def guardar_sprites(self):
+		''' La posicion actual de cada sprite pasa a ser la anterior para interpolar '''
+		for sprite in (self.bola, self.pala_jug, self.pala_cpu):
+			sprite.guardar()
+
+	def rebobinar(self):
+		''' Un paso hacia atras: la partida vuelve a la foto anterior '''
+		count = self.historial.restaurar(1)
+		if count is None:
+			return
+		self.count = count
+		for sprite in (self.bola, self.pala_jug, self.pala_cpu):
+			sprite.sincronizar()
+		self.guardar_sprites()
+		if self.count > 0:
+			self.actualizar_cuenta()
+		self.actualizar_marcador()
 
 	def on_draw(self, screen):
 		''' Actualiza los cambios ocurridos en la pantalla '''
-		screen.blit(self.background_image, (0, 0))
-		screen.blit(self.bola.image, self.bola.rect)
-		screen.blit(self.pala_jug.image, self.pala_jug.rect)
-		screen.blit(self.pala_cpu.image, self.pala_cpu.rect)
-		screen.blit(self.p_jug, self.p_jug_rect)
-		screen.blit(self.p_cpu, self.p_cpu_rect)
+		if self.grabadora:
+			self.grabadora.frame(self.director.time)
+		if DIRTY == 1:
+			return self.render.dibujar(screen, self.elementos())
+		alpha = self.director.alpha
+		cola = self.director.cola
+		pintar_campo(cola, self.background_image, self.bola.image, interpolar(self.bola, alpha),
+			self.pala_jug.image, interpolar(self.pala_jug, alpha), interpolar(self.pala_cpu, alpha))
+		self.pintar_marcador(cola)
+		cola.ejecutar(screen)
+
+	def pintar_marcador(self, cola):
+		cola.pintar(self.p_jug, self.p_jug_rect, HUD)
+		cola.pintar(self.p_cpu, self.p_cpu_rect, HUD)
+		if self.count > 0:
+			cola.pintar(self.count_text, self.count_rect, HUD)
+
+	def on_enter(self):
+		sonido.pista('juego')
+		self.render.invalidar()
+
+	def on_invalidar(self):
+		self.render.invalidar()
+
+	def on_exit(self):
+		if self.grabadora:
+			self.grabadora.guardar(estado_final(self))
+			self.grabadora = None
+
+	def elementos(self):
+		''' Lo que se pinta encima del fondo, en orden, para el RenderSucio '''
+		alpha = self.director.alpha
+		elementos = [
+			('bola', self.bola.image, interpolar(self.bola, alpha)),
+			('pala_jug', self.pala_jug.image, interpolar(self.pala_jug, alpha)),
+			('pala_cpu', self.pala_cpu.image, interpolar(self.pala_cpu, alpha)),
+			('p_jug', self.p_jug, self.p_jug_rect),
+			('p_cpu', self.p_cpu, self.p_cpu_rect),
+		]
+		if self.count > 0:
+			elementos.append(('count', self.count_text, self.count_rect))
+		return elementos
+
+
+class SceneCaos(SceneGame):
+	"""SceneGame con muchas pelotas que ademas chocan entre ellas.
 
+	Las reglas estan en motor_caos.Bolas; la pelota y las palas de
+	SceneGame solo se usan para las imagenes. No se graba y se pinta
+	entero cada frame, sin interpolar las pelotas."""
+
+	def __init__(self, director, semilla=None, bolas=None):
+		SceneGame.__init__(self, director, semilla)
+		self.grabadora = None
+		self.historial = None
+		self.caos = motor_caos.Bolas(bolas or CAOS_BOLAS, {'width': WIDTH, 'height': HEIGHT,
+			'x_jug': 30, 'x_cpu': WIDTH - 30, 'speed_cpu': 0.4}, self.semilla)
+		self.pala_jug.estado = self.caos.pala_jug
+		self.pala_cpu.estado = self.caos.pala_cpu
+		self.puntos = self.caos.puntos
+
+	def on_update(self, time):
+		estado = self.teclado()
+		if estado.nueva(ATRAS):
+			self.director.volver(SceneHome)
+			return
+		self.pala_jug.guardar()
+		self.pala_cpu.guardar()
+		self.pala_jug.mover(time, estado)
 		if self.count > 0:
-			screen.blit(self.count_text, self.count_rect)
-			
+			self.actualizar_cuenta()
+			self.count -= time / 1000.0
+		else:
+			sonar(self.caos.paso(time))
+			self.pala_cpu.sincronizar()
+		self.actualizar_marcador()
+
+	def on_draw(self, screen):
+		alpha = self.director.alpha
+		cola = self.director.cola
+		cola.pintar(self.background_image, (0, 0), FONDO)
+		image = self.bola.image
+		medio_w = self.caos.w / 2
+		medio_h = self.caos.h / 2
+		cola.pintar_muchas(image, [(int(x) - medio_w, int(y) - medio_h)
+			for x, y in zip(self.caos.x, self.caos.y)])
+		cola.pintar(self.pala_jug.image, interpolar(self.pala_jug, alpha))
+		cola.pintar(self.pala_cpu.image, interpolar(self.pala_cpu, alpha))
+		self.pintar_marcador(cola)
+		cola.ejecutar(screen)
 
 ''' Clase para el sprite de la pelota'''
 class Bola(pygame.sprite.Sprite):
-	def __init__(self):
+	"""Sprite de la pelota. La posicion y la velocidad estan en
+	self.estado (motor.EstadoBola); el rect solo sirve para pintar."""
+
+	def __init__(self, estado=None):
 		pygame.sprite.Sprite.__init__(self)
 		self.image = load_image("images/ball.png", True)
 
@@ -295,117 +733,145 @@ class Bola(pygame.sprite.Sprite):
 		self.rect = self.image.get_rect()
 
 		#Se coloca la peloca en el centro de la ventana
-		self.rect.centerx = WIDTH / 2
-		self.rect.centery = HEIGHT / 2
-
-		#Velocidad en el eje X, eje Y
-		self.speed = [0.5, -0.5]
-
-	def reset(self):
-		self.rect.centerx = WIDTH / 2
-		self.rect.centery = HEIGHT / 2
-		if random.random() > 0.45: 
-			mult1 = -1
-			mult2 = 1
-		else:
-			mult1 = 1
-			mult2 = -1
-
-		self.speed = [mult1*random.uniform(0.3, 0.5), mult2*random.uniform(0.3, 0.5)]
-
-	def actualizar(self, time, pala_jug, pala_cpu, puntos):
-		# Espacio = V * T
-		self.rect.centerx += self.speed[0] * time
-		self.rect.centery += self.speed[1] * time
-
-		if self.rect.left <= 0:
-			puntos[1] += 1
-			self.reset()
-		if self.rect.right >= WIDTH-15:
-			puntos[0] += 1
-			self.reset()
-
-		if self.rect.left <= 0 or self.rect.right >= WIDTH:
-			self.speed[0] = -self.speed[0]
-			self.rect.centerx += self.speed[0] * time
-		if self.rect.top <= 0 or self.rect.bottom >= HEIGHT:
-			self.speed[1] = -self.speed[1]
-			self.rect.centery += self.speed[1] * time
-		#Si colisiona la pelota y la pala del jugador...
-		if pygame.sprite.collide_rect(self, pala_jug):
-			self.speed[0] = -self.speed[0]
-			self.rect.centerx += self.speed[0] * time
-
-		#Si colisiona la pelota y la pala de la cpu...
-		if pygame.sprite.collide_rect(self, pala_cpu):
-			self.speed[0] = -self.speed[0]
-			self.rect.centerx += self.speed[0] * time
-
-		return puntos
+		if estado is None:
+			estado = motor.EstadoBola(self.rect.size, WIDTH, HEIGHT)
+		self.estado = estado
+		self.sincronizar()
+
+		#Posicion antes del ultimo paso, para interpolar al pintar
+		self.guardar()
+
+	#Velocidad en el eje X, eje Y
+	@property
+	def speed(self):
+		return self.estado.speed
+
+	def sincronizar(self):
+		''' Lleva el rect a la posicion del estado '''
+		self.rect.center = (int(round(self.estado.x)), int(round(self.estado.y)))
+
+	def guardar(self):
+		self.anterior = (self.estado.x, self.estado.y)
 
 
 class Pala(pygame.sprite.Sprite):
-	def __init__(self, x):
+	"""Sprite de una pala centrada en x. La posicion esta en
+	self.estado (motor.EstadoPala)."""
+
+	def __init__(self, x, estado=None):
 		pygame.sprite.Sprite.__init__(self)
 		self.image = load_image("images/pala.png")
 		self.rect = self.image.get_rect()
-		self.rect.centerx = x
-		self.rect.centery = HEIGHT / 2
-		self.speed = 0.5
-
-	def mover(self, time, keys):
-		if self.rect.top >= 0:
-			# Flechita hacia arriba
-			if keys[K_UP]:
-				self.rect.centery -= self.speed * time
-		if self.rect.bottom <= HEIGHT:
-			# Flechita hacia abajo
-			if keys[K_DOWN]:
-				self.rect.centery += self.speed * time
+		if estado is None:
+			estado = motor.EstadoPala(x, self.rect.size, WIDTH, HEIGHT)
+		self.estado = estado
+		self.sincronizar()
+		self.guardar()
+
+	def _get_speed(self):
+		return self.estado.speed
+
+	def _set_speed(self, speed):
+		self.estado.speed = speed
+
+	speed = property(_get_speed, _set_speed)
+
+	def sincronizar(self):
+		self.rect.center = (int(round(self.estado.x)), int(round(self.estado.y)))
+
+	def guardar(self):
+		self.anterior = (self.estado.x, self.estado.y)
+
+	def mover(self, time, entrada):
+		motor.mover_pala(self.estado, time, entrada.pulsada(ARRIBA), entrada.pulsada(ABAJO))
+		self.sincronizar()
+
+class Preparacion:
+	"""Algo que se construye a trozos en los pasos en los que no se hace
+	nada mas, sin parar ningun frame.
 
-	def ia(self, time, ball):
-		if ball.speed[0] >= 0 and ball.rect.centerx >= WIDTH/2:
-			if self.rect.centery < ball.rect.centery:
-				self.rect.centery += self.speed * time
-			if self.rect.centery > ball.rect.centery:
-				self.rect.centery -= self.speed * time
+	generador hace un trozo cada vez que se le pide el siguiente valor;
+	lo ultimo que devuelve queda en self.resultado. No se usan hilos:
+	las superficies y las fuentes de pygame no se pueden tocar desde dos
+	hilos a la vez."""
 
+	def __init__(self, generador):
+		self.generador = generador
+		self.resultado = None
+		self.lista = False
 
+	def avanzar(self):
+		"Hace el siguiente trozo. Devuelve True si ya esta todo."
+		if not self.lista:
+			try:
+				self.resultado = next(self.generador)
+			except StopIteration:
+				self.lista = True
+		return self.lista
 
 # ---------------------------------------------------------------------
 
 # Funciones
 # ---------------------------------------------------------------------
-def load_image(filename, transparent=False):
-	''' Intenta abrir la imagen dada por la ruta "filename" '''
-	try: image = pygame.image.load(filename)
-	#Si falla, sale el error
-	except pygame.error, message:
-		raise SystemExit, message
-	''' Convierte la imagen a una de tipo de pygame'''
-	image = image.convert()
-	''' Si la imagen tiene transparencia, toma como transparencia el pixel superior izquierdo'''
-	if transparent:
-		color = image.get_at((0,0))
-		image.set_colorkey(color, RLEACCEL)
-	return image
-
-''' Escribir texto '''
-
-def texto(texto, posx, posy, color=(255, 255, 255), size=25):
-    fuente = pygame.font.Font("fonts/DroidSans.ttf", size)
-    salida = pygame.font.Font.render(fuente, texto, 1, color)
-    salida_rect = salida.get_rect()
-    salida_rect.centerx = posx
-    salida_rect.centery = posy
-    return salida, salida_rect
+def preparar_partida(director):
+	''' Para Preparacion: deja en cache lo que usa SceneGame y la crea '''
+	imagenes.precargar([("images/fondo_pong.png", False),
+		("images/ball.png", True), ("images/pala.png", False)])
+	yield None
+	for n in ('0', '1', '2', '3', '3.0'):
+		texto(n, WIDTH/2, HEIGHT/2, (255, 255, 255), 60)
+	texto('0', WIDTH/4, 40)
+	yield None
+	yield SceneCaos(director) if CAOS == 1 else SceneGame(director)
+
+def interpolar(sprite, alpha):
+	''' Rect del sprite entre su posicion anterior (alpha=0) y la actual (alpha=1) '''
+	rect = sprite.rect.copy()
+	x, y = sprite.anterior
+	rect.centerx = int(round(x + (sprite.estado.x - x) * alpha))
+	rect.centery = int(round(y + (sprite.estado.y - y) * alpha))
+	return rect
+
+def pintar_campo(cola, fondo, bola, rect_bola, pala, rect_jug, rect_cpu):
+	''' El fondo, la pelota y las dos palas en la cola, como los pinta SceneGame '''
+	cola.pintar(fondo, (0, 0), FONDO)
+	cola.pintar(bola, rect_bola)
+	cola.pintar(pala, rect_jug)
+	cola.pintar(pala, rect_cpu)
+
+def textos_marcador(puntos, width=WIDTH):
+	''' (superficie, rect) de los puntos de cada lado, en lo alto del campo '''
+	return (texto(str(puntos[0]), width/4, 40), texto(str(puntos[1]), width - width/4, 40))
+
+def sonar(sucesos):
+	''' Efecto de sonido de lo que ha pasado en un paso de la pelota '''
+	if sucesos & motor.GOL:
+		sonido.efecto('gol')
+	elif sucesos & motor.GOLPE:
+		sonido.efecto('golpe')
+	elif sucesos & motor.PARED:
+		sonido.efecto('pared')
+
+def escalar_rect(rect, escala):
+	''' Rect de screen en la ventana (redondeado hacia fuera) '''
+	x0 = int(rect.left * escala[0])
+	y0 = int(rect.top * escala[1])
+	x1 = int(rect.right * escala[0] + 0.999)
+	y1 = int(rect.bottom * escala[1] + 0.999)
+	return pygame.Rect(x0, y0, x1 - x0, y1 - y0)
+
+def nombre_resolucion():
+	return 'Resolucion %dx%d' % RESOLUTION[RES]
 
 # ---------------------------------------------------------------------
 
 def main():
 	dir = Director()
-	scene = SceneHome(dir)
-	dir.change_scene(scene)
+	usar_paquete(PAQUETE)
+	imagenes.precargar(MANIFIESTO)
+	sonido.activar(MUSIC == 1)
+	sonido.iniciar()
+	dir.push(dir.escena(SceneHome))
 	dir.loop()
  
 if __name__ == '__main__':
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+# Módulos
+import os, sys, pygame
+from collections import OrderedDict
+from timeit import default_timer
+from pygame.locals import *
+from paquete import Paquete
+# Constantes
+FUENTE = "fonts/DroidSans.ttf"
+# Número máximo de textos renderizados que se guardan
+MAX_TEXTOS = 128
+
+# Clases
+# ---------------------------------------------------------------------
+class CacheTexto:
+	"""Cache de fuentes y de textos ya renderizados.
+
+	Las fuentes se guardan por (ruta, tamaño) y no se liberan nunca,
+	son pocas. Las superficies de texto se guardan en una LRU acotada
+	por (texto, tamaño, color, antialias), asi que pintar el mismo
+	marcador dos veces no vuelve a renderizarlo.
+
+	Las superficies devueltas se comparten: se pueden pintar pero no
+	modificar."""
+
+	def __init__(self, capacidad=MAX_TEXTOS):
+		self.capacidad = capacidad
+		self.fuentes = {}
+		self.textos = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def fuente(self, size, ruta=FUENTE):
+		"Devuelve la fuente de ese tamaño, abriendo el fichero solo la primera vez."
+		clave = (ruta, size)
+		fuente = self.fuentes.get(clave)
+		if fuente is None:
+			if paquete is not None and ruta in paquete:
+				fuente = paquete.fuente(ruta, size)
+			else:
+				fuente = pygame.font.Font(ruta, size)
+			self.fuentes[clave] = fuente
+		return fuente
+
+	def render(self, texto, size=25, color=(255, 255, 255), antialias=True):
+		"Devuelve la superficie con el texto, renderizandola solo si no estaba ya."
+		clave = (texto, size, tuple(color), bool(antialias))
+		salida = self.textos.pop(clave, None)
+		if salida is None:
+			self.misses += 1
+			salida = self.fuente(size).render(texto, antialias, color)
+			if len(self.textos) >= self.capacidad:
+				# Saca el que lleva mas tiempo sin usarse
+				self.textos.popitem(last=False)
+		else:
+			self.hits += 1
+		# Se vuelve a meter al final: es el mas reciente
+		self.textos[clave] = salida
+		return salida
+
+	def limpiar(self):
+		"Vacía la cache de textos (las fuentes se mantienen)."
+		self.textos.clear()
+
+	def stats(self):
+		return {
+			'fuentes': len(self.fuentes),
+			'textos': len(self.textos),
+			'hits': self.hits,
+			'misses': self.misses,
+		}
+
+class GestorImagenes:
+	"""Cache de imagenes compartida por todo el proceso.
+
+	Cada fichero se decodifica y se convierte al formato de la pantalla
+	una sola vez. Las versiones con transparencia (colorkey + RLE) y las
+	versiones escaladas se guardan aparte, asi que cambiar de menu o
+	empezar otra partida no vuelve a leer nada del disco.
+
+	Necesita que la pantalla ya este creada (por el convert()). Las
+	superficies devueltas se comparten: no hay que pintar encima."""
+
+	def __init__(self):
+		# (ruta, transparente) -> superficie
+		self.imagenes = {}
+		# (ruta, transparente, (ancho, alto)) -> superficie
+		self.escaladas = {}
+		# ruta -> segundos que costó decodificarla
+		self.tiempos = {}
+
+	def cargar(self, filename, transparent=False):
+		"Devuelve la imagen convertida, decodificandola solo la primera vez."
+		clave = (filename, bool(transparent))
+		image = self.imagenes.get(clave)
+		if image is None:
+			if transparent:
+				image = self.cargar(filename).copy()
+				colorkey(image)
+			else:
+				image = self.decodificar(filename)
+			self.imagenes[clave] = image
+		return image
+
+	def escalada(self, filename, size, transparent=False):
+		"Devuelve la imagen escalada a size, escalandola solo la primera vez."
+		size = (int(size[0]), int(size[1]))
+		clave = (filename, bool(transparent), size)
+		image = self.escaladas.get(clave)
+		if image is None:
+			image = pygame.transform.scale(self.cargar(filename), size)
+			if transparent:
+				colorkey(image)
+			self.escaladas[clave] = image
+		return image
+
+	def decodificar(self, filename):
+		inicio = default_timer()
+		# Si esta en el paquete ya esta decodificada
+		if paquete is not None and filename in paquete:
+			image = paquete.imagen(filename)
+			self.tiempos[filename] = default_timer() - inicio
+			return image
+		# Intenta abrir la imagen dada por la ruta "filename"
+		try: image = pygame.image.load(filename)
+		#Si falla, sale el error
+		except pygame.error, message:
+			raise SystemExit, message
+		# Convierte la imagen a una de tipo de pygame
+		image = image.convert()
+		self.tiempos[filename] = default_timer() - inicio
+		return image
+
+	def precargar(self, manifiesto):
+		"""Carga de golpe todas las imagenes del manifiesto.
+
+		Cada entrada es (ruta, transparente) o (ruta, transparente,
+		(ancho, alto)) si ademas se quiere tener ya la version escalada."""
+		for entrada in manifiesto:
+			if len(entrada) > 2:
+				self.escalada(entrada[0], entrada[2], entrada[1])
+			else:
+				self.cargar(entrada[0], entrada[1])
+
+	def limpiar(self):
+		self.imagenes.clear()
+		self.escaladas.clear()
+		self.tiempos.clear()
+
+	def memoria(self):
+		"Bytes de pixeles que ocupan todas las superficies guardadas."
+		superficies = list(self.imagenes.values()) + list(self.escaladas.values())
+		return sum(bytes_superficie(image) for image in superficies)
+
+	def stats(self):
+		assets = {}
+		for (filename, transparent), image in self.imagenes.items():
+			asset = assets.setdefault(filename, {'bytes': 0, 'variantes': 0,
+				'tiempo': self.tiempos.get(filename, 0.0)})
+			asset['bytes'] += bytes_superficie(image)
+			asset['variantes'] += 1
+		for (filename, transparent, size), image in self.escaladas.items():
+			asset = assets.setdefault(filename, {'bytes': 0, 'variantes': 0,
+				'tiempo': self.tiempos.get(filename, 0.0)})
+			asset['bytes'] += bytes_superficie(image)
+			asset['variantes'] += 1
+		return {
+			'memoria': self.memoria(),
+			'tiempo': sum(self.tiempos.values()),
+			'assets': assets,
+		}
+
+# ---------------------------------------------------------------------
+
+''' Caches compartidas por todo el juego '''
+cache_texto = CacheTexto()
+imagenes = GestorImagenes()
+''' Paquete de assets abierto (None -> ficheros sueltos) '''
+paquete = None
+
+# Funciones
+# ---------------------------------------------------------------------
+def load_image(filename, transparent=False):
+	''' Devuelve la imagen de la cache, cargandola si es la primera vez '''
+	return imagenes.cargar(filename, transparent)
+
+def usar_paquete(fichero):
+	"""Carga los assets del paquete si existe; si no, de los ficheros
+	sueltos. Lo que ha cambiado desde que se hizo el paquete, o no se
+	puede copiar tal cual a una superficie de aqui, tambien se carga del
+	fichero suelto, avisando por stderr."""
+	global paquete
+	if not os.path.exists(fichero):
+		return None
+	try:
+		abierto = Paquete(fichero)
+	except (IOError, ValueError) as error:
+		sys.stderr.write("recursos: no se usa %s: %s\n" % (fichero, error))
+		return None
+	caducados = abierto.caducados()
+	if caducados:
+		sys.stderr.write("recursos: %s ha cambiado desde que se hizo %s, se carga suelto (python paquete.py para rehacerlo)\n" % (
+			", ".join(caducados), fichero))
+		abierto.olvidar(caducados)
+	incompatibles = abierto.incompatibles()
+	if incompatibles:
+		sys.stderr.write("recursos: %s en %s no tiene el formato de las superficies de aqui, se carga suelto\n" % (
+			", ".join(incompatibles), fichero))
+		abierto.olvidar(incompatibles)
+	paquete = abierto
+	return paquete
+
+def colorkey(image):
+	''' Toma como transparencia el pixel superior izquierdo'''
+	color = image.get_at((0,0))
+	image.set_colorkey(color, RLEACCEL)
+
+def bytes_superficie(image):
+	return image.get_pitch() * image.get_height()
+
+''' Escribir texto '''
+
+def texto(texto, posx, posy, color=(255, 255, 255), size=25):
+    salida = cache_texto.render(texto, size, color)
+    salida_rect = salida.get_rect()
+    salida_rect.centerx = posx
+    salida_rect.centery = posy
+    return salida, salida_rect
+
+# ---------------------------------------------------------------------
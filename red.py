@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+
+''' Modo versus por red (UDP) sobre SceneGame.
+
+	python red.py servidor [--puerto 5005]
+	python red.py cliente 127.0.0.1 [--puerto 5005]
+	python red.py prueba [--latencia 50 --perdida 0.05]
+
+El servidor manda en la partida: mueve la pelota, las dos palas y los
+puntos. El cliente controla la pala derecha: manda sus teclas en cada
+paso (repitiendo las ultimas por si se pierde algun paquete) y mueve su
+pala al momento sin esperar al servidor. El servidor manda en cada paso
+un snapshot con solo los campos que han cambiado respecto al ultimo
+snapshot que el cliente ha confirmado.
+
+"prueba" lanza servidor y cliente en dos procesos locales sin pantalla,
+con bots en las dos palas, y enseña cuantos bytes por segundo manda
+cada uno. --latencia (ms, en cada sentido) y --perdida (0-1) simulan una
+red mala. '''
+
+# Módulos
+import os, sys, socket, struct, random, errno, argparse, subprocess
+from collections import deque
+from timeit import default_timer
+import pygame
+from pygame.locals import *
+import motor
+from pong_escenas import SceneGame, Director
+from audio import sonido
+import repeticion
+# Constantes
+PUERTO = 5005
+# Entradas anteriores que se repiten en cada paquete por si se pierde alguno
+REDUNDANCIA = 4
+# Snapshots que se guardan para hacer deltas
+HISTORIAL = 256
+# Entradas que se dejan esperar en el servidor antes de saltarselas
+MAX_COLA = 3
+# Cliente -> servidor: seq de la entrada, ultimo snapshot recibido, mascaras
+ENTRADA = struct.Struct('<HHB')
+# Servidor -> cliente: seq, seq - base (0 = completo), ultima entrada aplicada, campos cambiados
+SNAPSHOT = struct.Struct('<HBHB')
+NINGUNO = 0xFFFF
+# Campos del snapshot: posiciones en cuartos de pixel y cuenta atras en cs
+CAMPOS = ('bola_x', 'bola_y', 'pala_jug', 'pala_cpu', 'puntos_jug', 'puntos_cpu', 'cuenta')
+# Bits de la mascara de acciones (los mismos que repeticion.ACCIONES)
+ARRIBA = 1
+ABAJO = 2
+
+# Clases
+# ---------------------------------------------------------------------
+class Enlace:
+	"""Socket UDP no bloqueante.
+
+	Con latencia (ms) los paquetes se guardan y se mandan cuando toca; con
+	perdida (0-1) se tiran al azar. Cuenta los bytes y paquetes enviados
+	(los tirados tambien, son lo que se habria mandado)."""
+
+	def __init__(self, puerto=0, latencia=0, perdida=0.0, semilla=None):
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.bind(('', puerto))
+		self.socket.setblocking(0)
+		self.latencia = latencia / 1000.0
+		self.perdida = perdida
+		self.random = random.Random(semilla)
+		# (cuando, datos, direccion)
+		self.cola = deque()
+		self.bytes = 0
+		self.paquetes = 0
+		self.inicio = default_timer()
+
+	def enviar(self, datos, direccion):
+		self.bytes += len(datos)
+		self.paquetes += 1
+		if self.perdida and self.random.random() < self.perdida:
+			return
+		self.cola.append((default_timer() + self.latencia, datos, direccion))
+		self.bombear()
+
+	def bombear(self):
+		ahora = default_timer()
+		while self.cola and self.cola[0][0] <= ahora:
+			cuando, datos, direccion = self.cola.popleft()
+			try:
+				self.socket.sendto(datos, direccion)
+			except socket.error:
+				pass
+
+	def recibir(self):
+		self.bombear()
+		paquetes = []
+		while True:
+			try:
+				paquetes.append(self.socket.recvfrom(2048))
+			except socket.error, e:
+				# Si el otro lado no esta escuchando todavia llega ECONNREFUSED
+				if e.args[0] == errno.ECONNREFUSED:
+					continue
+				break
+		return paquetes
+
+	def bytes_segundo(self):
+		tiempo = default_timer() - self.inicio
+		return self.bytes / tiempo if tiempo > 0 else 0.0
+
+	def cerrar(self):
+		self.socket.close()
+
+class Anfitrion:
+	"""Lado del servidor del protocolo.
+
+	recibir() lee las entradas del cliente (y aprende su direccion),
+	siguiente_entrada() da la mascara que toca aplicar en este paso y
+	enviar() manda el snapshot de este paso comprimido contra el ultimo
+	que el cliente ha confirmado."""
+
+	def __init__(self, enlace):
+		self.enlace = enlace
+		self.cliente = None
+		self.seq = 0
+		# seq -> campos de los snapshots enviados
+		self.historial = {}
+		self.ack = None
+		self.entradas = deque()
+		self.ultima = None
+		self.aplicada = 0
+		self.mascara = 0
+
+	def recibir(self):
+		for datos, direccion in self.enlace.recibir():
+			if len(datos) < ENTRADA.size:
+				continue
+			seq, ack, n = ENTRADA.unpack_from(datos)
+			self.cliente = direccion
+			if ack != NINGUNO and ack in self.historial and (
+					self.ack is None or posterior(ack, self.ack)):
+				self.ack = ack
+			mascaras = bytearray(datos[ENTRADA.size:ENTRADA.size + n])
+			for k, mascara in enumerate(mascaras):
+				s = (seq - len(mascaras) + 1 + k) & 0xFFFF
+				if self.ultima is None or posterior(s, self.ultima):
+					self.entradas.append((s, mascara))
+					self.ultima = s
+
+	def siguiente_entrada(self):
+		''' La siguiente entrada que llego; si no hay, se repite la ultima '''
+		while len(self.entradas) > MAX_COLA:
+			self.entradas.popleft()
+		if self.entradas:
+			self.aplicada, self.mascara = self.entradas.popleft()
+		return self.mascara
+
+	def enviar(self, campos):
+		if self.cliente is None:
+			return
+		self.seq = (self.seq + 1) & 0xFFFF
+		self.historial[self.seq] = campos
+		self.historial.pop((self.seq - HISTORIAL) & 0xFFFF, None)
+		base = None
+		dif = 0
+		if self.ack is not None:
+			dif = (self.seq - self.ack) & 0xFFFF
+			base = self.historial.get(self.ack)
+		if base is None or not 0 < dif < HISTORIAL:
+			dif = 0
+			base = [0] * len(CAMPOS)
+		cambiados = 0
+		cuerpo = bytearray()
+		for i, valor in enumerate(campos):
+			if valor != base[i]:
+				cambiados |= 1 << i
+				escribir_varint(cuerpo, zigzag(valor - base[i]))
+		datos = SNAPSHOT.pack(self.seq, dif, self.aplicada, cambiados) + str(cuerpo)
+		self.enlace.enviar(datos, self.cliente)
+
+class Invitado:
+	"""Lado del cliente del protocolo.
+
+	enviar() manda la mascara de este paso junto con las REDUNDANCIA
+	anteriores y devuelve su seq. recibir() reconstruye los snapshots
+	que llegan y deja el mas nuevo en self.campos, con la ultima entrada
+	que el servidor ha aplicado en self.aplicada."""
+
+	def __init__(self, enlace, servidor):
+		self.enlace = enlace
+		# Con la ip, para reconocerla en lo que llega (host puede ser un nombre)
+		self.servidor = (socket.gethostbyname(servidor[0]), servidor[1])
+		self.seq = 0
+		self.mascaras = deque(maxlen=REDUNDANCIA)
+		# seq -> campos de los snapshots recibidos
+		self.snapshots = {}
+		self.ultimo = None
+		self.campos = None
+		self.aplicada = 0
+
+	def enviar(self, mascara):
+		self.seq = (self.seq + 1) & 0xFFFF
+		self.mascaras.append(mascara)
+		ack = NINGUNO if self.ultimo is None else self.ultimo
+		datos = ENTRADA.pack(self.seq, ack, len(self.mascaras)) + str(bytearray(self.mascaras))
+		self.enlace.enviar(datos, self.servidor)
+		return self.seq
+
+	def recibir(self):
+		''' Devuelve True si ha llegado algun snapshot nuevo '''
+		nuevo = False
+		for datos, direccion in self.enlace.recibir():
+			# Solo manda el servidor
+			if direccion != self.servidor or len(datos) < SNAPSHOT.size:
+				continue
+			seq, dif, aplicada, cambiados = SNAPSHOT.unpack_from(datos)
+			if self.ultimo is not None and not posterior(seq, self.ultimo):
+				continue
+			if dif:
+				base = self.snapshots.get((seq - dif) & 0xFFFF)
+				if base is None:
+					continue
+			else:
+				base = [0] * len(CAMPOS)
+			campos = list(base)
+			i = SNAPSHOT.size
+			try:
+				for campo in xrange(len(CAMPOS)):
+					if cambiados & (1 << campo):
+						valor, i = leer_varint(datos, i)
+						campos[campo] = base[campo] + unzigzag(valor)
+			except ValueError:
+				# Cortado o estropeado por el camino
+				continue
+			self.snapshots[seq] = campos
+			for viejo in [s for s in self.snapshots if (seq - s) & 0xFFFF >= HISTORIAL]:
+				del self.snapshots[viejo]
+			self.ultimo = seq
+			self.campos = campos
+			self.aplicada = aplicada
+			nuevo = True
+		return nuevo
+
+class SceneServidor(SceneGame):
+	"""SceneGame con la pala derecha en manos de un jugador remoto.
+
+	No empieza hasta que llega el primer paquete del cliente."""
+
+	def __init__(self, director, enlace, bot=False, frames=0):
+		SceneGame.__init__(self, director)
+		# En red no se rebobina: el estado lo lleva el servidor
+		self.historial = None
+		self.partida.ia_cpu = motor.quieto
+		self.partida.pala_cpu.speed = self.partida.pala_jug.speed
+		self.red = Anfitrion(enlace)
+		self.bot = bot
+		self.frames = frames
+		self.pasos = 0
+
+	def on_update(self, time):
+		self.red.recibir()
+		if self.red.cliente is None:
+			return
+		self.pala_cpu.guardar()
+		SceneGame.on_update(self, time)
+		mascara = self.red.siguiente_entrada()
+		motor.mover_pala(self.partida.pala_cpu, time, mascara & ARRIBA, mascara & ABAJO)
+		if self.bot:
+			motor.ia(self.partida.pala_jug, time, self.partida.bola)
+		self.pala_jug.sincronizar()
+		self.pala_cpu.sincronizar()
+		self.red.enviar(campos(self))
+		self.pasos += 1
+		if self.frames and self.pasos >= self.frames:
+			self.director.quit()
+
+class SceneCliente(SceneGame):
+	"""Lo que ve el cliente: el estado llega del servidor y solo su pala
+	(la derecha) se mueve al momento.
+
+	Las entradas que el servidor aun no ha aplicado se guardan; al llegar
+	un snapshot la pala se pone donde dice el servidor y se vuelven a
+	aplicar esas entradas encima."""
+
+	def __init__(self, director, enlace, servidor, bot=False, frames=0):
+		SceneGame.__init__(self, director)
+		self.historial = None
+		self.partida.pala_cpu.speed = self.partida.pala_jug.speed
+		self.red = Invitado(enlace, servidor)
+		self.pendientes = deque()
+		self.bot = bot
+		self.frames = frames
+		self.pasos = 0
+
+	def mascara(self):
+		pala = self.partida.pala_cpu
+		if self.bot:
+			return (ARRIBA if pala.y > self.partida.bola.y + 4 else
+				ABAJO if pala.y < self.partida.bola.y - 4 else 0)
+		return repeticion.mascara(self.teclado())
+
+	def on_update(self, time):
+		self.bola.guardar()
+		self.pala_jug.guardar()
+		self.pala_cpu.guardar()
+		pala = self.partida.pala_cpu
+
+		# Prediccion: la pala propia se mueve ya
+		mascara = self.mascara()
+		seq = self.red.enviar(mascara)
+		self.pendientes.append((seq, mascara, time))
+		motor.mover_pala(pala, time, mascara & ARRIBA, mascara & ABAJO)
+
+		if self.red.recibir():
+			c = self.red.campos
+			bola = self.partida.bola
+			bola.x = c[0] / 4.0
+			bola.y = c[1] / 4.0
+			self.partida.pala_jug.y = c[2] / 4.0
+			self.puntos[0] = c[4]
+			self.puntos[1] = c[5]
+			self.count = c[6] / 100.0
+			# Correccion: lo que dice el servidor mas lo que no ha visto aun
+			pala.y = c[3] / 4.0
+			while self.pendientes and not posterior(self.pendientes[0][0], self.red.aplicada):
+				self.pendientes.popleft()
+			for s, m, t in self.pendientes:
+				motor.mover_pala(pala, t, m & ARRIBA, m & ABAJO)
+
+		if self.count > 0:
+			self.actualizar_cuenta()
+		self.bola.sincronizar()
+		self.pala_jug.sincronizar()
+		self.pala_cpu.sincronizar()
+		self.actualizar_marcador()
+		self.pasos += 1
+		if self.frames and self.pasos >= self.frames:
+			self.director.quit()
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def posterior(a, b):
+	''' a es un seq mas nuevo que b (contando con que dan la vuelta) '''
+	return a != b and ((a - b) & 0xFFFF) < 0x8000
+
+def zigzag(n):
+	return n * 2 if n >= 0 else -n * 2 - 1
+
+def unzigzag(n):
+	return n // 2 if n % 2 == 0 else -(n + 1) // 2
+
+def escribir_varint(salida, n):
+	while n >= 0x80:
+		salida.append((n & 0x7F) | 0x80)
+		n >>= 7
+	salida.append(n)
+
+def leer_varint(datos, i):
+	''' (valor, posicion siguiente); ValueError si datos se acaba antes '''
+	n = 0
+	desplazamiento = 0
+	while True:
+		if i >= len(datos):
+			raise ValueError("varint cortado en %d" % i)
+		byte = ord(datos[i])
+		i += 1
+		n |= (byte & 0x7F) << desplazamiento
+		if byte < 0x80:
+			return n, i
+		desplazamiento += 7
+
+def campos(escena):
+	''' Estado de la partida como enteros para el snapshot '''
+	p = escena.partida
+	return [int(round(p.bola.x * 4)), int(round(p.bola.y * 4)),
+		int(round(p.pala_jug.y * 4)), int(round(p.pala_cpu.y * 4)),
+		p.puntos[0], p.puntos[1], int(round(escena.count * 100))]
+
+def prueba(args):
+	''' Lanza servidor y cliente en local sin pantalla y enseña sus numeros '''
+	entorno = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy')
+	comun = ['--puerto', str(args.puerto), '--frames', str(args.frames), '--bot', '--sin-musica',
+		'--latencia', str(args.latencia), '--perdida', str(args.perdida)]
+	servidor = subprocess.Popen([sys.executable, __file__, 'servidor'] + comun,
+		env=entorno, stdout=subprocess.PIPE)
+	cliente = subprocess.Popen([sys.executable, __file__, 'cliente', '127.0.0.1'] + comun,
+		env=entorno, stdout=subprocess.PIPE)
+	for nombre, proceso in (('cliente', cliente), ('servidor', servidor)):
+		salida = proceso.communicate()[0]
+		print(salida.strip().splitlines()[-1] if salida.strip() else '%s: sin salida' % nombre)
+	return servidor.returncode or cliente.returncode
+
+def main():
+	parser = argparse.ArgumentParser(description="Not Pong por red")
+	parser.add_argument('modo', choices=['servidor', 'cliente', 'prueba'])
+	parser.add_argument('host', nargs='?', default='127.0.0.1')
+	parser.add_argument('--puerto', type=int, default=PUERTO)
+	parser.add_argument('--latencia', type=float, default=0, help="ms en cada sentido")
+	parser.add_argument('--perdida', type=float, default=0.0, help="paquetes perdidos (0-1)")
+	parser.add_argument('--frames', type=int, default=0, help="salir tras N pasos")
+	parser.add_argument('--bot', action='store_true', help="la pala la mueve la ia")
+	parser.add_argument('--sin-musica', action='store_true', help="sin musica ni efectos")
+	args = parser.parse_args()
+	if args.modo == 'prueba':
+		if not args.frames:
+			args.frames = 600
+		return prueba(args)
+
+	pygame.init()
+	director = Director()
+	if not args.sin_musica:
+		sonido.iniciar()
+	if args.modo == 'servidor':
+		enlace = Enlace(args.puerto, args.latencia, args.perdida)
+		escena = SceneServidor(director, enlace, args.bot, args.frames)
+	else:
+		enlace = Enlace(0, args.latencia, args.perdida)
+		escena = SceneCliente(director, enlace, (args.host, args.puerto), args.bot, args.frames)
+	director.change_scene(escena)
+	director.loop()
+	print("%s: %d paquetes, %.0f bytes/s (%.1f bytes/paquete), puntos %s" % (args.modo,
+		enlace.paquetes, enlace.bytes_segundo(),
+		float(enlace.bytes) / enlace.paquetes if enlace.paquetes else 0.0, escena.puntos))
+	enlace.cerrar()
+	return 0
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+# Módulos
+import pygame
+from operator import itemgetter
+from itertools import izip, repeat
+# Constantes
+# Capas de ColaRender, de abajo a arriba
+FONDO = 0
+JUEGO = 10
+HUD = 20
+
+# Clases
+# ---------------------------------------------------------------------
+class RenderSucio:
+	"""Pinta una escena actualizando solo los rectangulos que cambian.
+
+	Recibe cada frame la lista de elementos a pintar como tuplas
+	(clave, superficie, rect) y la compara con la del frame anterior.
+	Solo se restaura el fondo donde estaba un elemento que se ha movido
+	o ha desaparecido, y solo se repintan los elementos que tocan esas
+	zonas. dibujar() devuelve los rectangulos que hay que pasar a
+	pygame.display.update().
+
+	El primer frame (o despues de invalidar()) se pinta entero."""
+
+	def __init__(self, fondo):
+		self.fondo = fondo
+		# clave -> (superficie, rect) del frame anterior
+		self.anteriores = {}
+		self.completo = True
+
+	def invalidar(self):
+		"Fuerza a repintar toda la pantalla en el siguiente frame."
+		self.completo = True
+
+	def dibujar(self, screen, elementos):
+		actuales = {}
+		for clave, image, rect in elementos:
+			actuales[clave] = (image, pygame.Rect(rect))
+
+		if self.completo:
+			self.completo = False
+			screen.blit(self.fondo, (0, 0))
+			for clave, image, rect in elementos:
+				screen.blit(image, rect)
+			self.anteriores = actuales
+			return [screen.get_rect()]
+
+		# Zonas que han cambiado: donde estaba y donde esta cada elemento
+		sucios = []
+		for clave, (image, rect) in self.anteriores.items():
+			actual = actuales.get(clave)
+			if actual is None:
+				sucios.append(rect)
+			elif actual[0] is not image or actual[1] != rect:
+				if rect.colliderect(actual[1]):
+					sucios.append(rect.union(actual[1]))
+				else:
+					sucios.append(rect)
+					sucios.append(actual[1])
+		for clave, (image, rect) in actuales.items():
+			if clave not in self.anteriores:
+				sucios.append(rect)
+		self.anteriores = actuales
+		if not sucios:
+			return []
+
+		# Se restaura el fondo y se repinta en orden lo que lo toca, sin
+		# salir de cada zona: un texto con alpha pintado dos veces sobre
+		# si mismo no queda igual
+		for sucio in sucios:
+			screen.set_clip(sucio)
+			screen.blit(self.fondo, sucio, sucio)
+			for clave, image, rect in elementos:
+				if actuales[clave][1].colliderect(sucio):
+					screen.blit(image, rect)
+		screen.set_clip(None)
+		return sucios
+
+class ColaRender:
+	"""Cola de lo que se pinta en un frame.
+
+	Durante on_draw se apunta cada imagen con pintar(image, pos, capa)
+	(o muchas copias de una con pintar_muchas) y al final ejecutar(screen)
+	lo ordena por capa (a igual capa, en el orden en que se apunto) y lo
+	pinta con una sola llamada a Surface.blits. Antes se quita lo que
+	cae fuera de la pantalla y lo que queda tapado del todo por algo
+	opaco (sin alpha ni colorkey) que va encima.
+
+	Tras ejecutar() quedan en el objeto los contadores del frame:
+	comandos (imagenes apuntadas), llamadas (las que se han pintado),
+	fuera, tapados y pixeles (los que se han copiado, recortados a la
+	pantalla)."""
+
+	def __init__(self, tam):
+		self.tam = tam
+		# (capa, image, posiciones) en el orden en que se apuntan
+		self.cola = []
+		self.comandos = 0
+		self.llamadas = 0
+		self.fuera = 0
+		self.tapados = 0
+		self.pixeles = 0
+
+	def pintar(self, image, pos, capa=JUEGO):
+		"pos: donde va la esquina de arriba a la izquierda (un Rect vale)."
+		self.cola.append((capa, image, (pos,)))
+
+	def pintar_muchas(self, image, posiciones, capa=JUEGO):
+		''' Como pintar() con una lista de pos, pintadas en ese orden '''
+		self.cola.append((capa, image, posiciones))
+
+	def ejecutar(self, screen):
+		"Pinta lo apuntado en screen y vacia la cola."
+		cola = self.cola
+		cola.sort(key=itemgetter(0))
+		ancho_p, alto_p = self.tam
+		# Se recorre de arriba a abajo: opacos son los (x0, y0, x1, y1)
+		# ya vistos de lo que tapa
+		opacos = []
+		# id(image) -> (ancho, alto, opaca), para mirarlo una vez por imagen
+		imagenes = {}
+		# (image, pos) de lo que se pinta, de arriba a abajo
+		lista = []
+		comandos = llamadas = fuera = tapados = pixeles = 0
+		for capa, image, posiciones in reversed(cola):
+			datos = imagenes.get(id(image))
+			if datos is None:
+				ancho, alto = image.get_size()
+				datos = imagenes[id(image)] = (ancho, alto, es_opaca(image))
+			ancho, alto, opaca = datos
+			comandos += len(posiciones)
+			# Solo puede tapar la imagen un opaco al menos igual de grande
+			tapan = [o for o in opacos if o[2] - o[0] >= ancho and o[3] - o[1] >= alto] if opacos else []
+			if len(posiciones) > 1 and not tapan and not opaca and dentro(posiciones, ancho, alto, self.tam):
+				# Muchas copias que caben enteras y que no tapa nada
+				# (ni se tapan entre ellas): sin mirar una a una
+				llamadas += len(posiciones)
+				pixeles += len(posiciones) * ancho * alto
+				lista.extend(izip(repeat(image), reversed(posiciones)))
+				continue
+			# Las que caben enteras se cuentan al final (pixeles += enteras * ancho * alto)
+			enteras = 0
+			for pos in reversed(posiciones):
+				x0 = pos[0]
+				y0 = pos[1]
+				x1 = x0 + ancho
+				y1 = y0 + alto
+				entera = 0 <= x0 and x1 <= ancho_p and 0 <= y0 and y1 <= alto_p
+				if not entera:
+					if x0 >= ancho_p or y0 >= alto_p or x1 <= 0 or y1 <= 0:
+						fuera += 1
+						continue
+					x0 = max(x0, 0)
+					y0 = max(y0, 0)
+					x1 = min(x1, ancho_p)
+					y1 = min(y1, alto_p)
+				for ox0, oy0, ox1, oy1 in tapan:
+					if ox0 <= x0 and oy0 <= y0 and x1 <= ox1 and y1 <= oy1:
+						tapados += 1
+						break
+				else:
+					lista.append((image, pos))
+					llamadas += 1
+					if entera:
+						enteras += 1
+					else:
+						pixeles += (x1 - x0) * (y1 - y0)
+					if opaca:
+						opacos.append((x0, y0, x1, y1))
+						if x1 - x0 >= ancho and y1 - y0 >= alto:
+							tapan.append((x0, y0, x1, y1))
+			pixeles += enteras * ancho * alto
+		lista.reverse()
+		blits(screen, lista)
+		self.comandos = comandos
+		self.llamadas = llamadas
+		self.fuera = fuera
+		self.tapados = tapados
+		self.pixeles = pixeles
+		del cola[:]
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def es_opaca(image):
+	''' Si image tapa del todo lo que hay debajo (sin alpha por pixel, alpha ni colorkey) '''
+	if image.get_flags() & pygame.SRCALPHA or image.get_colorkey() is not None:
+		return False
+	return image.get_alpha() in (None, 255)
+
+def dentro(posiciones, ancho, alto, tam):
+	''' Si caben enteras en tam todas las imagenes de ancho x alto en posiciones '''
+	xs = map(itemgetter(0), posiciones)
+	ys = map(itemgetter(1), posiciones)
+	return (min(xs) >= 0 and max(xs) + ancho <= tam[0]
+		and min(ys) >= 0 and max(ys) + alto <= tam[1])
+
+def blits(screen, lista):
+	''' screen.blits(lista) sin pedir los rects (pygame < 1.9.4 no lo tiene: un blit cada vez) '''
+	if hasattr(screen, 'blits'):
+		screen.blits(lista, False)
+	else:
+		for image, pos in lista:
+			screen.blit(image, pos)
+
+# ---------------------------------------------------------------------
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+''' Grabacion de partidas de SceneGame y repeticion exacta.
+
+	python repeticion.py partida.rep                (lo mas rapido posible)
+	python repeticion.py partida.rep --tiempo-real  (con pantalla)
+	python repeticion.py partida.rep --video partida.y4m [--fps 60]
+	                                                (a video, sin pantalla)
+
+Se graba la secuencia de llamadas que recibe la escena: cada on_update
+con las acciones pulsadas en ese paso y el final de cada frame con lo
+que duro. Con la semilla de los saques y la configuracion eso basta para
+repetir la partida exactamente. '''
+
+# Módulos
+import os, sys, json, struct, zlib
+import pygame
+from entrada import Estado, ARRIBA, ABAJO, NINGUNA
+# Constantes
+MAGIA = 'NPRP'
+# 2: la entrada va en cada UPDATE (en la 1 iba en eventos sueltos)
+VERSION = 2
+# Operaciones del registro
+UPDATE = 0
+FRAME = 2
+# Bits de la mascara de acciones
+ACCIONES = [(ARRIBA, 1), (ABAJO, 2)]
+
+# Clases
+# ---------------------------------------------------------------------
+class Grabadora:
+	"""Guarda lo que recibe una SceneGame para poder repetirlo.
+
+	La escena llama a update() y frame() y al final se escribe
+	todo con guardar(). Las operaciones iguales seguidas se guardan una
+	vez con su numero de repeticiones y el resultado se comprime."""
+
+	def __init__(self, fichero, config):
+		self.fichero = fichero
+		self.config = config
+		self.ops = []
+
+	def anotar(self, op):
+		ops = self.ops
+		if ops and ops[-1][0] == op:
+			ops[-1][1] += 1
+		else:
+			ops.append([op, 1])
+
+	def update(self, estado):
+		self.anotar((UPDATE, 0, mascara(estado)))
+
+	def frame(self, time):
+		self.anotar((FRAME, int(time), 0))
+
+	def guardar(self, final=None):
+		config = dict(self.config)
+		config['final'] = final
+		escribir(self.fichero, config, self.ops)
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def mascara(estado):
+	''' Acciones pulsadas de un entrada.Estado como bits '''
+	resultado = 0
+	for accion, bit in ACCIONES:
+		if estado.pulsada(accion):
+			resultado |= bit
+	return resultado
+
+def estado(mascara):
+	''' entrada.Estado con las acciones pulsadas de la mascara '''
+	return Estado(frozenset(accion for accion, bit in ACCIONES if mascara & bit),
+		NINGUNA, False)
+
+def escribir(fichero, config, ops):
+	''' Cabecera (MAGIA, VERSION, json) y operaciones comprimidas '''
+	cuerpo = ''.join(struct.pack('<BHBI', op[0], op[1], op[2], n) for op, n in ops)
+	cabecera = json.dumps(config)
+	with open(fichero, 'wb') as salida:
+		salida.write(MAGIA + struct.pack('<BI', VERSION, len(cabecera)))
+		salida.write(cabecera)
+		salida.write(zlib.compress(cuerpo, 9))
+
+def leer(fichero):
+	''' Devuelve (config, [((op, tiempo, mascara), repeticiones), ...]) '''
+	with open(fichero, 'rb') as entrada:
+		datos = entrada.read()
+	if datos[:4] != MAGIA:
+		raise ValueError("%s no es una repeticion" % fichero)
+	version, largo = struct.unpack_from('<BI', datos, 4)
+	if version != VERSION:
+		raise ValueError("Version de repeticion desconocida: %d" % version)
+	inicio = 4 + struct.calcsize('<BI')
+	config = json.loads(datos[inicio:inicio + largo])
+	cuerpo = zlib.decompress(datos[inicio + largo:])
+	tam = struct.calcsize('<BHBI')
+	ops = []
+	for i in xrange(0, len(cuerpo), tam):
+		op, tiempo, mascara, n = struct.unpack_from('<BHBI', cuerpo, i)
+		ops.append(((op, tiempo, mascara), n))
+	return config, ops
+
+def estado_final(escena):
+	''' Lo que se compara al acabar una repeticion '''
+	bola = escena.partida.bola
+	return {
+		'puntos': list(escena.puntos),
+		'bola': [bola.x, bola.y, bola.speed[0], bola.speed[1]],
+		'palas': [escena.partida.pala_jug.y, escena.partida.pala_cpu.y],
+	}
+
+def reproducir(fichero, director, tiempo_real=False, captura=None):
+	"""Repite una partida grabada y devuelve (estado final, grabado).
+
+	Sin tiempo_real se llama a la escena lo mas rapido posible y no se
+	pinta nada. Con tiempo_real se pinta cada frame en director.screen y
+	se espera lo que duro el frame original. Con captura (una
+	captura.Captura) se pinta cada frame al que le toca algun frame del
+	video y se captura."""
+	import pong_escenas
+	config, ops = leer(fichero)
+	anteriores = {}
+	for nombre in ('WIDTH', 'HEIGHT', 'PHYSICS_HZ', 'COLISION', 'IA_CPU', 'MUSIC', 'GRABAR'):
+		anteriores[nombre] = getattr(pong_escenas, nombre)
+	try:
+		pong_escenas.WIDTH, pong_escenas.HEIGHT = config['resolucion']
+		pong_escenas.PHYSICS_HZ = config['physics_hz']
+		pong_escenas.COLISION = config['colision']
+		pong_escenas.IA_CPU = tuple(config['ia_cpu'])
+		pong_escenas.MUSIC = 0
+		pong_escenas.GRABAR = None
+		escena = pong_escenas.SceneGame(director, config['semilla'])
+	finally:
+		for nombre, valor in anteriores.items():
+			setattr(pong_escenas, nombre, valor)
+
+	actual = [estado(0)]
+	escena.teclado = lambda: actual[0]
+	paso = 1000.0 / config['physics_hz']
+	director.change_scene(escena)
+	inicio = pygame.time.get_ticks()
+	for (op, tiempo, mascara), n in ops:
+		for i in xrange(n):
+			if op == UPDATE:
+				actual[0] = estado(mascara)
+				escena.on_update(paso)
+			elif captura is not None and not tiempo_real:
+				veces = captura.avanzar(tiempo)
+				if veces:
+					escena.on_draw(director.screen)
+					captura.capturar(director.screen, veces)
+			elif tiempo_real:
+				pygame.event.pump()
+				director.presentar(escena.on_draw(director.screen))
+				if captura is not None:
+					captura.capturar(director.screen, captura.avanzar(tiempo))
+				inicio += tiempo
+				espera = inicio - pygame.time.get_ticks()
+				if espera > 0:
+					pygame.time.delay(espera)
+	return estado_final(escena), config.get('final')
+
+def opcion(nombre):
+	''' El valor que sigue a nombre en la linea de comandos (None si no esta) '''
+	if nombre in sys.argv[:-1]:
+		return sys.argv[sys.argv.index(nombre) + 1]
+	return None
+
+def main():
+	if len(sys.argv) < 2:
+		print("Uso: python repeticion.py partida.rep [--tiempo-real] [--video salida [--fps n]]")
+		return 2
+	tiempo_real = '--tiempo-real' in sys.argv
+	video = opcion('--video')
+	fps = int(opcion('--fps') or 60)
+	if not tiempo_real:
+		os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+	os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+	pygame.init()
+	import pong_escenas
+	director = pong_escenas.Director()
+	captura = None
+	if video:
+		# Sin pantalla no hay prisa: mejor esperar al hilo que perder frames
+		from captura import Captura
+		captura = Captura(video, director.screen.get_size(), fps,
+			presion='juntar' if tiempo_real else 'esperar', plantilla=director.screen)
+	inicio = pygame.time.get_ticks()
+	try:
+		final, grabado = reproducir(sys.argv[1], director, tiempo_real, captura)
+	finally:
+		if captura is not None:
+			captura.cerrar()
+	print("Resultado %s en %d ms" % (final['puntos'], pygame.time.get_ticks() - inicio))
+	if grabado is not None and final != grabado:
+		print("La repeticion NO coincide con la partida grabada: %r != %r" % (final, grabado))
+		return 1
+	return 0
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+''' Ritmo de los frames: cuanto esperar y que dejar de hacer si no da tiempo '''
+
+# Módulos
+import sys, time
+from collections import deque
+from timeit import default_timer as reloj
+import pygame
+# Constantes
+# Como se espera al siguiente frame:
+# 'tick'    pygame.time.Clock.tick (duerme, con la precision del sistema)
+# 'busy'    pygame.time.Clock.tick_busy_loop (no duerme: exacto pero gasta cpu)
+# 'hibrido' duerme hasta MARGEN ms antes del plazo y el resto espera activo
+ESPERAS = ('tick', 'busy', 'hibrido')
+MARGEN = 2.0
+# fps si no se sabe la frecuencia de la pantalla
+POR_DEFECTO = 60
+# Niveles de carga, de menos a mas trabajo quitado
+NORMAL = 0
+SIN_EFECTOS = 1
+SIN_ESCALAR = 2
+SALTAR = 3
+NIVELES = ('normal', 'sin efectos', 'sin escalar', 'pintar 1 de 2', 'pintar 1 de 3')
+# Frames que se miran para quitar trabajo y fraccion de ellos que tiene
+# que pasarse del presupuesto (1000/fps ms)
+VENTANA_SUBIR = 30
+SUBIR = 0.5
+# Frames que se miran para devolverlo: el percentil PERCENTIL de los que
+# se han pintado tiene que usar menos de BAJAR del presupuesto
+VENTANA_BAJAR = 180
+BAJAR = 0.6
+PERCENTIL = 90
+# Decisiones que se guardan en Ritmo.decisiones
+HISTORIA = 100
+
+# Clases
+# ---------------------------------------------------------------------
+class Ritmo:
+	"""Marca el ritmo de los frames del Director y, si no da tiempo,
+	decide que trabajo se deja de hacer.
+
+	El Director llama a esperar() al principio de cada frame, que espera
+	hasta el plazo del siguiente frame (cada 1000/objetivo ms desde el
+	anterior, sin acumular retraso) y devuelve los ms que han pasado.
+	Lo que va desde que acaba una espera hasta que empieza la siguiente
+	es el trabajo del frame, y se compara con el presupuesto.
+
+	Con adaptar, si en los ultimos VENTANA_SUBIR frames mas de la mitad
+	se pasan del presupuesto se sube de nivel (ver NIVELES): primero se
+	quitan los efectos (sonidos y overlay), luego el escalado de la
+	ventana (si la hay) y luego se pinta uno de cada 2 o 3 frames. La
+	simulacion sigue dando todos sus pasos. Si los frames pintados van
+	sobrados durante VENTANA_BAJAR frames se baja un nivel. Cada cambio
+	se escribe por stderr (y en log si se da) con el motivo.
+
+	objetivo 0 es sin limite: no se espera ni se adapta nada."""
+
+	def __init__(self, objetivo=POR_DEFECTO, espera='hibrido', adaptar=True, log=None):
+		if espera not in ESPERAS:
+			raise ValueError("Espera desconocida: %r" % (espera,))
+		self.objetivo = objetivo
+		self.espera = espera
+		self.adaptar = adaptar and objetivo > 0
+		self.presupuesto = 1000.0 / objetivo if objetivo else None
+		self.clock = pygame.time.Clock()
+		self.nivel = NORMAL
+		# Si el Director escala la ventana (si no, SIN_ESCALAR no quita nada)
+		self.escalado = False
+		self.frames = 0
+		self.plazo = None
+		self.anterior = None
+		self.fin_espera = None
+		self.pintado = True
+		# (ms de trabajo, si se pinto) de los ultimos frames
+		self.trabajos = deque(maxlen=VENTANA_BAJAR)
+		self.lentos = 0
+		self.desde = 0
+		self.decisiones = deque(maxlen=HISTORIA)
+		self.log = open(log, 'a') if log else None
+		self.anotar_decision("%s fps, espera %s%s" % (objetivo or "sin limite", espera,
+			", adaptando" if self.adaptar else ""))
+
+	def esperar(self):
+		"Espera al siguiente frame. Devuelve los ms desde el anterior."
+		ahora = reloj()
+		if self.fin_espera is not None:
+			self.anotar((ahora - self.fin_espera) * 1000.0)
+		if self.espera == 'tick':
+			self.clock.tick(self.objetivo)
+		elif self.espera == 'busy':
+			self.clock.tick_busy_loop(self.objetivo)
+		elif self.presupuesto is not None and self.plazo is not None:
+			esperar_hasta(self.plazo)
+		fin = reloj()
+		if self.presupuesto is not None:
+			periodo = self.presupuesto / 1000.0
+			# La espera siempre acaba un poco despues del plazo: eso no es
+			# llegar tarde y el plazo sigue avanzando un periodo. Si se va
+			# mas de un frame tarde no se intenta recuperar: el siguiente
+			# tiene su periodo entero desde ahora
+			if self.plazo is None or fin > self.plazo + periodo:
+				self.plazo = fin + periodo
+			else:
+				self.plazo += periodo
+		ms = (fin - self.anterior) * 1000.0 if self.anterior is not None else 0.0
+		self.anterior = fin
+		self.fin_espera = fin
+		self.frames += 1
+		return ms
+
+	def pintar(self):
+		"Si en este frame se pinta (en los niveles de SALTAR se pinta 1 de cada n)."
+		if self.nivel < SALTAR:
+			self.pintado = True
+		else:
+			self.pintado = self.frames % (self.nivel - SALTAR + 2) == 0
+		return self.pintado
+
+	def anotar(self, trabajo):
+		trabajos = self.trabajos
+		presupuesto = self.presupuesto
+		if presupuesto is None:
+			trabajos.append((trabajo, self.pintado))
+			return
+		# lentos: cuantos de los ultimos VENTANA_SUBIR se pasan
+		if len(trabajos) >= VENTANA_SUBIR and trabajos[-VENTANA_SUBIR][0] > presupuesto:
+			self.lentos -= 1
+		trabajos.append((trabajo, self.pintado))
+		if trabajo > presupuesto:
+			self.lentos += 1
+		self.desde += 1
+		if self.adaptar:
+			self.decidir()
+
+	def decidir(self):
+		presupuesto = self.presupuesto
+		if self.desde >= VENTANA_SUBIR and self.lentos > SUBIR * VENTANA_SUBIR:
+			nivel = self.nivel + 1
+			if nivel == SIN_ESCALAR and not self.escalado:
+				nivel += 1
+			if nivel < len(NIVELES):
+				recientes = sorted(t for t, p in list(self.trabajos)[-VENTANA_SUBIR:])
+				self.cambiar(nivel, "%d de %d frames pasan de %.1f ms (mediana %.1f ms)" % (
+					self.lentos, VENTANA_SUBIR, presupuesto, recientes[len(recientes) // 2]))
+				return
+		if self.nivel > NORMAL and self.desde >= VENTANA_BAJAR:
+			pintados = sorted(t for t, p in self.trabajos if p)
+			if pintados:
+				p = pintados[min(len(pintados) * PERCENTIL // 100, len(pintados) - 1)]
+				if p < BAJAR * presupuesto:
+					nivel = self.nivel - 1
+					if nivel == SIN_ESCALAR and not self.escalado:
+						nivel -= 1
+					self.cambiar(nivel, "p%d de los frames pintados %.1f ms < %.1f ms" % (
+						PERCENTIL, p, BAJAR * presupuesto))
+
+	def cambiar(self, nivel, motivo):
+		self.anotar_decision("%s -> %s: %s" % (NIVELES[self.nivel], NIVELES[nivel], motivo))
+		self.nivel = nivel
+		# Lo medido antes del cambio ya no vale para el siguiente
+		self.desde = 0
+
+	def anotar_decision(self, mensaje):
+		linea = "ritmo: frame %d: %s" % (self.frames, mensaje)
+		self.decisiones.append(linea)
+		sys.stderr.write(linea + "\n")
+		if self.log is not None:
+			self.log.write(linea + "\n")
+			self.log.flush()
+
+	def cerrar(self):
+		if self.log is not None:
+			self.log.close()
+			self.log = None
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def esperar_hasta(plazo):
+	''' Duerme hasta MARGEN ms antes de plazo (segundos de reloj()) y espera activo el resto '''
+	resto = plazo - reloj() - MARGEN / 1000.0
+	if resto > 0:
+		time.sleep(resto)
+	while reloj() < plazo:
+		pass
+
+def frecuencia_pantalla():
+	"""Hz de la pantalla, o 0 si no se sabe (pygame solo lo dice desde la
+	2.2, con get_current_refresh_rate)."""
+	leer = getattr(pygame.display, 'get_current_refresh_rate', None)
+	if leer is None:
+		return 0
+	try:
+		return leer() or 0
+	except pygame.error:
+		return 0
+
+# ---------------------------------------------------------------------
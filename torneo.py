@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+''' Torneo entre configuraciones de la IA, sin pantalla y en todos los nucleos.
+
+	python torneo.py                           (liga, 100000 partidas)
+	python torneo.py --formato suizo --rondas 4 --partidas 2000
+	python torneo.py --jugadores jugadores.json -j 8 --json resultado.json
+
+Cada partida es motor.Partida entre dos IAs hasta PUNTOS goles o hasta
+DURACION pasos (gana quien vaya por delante; si van igual es empate).
+Las partidas se juegan a trozos de TROZO con motor_lotes.Lote (todas
+las de un trozo son del mismo cruce) repartidos entre procesos. La
+semilla de cada partida es semilla + su numero, asi que el resultado no
+depende de cuantos procesos haya ni del tamaño de los trozos.
+
+El campo no es simetrico (la porteria derecha esta 15px antes), asi que
+en cada cruce cada jugador juega la mitad de las partidas en cada lado.
+
+jugadores.json es una lista de [nombre, {"ia": "seguir"|"predecir",
+"speed": px/ms, "reaccion": ms, "error": px}]. '''
+
+# Módulos
+import sys, json, math, argparse, multiprocessing
+from timeit import default_timer
+import numpy as np
+import motor, motor_lotes
+from motor import GOLPE
+# Constantes
+PARTIDAS = 100000
+TROZO = 1000
+PUNTOS = 5
+# Pasos de 1000/60 ms que dura como mucho una partida (2 minutos)
+DURACION = 60 * 60 * 2
+SEMILLA = 0
+# Cada cuantos segundos se enseña como va
+PROGRESO = 2.0
+# Las duraciones de los puntos se suman en 1/ESCALA golpes
+ESCALA = 10 ** 6
+# 1.96 -> intervalos de confianza del 95%
+Z = 1.96
+JUGADORES = [
+	('seguir-0.3', {'ia': 'seguir', 'speed': 0.3}),
+	('seguir-0.4', {'ia': 'seguir', 'speed': 0.4}),
+	('seguir-0.5', {'ia': 'seguir', 'speed': 0.5}),
+	('predecir-lento', {'ia': 'predecir', 'speed': 0.4, 'reaccion': 150, 'error': 30}),
+	('predecir', {'ia': 'predecir', 'speed': 0.4, 'reaccion': 50, 'error': 10}),
+]
+
+# Clases
+# ---------------------------------------------------------------------
+class Tabla:
+	"""Resultados agregados, que se van sumando segun llegan los trozos.
+
+	Por jugador: partidas, ganadas, perdidas, empates, y la suma y la
+	suma de cuadrados de la duracion media de los puntos de cada partida
+	(golpes de pala por punto) para su intervalo de confianza. Por
+	cruce: partidas ganadas por cada uno.
+
+	Las duraciones se suman en enteros de 1/ESCALA golpes: la suma no
+	depende del orden en que lleguen los trozos."""
+
+	def __init__(self, nombres):
+		self.nombres = list(nombres)
+		self.jugadores = dict((nombre, {'partidas': 0, 'ganadas': 0, 'perdidas': 0,
+			'empates': 0, 'rally': 0, 'rally2': 0}) for nombre in nombres)
+		# (a, b) -> [partidas, ganadas por a, ganadas por b]
+		self.cruces = {}
+		self.partidas = 0
+
+	def anotar(self, resultado):
+		izquierda, derecha = resultado['izquierda'], resultado['derecha']
+		ganador = resultado['ganador']
+		rally = [int(round(r * ESCALA)) for r in resultado['rally']]
+		for nombre, lado in ((izquierda, 0), (derecha, 1)):
+			j = self.jugadores[nombre]
+			j['partidas'] += len(ganador)
+			j['ganadas'] += sum(1 for g in ganador if g == lado)
+			j['perdidas'] += sum(1 for g in ganador if g == 1 - lado)
+			j['empates'] += sum(1 for g in ganador if g < 0)
+			j['rally'] += sum(rally)
+			j['rally2'] += sum(r * r for r in rally)
+		a, b = sorted((izquierda, derecha))
+		cruce = self.cruces.setdefault((a, b), [0, 0, 0])
+		cruce[0] += len(ganador)
+		lado_a = 0 if a == izquierda else 1
+		cruce[1] += sum(1 for g in ganador if g == lado_a)
+		cruce[2] += sum(1 for g in ganador if g == 1 - lado_a)
+		self.partidas += len(ganador)
+
+	def sumar(self, otra):
+		''' Suma los resultados de otra Tabla con los mismos jugadores '''
+		self.partidas += otra.partidas
+		for nombre, j in otra.jugadores.items():
+			for clave, valor in j.items():
+				self.jugadores[nombre][clave] += valor
+		for clave, c in otra.cruces.items():
+			total = self.cruces.setdefault(clave, [0, 0, 0])
+			for i in range(3):
+				total[i] += c[i]
+
+	def fila(self, nombre):
+		j = self.jugadores[nombre]
+		n = j['partidas']
+		victoria = wilson(j['ganadas'], n)
+		media = float(j['rally']) / ESCALA / n if n else 0.0
+		varianza = max(float(j['rally2']) / ESCALA ** 2 / n - media * media, 0.0) if n else 0.0
+		margen = Z * math.sqrt(varianza / n) if n else 0.0
+		return {
+			'jugador': nombre,
+			'partidas': n,
+			'ganadas': j['ganadas'],
+			'perdidas': j['perdidas'],
+			'empates': j['empates'],
+			'victorias': victoria,
+			'rally': (media, media - margen, media + margen),
+		}
+
+	def clasificacion(self):
+		filas = [self.fila(nombre) for nombre in self.nombres]
+		filas.sort(key=lambda f: (-f['victorias'][0], f['jugador']))
+		return filas
+
+	def imprimir(self, salida=sys.stdout):
+		salida.write("%-16s %8s %8s %8s %8s  %-22s %-22s\n" % ('jugador', 'partidas',
+			'ganadas', 'perdidas', 'empates', 'victorias (IC 95%)', 'golpes/punto (IC 95%)'))
+		for f in self.clasificacion():
+			salida.write("%-16s %8d %8d %8d %8d  %5.1f%% [%5.1f, %5.1f]  %6.2f [%6.2f, %6.2f]\n" % (
+				f['jugador'], f['partidas'], f['ganadas'], f['perdidas'], f['empates'],
+				100 * f['victorias'][0], 100 * f['victorias'][1], 100 * f['victorias'][2],
+				f['rally'][0], f['rally'][1], f['rally'][2]))
+		salida.write("\nCruces (fila gana a columna, % de las partidas):\n")
+		ancho = max(len(nombre) for nombre in self.nombres)
+		salida.write(" " * (ancho + 1) + " ".join("%*s" % (max(len(n), 6), n) for n in self.nombres) + "\n")
+		for a in self.nombres:
+			celdas = []
+			for b in self.nombres:
+				clave = tuple(sorted((a, b)))
+				cruce = self.cruces.get(clave)
+				if a == b or not cruce:
+					celdas.append("%*s" % (max(len(b), 6), '-'))
+					continue
+				ganadas = cruce[1] if a == clave[0] else cruce[2]
+				celdas.append("%*.1f" % (max(len(b), 6), 100.0 * ganadas / cruce[0]))
+			salida.write("%-*s " % (ancho, a) + " ".join(celdas) + "\n")
+
+	def json(self):
+		return {
+			'partidas': self.partidas,
+			'clasificacion': self.clasificacion(),
+			'cruces': [{'a': a, 'b': b, 'partidas': c[0], 'ganadas_a': c[1], 'ganadas_b': c[2]}
+				for (a, b), c in sorted(self.cruces.items())],
+		}
+
+# ---------------------------------------------------------------------
+
+# Funciones
+# ---------------------------------------------------------------------
+def config_partida(izquierda, derecha):
+	''' Configuracion de motor para un cruce: izquierda es la pala "jug" '''
+	config = {'jugador': 'ia'}
+	for lado, jugador in (('jug', izquierda), ('cpu', derecha)):
+		config['ia_' + lado] = jugador['ia']
+		config['speed_' + lado] = jugador['speed']
+		config['reaccion_' + lado] = jugador.get('reaccion', 0)
+		config['error_' + lado] = jugador.get('error', 0)
+	return config
+
+def jugar(trabajo):
+	"""Juega un trozo: (izquierda, config, derecha, config, primera, n,
+	puntos, duracion). Devuelve por partida quien gana (0 izquierda,
+	1 derecha, -1 empate) y cuantos golpes de pala hubo por punto."""
+	izquierda, config_izq, derecha, config_der, primera, n, puntos, duracion = trabajo
+	lote = motor_lotes.Lote(n, config_partida(config_izq, config_der), primera)
+	fin = np.zeros(n, dtype=bool)
+	golpes = np.zeros(n, dtype=np.int64)
+	final_jug = np.zeros(n, dtype=np.int64)
+	final_cpu = np.zeros(n, dtype=np.int64)
+	for paso in xrange(duracion):
+		sucesos = lote.paso()
+		golpes += ((sucesos & GOLPE) != 0) & ~fin
+		acaba = ~fin & ((lote.puntos_jug >= puntos) | (lote.puntos_cpu >= puntos))
+		if acaba.any():
+			final_jug[acaba] = lote.puntos_jug[acaba]
+			final_cpu[acaba] = lote.puntos_cpu[acaba]
+			fin |= acaba
+			if fin.all():
+				break
+	final_jug[~fin] = lote.puntos_jug[~fin]
+	final_cpu[~fin] = lote.puntos_cpu[~fin]
+	ganador = np.where(final_jug > final_cpu, 0, np.where(final_cpu > final_jug, 1, -1))
+	# Los puntos jugados, y el que se estaba jugando si se acabo el tiempo
+	rallies = final_jug + final_cpu + (~fin)
+	return {
+		'izquierda': izquierda,
+		'derecha': derecha,
+		'ganador': ganador.tolist(),
+		'rally': (golpes / np.maximum(rallies, 1).astype(np.float64)).tolist(),
+	}
+
+def trabajos(cruces, jugadores, partidas, primera, trozo, puntos, duracion):
+	"""Trozos de partidas para cada cruce (a, b): partidas por cruce, la
+	mitad con a a la izquierda. Las semillas siguen desde primera."""
+	lista = []
+	semilla = primera
+	for a, b in cruces:
+		for izquierda, derecha, n in ((a, b, partidas // 2), (b, a, partidas - partidas // 2)):
+			while n > 0:
+				m = min(n, trozo)
+				lista.append((izquierda, jugadores[izquierda], derecha, jugadores[derecha],
+					semilla, m, puntos, duracion))
+				semilla += m
+				n -= m
+	return lista, semilla
+
+def ejecutar(pool, lista, tabla, total=None, salida=sys.stderr):
+	''' Reparte los trozos y va sumando cada uno segun acaba '''
+	inicio = default_timer()
+	ultimo = inicio
+	hechas = 0
+	total = total or sum(t[5] for t in lista)
+	resultados = pool.imap_unordered(jugar, lista) if pool else (jugar(t) for t in lista)
+	for resultado in resultados:
+		tabla.anotar(resultado)
+		hechas += len(resultado['ganador'])
+		ahora = default_timer()
+		if ahora - ultimo >= PROGRESO:
+			ultimo = ahora
+			salida.write("%d/%d partidas, %.0f partidas/s\n" % (hechas, total,
+				hechas / (ahora - inicio)))
+	return default_timer() - inicio
+
+def liga(nombres):
+	''' Todos contra todos '''
+	return [(nombres[i], nombres[j]) for i in range(len(nombres)) for j in range(i + 1, len(nombres))]
+
+def emparejar(nombres, puntos, jugados):
+	"""Cruces de una ronda de suizo: por orden de puntos, cada uno con el
+	siguiente con el que aun no haya jugado. Si son impares el ultimo
+	descansa (y se lleva un punto)."""
+	orden = sorted(nombres, key=lambda n: (-puntos[n], n))
+	cruces = []
+	descansa = None
+	while orden:
+		a = orden.pop(0)
+		rival = None
+		for b in orden:
+			if (a, b) not in jugados and (b, a) not in jugados:
+				rival = b
+				break
+		if rival is None and orden:
+			rival = orden[0]
+		if rival is None:
+			descansa = a
+			break
+		orden.remove(rival)
+		cruces.append((a, rival))
+	return cruces, descansa
+
+def suizo(pool, jugadores, rondas, partidas, args, tabla):
+	"""Juega rondas de suizo con partidas por cruce. Ganar un cruce (mas
+	partidas ganadas) da 1 punto y empatarlo medio. Va sumando en tabla
+	y devuelve el tiempo jugando y los puntos."""
+	nombres = tabla.nombres
+	puntos = dict((nombre, 0.0) for nombre in nombres)
+	jugados = set()
+	semilla = args.semilla
+	tiempo = 0.0
+	for ronda in range(rondas):
+		cruces, descansa = emparejar(nombres, puntos, jugados)
+		if descansa is not None:
+			puntos[descansa] += 1
+		lista, semilla = trabajos(cruces, jugadores, partidas, semilla, args.trozo,
+			args.puntos, args.duracion)
+		ronda_tabla = Tabla(nombres)
+		tiempo += ejecutar(pool, lista, ronda_tabla)
+		for a, b in cruces:
+			jugados.add((a, b))
+			c = ronda_tabla.cruces[tuple(sorted((a, b)))]
+			ganadas_a = c[1] if a < b else c[2]
+			ganadas_b = c[2] if a < b else c[1]
+			puntos[a] += 1.0 if ganadas_a > ganadas_b else 0.5 if ganadas_a == ganadas_b else 0.0
+			puntos[b] += 1.0 if ganadas_b > ganadas_a else 0.5 if ganadas_a == ganadas_b else 0.0
+		tabla.sumar(ronda_tabla)
+		sys.stderr.write("Ronda %d: %s\n" % (ronda + 1, ", ".join("%s %.1f" % (n, puntos[n])
+			for n in sorted(nombres, key=lambda n: (-puntos[n], n)))))
+	return tiempo, puntos
+
+def wilson(exitos, n, z=Z):
+	''' Proporcion exitos/n con su intervalo de Wilson: (p, bajo, alto) '''
+	if not n:
+		return (0.0, 0.0, 0.0)
+	p = float(exitos) / n
+	centro = (p + z * z / (2 * n)) / (1 + z * z / n)
+	margen = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+	return (p, centro - margen, centro + margen)
+
+def main():
+	parser = argparse.ArgumentParser(description="Torneo entre IAs de Not Pong")
+	parser.add_argument('--formato', choices=['liga', 'suizo'], default='liga')
+	parser.add_argument('--partidas', type=int, default=PARTIDAS,
+		help="liga: partidas en total; suizo: partidas de cada cruce en cada ronda")
+	parser.add_argument('--rondas', type=int, default=0, help="suizo (0 -> log2 de los jugadores)")
+	parser.add_argument('--jugadores', help="fichero JSON con los jugadores")
+	parser.add_argument('-j', '--procesos', type=int, default=multiprocessing.cpu_count())
+	parser.add_argument('--trozo', type=int, default=TROZO, help="partidas por trabajo")
+	parser.add_argument('--semilla', type=int, default=SEMILLA)
+	parser.add_argument('--puntos', type=int, default=PUNTOS)
+	parser.add_argument('--duracion', type=int, default=DURACION, help="pasos como mucho por partida")
+	parser.add_argument('--json', help="fichero donde guardar los resultados")
+	args = parser.parse_args()
+	if args.partidas < 1:
+		parser.error("--partidas tiene que ser al menos 1")
+
+	jugadores = JUGADORES
+	if args.jugadores:
+		with open(args.jugadores) as fichero:
+			jugadores = [tuple(j) for j in json.load(fichero)]
+	nombres = [nombre for nombre, config in jugadores]
+	jugadores = dict(jugadores)
+	if len(jugadores) < 2:
+		parser.error("hacen falta al menos 2 jugadores (con nombres distintos)")
+	tabla = Tabla(nombres)
+	pool = multiprocessing.Pool(args.procesos) if args.procesos > 1 else None
+	try:
+		if args.formato == 'liga':
+			cruces = liga(nombres)
+			por_cruce = max(args.partidas // len(cruces), 2)
+			lista, semilla = trabajos(cruces, jugadores, por_cruce, args.semilla,
+				args.trozo, args.puntos, args.duracion)
+			tiempo = ejecutar(pool, lista, tabla)
+			puntos = None
+		else:
+			rondas = args.rondas or int(math.ceil(math.log(len(nombres), 2)))
+			tiempo, puntos = suizo(pool, jugadores, rondas, args.partidas, args, tabla)
+	finally:
+		if pool:
+			pool.close()
+			pool.join()
+
+	tabla.imprimir()
+	if puntos:
+		print("\nPuntos del suizo: " + ", ".join("%s %.1f" % (n, puntos[n])
+			for n in sorted(nombres, key=lambda n: (-puntos[n], n))))
+	print("\n%d partidas en %.1f s (%.0f partidas/s, %d procesos)" % (tabla.partidas,
+		tiempo, tabla.partidas / tiempo if tiempo else 0.0, args.procesos))
+	if args.json:
+		resultado = tabla.json()
+		resultado.update({'formato': args.formato, 'semilla': args.semilla,
+			'puntos_suizo': puntos, 'segundos': tiempo, 'procesos': args.procesos})
+		with open(args.json, 'w') as fichero:
+			json.dump(resultado, fichero, indent=1, sort_keys=True)
+	return 0
+
+# ---------------------------------------------------------------------
+
+if __name__ == '__main__':
+	sys.exit(main())